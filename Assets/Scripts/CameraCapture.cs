@@ -29,6 +29,15 @@ public class CameraCapture : MonoBehaviour {
 
     private bool running = false;
 
+    // Wire protocol v2 (Backend/webapp/AUGV/protocol.py), enabled when the server answers the hello.
+    private const int PROTO_V2 = 2;
+    private const byte FLAG_USE_YOLO = 0x01;
+    private const byte MSG_OBSTACLE = 1;
+    private const int FRAME_HEADER_SIZE = 20;
+    private const int RESULT_HEADER_SIZE = 8;
+    private bool useProtoV2 = false;
+    private uint frameSeq = 0;
+
     private bool isReconnecting = false;
     private float lastReconnectAttempt = 0f;
     private const float RECONNECT_DELAY = 5f;
@@ -46,7 +55,7 @@ public class CameraCapture : MonoBehaviour {
         var isDeployed = serverUrl.StartsWith("https://");
         var wsProtocol = isDeployed ? "wss" : "ws";
         serverUrl = isDeployed ? serverUrl.Replace("https://", "") : serverUrl + ":" + serverPort;
-        wsUrl = $"{wsProtocol}://{serverUrl}/ws/augv/{agentId}";
+        wsUrl = $"{wsProtocol}://{serverUrl}/ws/augv/{agentId}?proto={PROTO_V2}";
         Debug.Log($"{agentId} wsUrl: {wsUrl}");
         Application.runInBackground = true;
 
@@ -85,13 +94,8 @@ public class CameraCapture : MonoBehaviour {
         lastSendTime = Time.time;
 
         bool yoloTrue = GlobalConfig.Instance.GetAgentYolo(agentId);
-        var param = new Dictionary<string, object> {
-            {"useYolo", yoloTrue}
-        };
-
-        string headerJson = MiniJSON.Json.Serialize(param);
-        byte[] headerBytes = System.Text.Encoding.UTF8.GetBytes(headerJson);
-        byte[] delimiter = System.Text.Encoding.UTF8.GetBytes("\n");
+        double capturedAt = DateTimeOffset.UtcNow.ToUnixTimeMilliseconds() / 1000.0;
+        frameSeq++;
         
         var req = AsyncGPUReadback.Request(rt, 0, TextureFormat.RGB24);
         while (!req.done) await Task.Delay(1);
@@ -102,10 +106,9 @@ public class CameraCapture : MonoBehaviour {
             tex.LoadRawTextureData(raw);
             tex.Apply(false, false);
             byte[] frame = tex.EncodeToJPG(jpegQuality);
-            byte[] payload = new byte[headerBytes.Length + delimiter.Length + frame.Length];
-            System.Buffer.BlockCopy(headerBytes, 0, payload, 0, headerBytes.Length);
-            System.Buffer.BlockCopy(delimiter, 0, payload, headerBytes.Length, delimiter.Length);
-            System.Buffer.BlockCopy(frame, 0, payload, headerBytes.Length + delimiter.Length, frame.Length);
+            byte[] payload = useProtoV2
+                ? _buildFrameV2(frame, yoloTrue, capturedAt)
+                : _buildFrameV1(frame, yoloTrue, capturedAt);
             _ = ws.Send(payload).ContinueWith(task => {
                 if (task.IsFaulted) {
                     Debug.LogError($"{agentId} failed to send image: {task.Exception}");
@@ -114,6 +117,65 @@ public class CameraCapture : MonoBehaviour {
         }
     }
 
+    private byte[] _buildFrameV1(byte[] frame, bool yoloTrue, double capturedAt) {
+        var param = new Dictionary<string, object> {
+            {"useYolo", yoloTrue},
+            {"capturedAt", capturedAt}
+        };
+        byte[] headerBytes = System.Text.Encoding.UTF8.GetBytes(MiniJSON.Json.Serialize(param) + "\n");
+        byte[] payload = new byte[headerBytes.Length + frame.Length];
+        System.Buffer.BlockCopy(headerBytes, 0, payload, 0, headerBytes.Length);
+        System.Buffer.BlockCopy(frame, 0, payload, headerBytes.Length, frame.Length);
+        return payload;
+    }
+
+    // magic "AV", version, flags, seq uint32, capturedAt float64, payload length uint32, little endian
+    private byte[] _buildFrameV2(byte[] frame, bool yoloTrue, double capturedAt) {
+        byte[] payload = new byte[FRAME_HEADER_SIZE + frame.Length];
+        payload[0] = (byte)'A';
+        payload[1] = (byte)'V';
+        payload[2] = PROTO_V2;
+        payload[3] = yoloTrue ? FLAG_USE_YOLO : (byte)0;
+        _writeLittleEndian(BitConverter.GetBytes(frameSeq), payload, 4);
+        _writeLittleEndian(BitConverter.GetBytes(capturedAt), payload, 8);
+        _writeLittleEndian(BitConverter.GetBytes((uint)frame.Length), payload, 16);
+        System.Buffer.BlockCopy(frame, 0, payload, FRAME_HEADER_SIZE, frame.Length);
+        return payload;
+    }
+
+    private static void _writeLittleEndian(byte[] value, byte[] dst, int offset) {
+        if (!BitConverter.IsLittleEndian) Array.Reverse(value);
+        System.Buffer.BlockCopy(value, 0, dst, offset, value.Length);
+    }
+
+    // magic "AV", version, msg type, count uint32, then count * (feet_x, feet_y) float32
+    private void _handleBinaryResult(byte[] bytes) {
+        if (bytes.Length < RESULT_HEADER_SIZE || bytes[2] != PROTO_V2 || bytes[3] != MSG_OBSTACLE) {
+            Debug.LogError($"{agentId} invalid binary message");
+            return;
+        }
+        if (!BitConverter.IsLittleEndian) {
+            Debug.LogError($"{agentId} binary results need a little endian platform");
+            return;
+        }
+        int count = (int)BitConverter.ToUInt32(bytes, 4);
+        if (bytes.Length < RESULT_HEADER_SIZE + count * 8) return;
+        var feet = new List<object>(count);
+        for (int i = 0; i < count; i++) {
+            int offset = RESULT_HEADER_SIZE + i * 8;
+            feet.Add(new List<object> {
+                BitConverter.ToSingle(bytes, offset),
+                BitConverter.ToSingle(bytes, offset + 4)
+            });
+        }
+        if (PathSupervisor.Instance != null) {
+            PathSupervisor.Instance.AssignObstacleFromJSON(new Dictionary<string, object> {
+                {"agent_id", agentId},
+                {"feet", feet}
+            });
+        }
+    }
+
     private async void _cleanWs() {
         if (ws != null && ws.State == WebSocketState.Open) {
             try {
@@ -168,6 +230,7 @@ public class CameraCapture : MonoBehaviour {
             }
         }
 
+        useProtoV2 = false;
         ws = new WebSocket(wsUrl);
         ws.OnOpen += () => {
             Debug.Log($"{agentId} connected to backend");
@@ -183,10 +246,17 @@ public class CameraCapture : MonoBehaviour {
             }
         };
         ws.OnMessage += (bytes) => {
+            if (bytes.Length >= 2 && bytes[0] == (byte)'A' && bytes[1] == (byte)'V') {
+                _handleBinaryResult(bytes);
+                return;
+            }
             var message = System.Text.Encoding.UTF8.GetString(bytes);
             var parsed = MiniJSON.Json.Deserialize(message) as System.Collections.Generic.Dictionary<string, object>;
             if (parsed != null && parsed.TryGetValue("action", out var action)) {
-                if (action.ToString() == "obstacle") {
+                if (action.ToString() == "hello") {
+                    useProtoV2 = parsed.TryGetValue("proto", out var proto) && Convert.ToInt32(proto) == PROTO_V2;
+                    Debug.Log($"{agentId} wire protocol v{(useProtoV2 ? PROTO_V2 : 1)}");
+                } else if (action.ToString() == "obstacle") {
                     if (parsed.TryGetValue("data", out var data) && PathSupervisor.Instance != null) {
                         PathSupervisor.Instance.AssignObstacleFromJSON(data as System.Collections.Generic.Dictionary<string, object>);
                     }
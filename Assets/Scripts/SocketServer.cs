@@ -14,10 +14,49 @@ using System.Collections.Generic;
 
 public class SocketServer : MonoBehaviour {
     
+    // Backend/webapp/AUGV/unity.py keeps one connection open, every message is
+    // a 4 byte big endian length + UTF-8 JSON with an "id", answered by {"ack": id, "status": ...}
+    // once applied in Update(). A connection starting with '{' is the old raw JSON (send and close).
+    private const int MAX_FRAME = 16 * 1024 * 1024;
+
+    private class Connection {
+        public TcpClient client;
+        public NetworkStream stream;
+        private readonly object writeLock = new object();
+
+        public void SendAck(object id, string error) {
+            var ack = new Dictionary<string, object> {
+                {"ack", id},
+                {"status", error == null ? "ok" : "error"}
+            };
+            if (error != null) ack["error"] = error;
+            byte[] payload = Encoding.UTF8.GetBytes(MiniJSON.Json.Serialize(ack));
+            byte[] frame = new byte[4 + payload.Length];
+            frame[0] = (byte)(payload.Length >> 24);
+            frame[1] = (byte)(payload.Length >> 16);
+            frame[2] = (byte)(payload.Length >> 8);
+            frame[3] = (byte)payload.Length;
+            Buffer.BlockCopy(payload, 0, frame, 4, payload.Length);
+            try {
+                lock (writeLock) {
+                    stream.Write(frame, 0, frame.Length);
+                }
+            } catch (Exception e) {
+                Debug.LogWarning($"SocketServer: Failed to send ack {id}: {e.Message}");
+            }
+        }
+
+        public void Close() {
+            try { stream?.Close(); } catch (Exception) {}
+            try { client?.Close(); } catch (Exception) {}
+        }
+    }
+
     private TcpListener listener;
     private Thread serverThread;
     private CancellationTokenSource cts;
-    private ConcurrentQueue<string> incomingMessages = new();
+    private ConcurrentQueue<(string json, Connection conn)> incomingMessages = new();
+    private readonly List<Connection> connections = new();
     
     private bool isShuttingDown = false;
     void Start() {
@@ -31,47 +70,52 @@ public class SocketServer : MonoBehaviour {
     }
 
     void Update() {
-        while (incomingMessages.TryDequeue(out string json)) {
-            if (!(MiniJSON.Json.Deserialize(json) is Dictionary<string, object> parsed)) {
-                Debug.LogError($"SocketServer: Invalid JSON: {json}");
-                continue;
-            }
-            if (parsed.TryGetValue("action", out var action)) {
-                if (action.ToString() == "route") {
-                    PathSupervisor.Instance.AssignRouteFromJSON(parsed["data"] as Dictionary<string, object>);
-                } else if (action.ToString() == "obstacle") {
-                    PathSupervisor.Instance.AssignObstacleFromJSON(parsed["data"] as Dictionary<string, object>);
-                } else {
-                    Debug.LogError($"SocketServer: Invalid action: {action}");
-                }
+        while (incomingMessages.TryDequeue(out var item)) {
+            object id = null;
+            string error = _applyMessage(item.json, ref id);
+            if (error != null) Debug.LogError($"SocketServer: {error}");
+            if (item.conn != null && id != null) item.conn.SendAck(id, error);
+        }
+    }
+
+    private string _applyMessage(string json, ref object id) {
+        if (!(MiniJSON.Json.Deserialize(json) is Dictionary<string, object> parsed)) {
+            return $"Invalid JSON: {json}";
+        }
+        parsed.TryGetValue("id", out id);
+        if (!parsed.TryGetValue("action", out var action)) {
+            return $"No action in message: {json}";
+        }
+        try {
+            if (action.ToString() == "route") {
+                PathSupervisor.Instance.AssignRouteFromJSON(parsed["data"] as Dictionary<string, object>);
+            } else if (action.ToString() == "obstacle") {
+                PathSupervisor.Instance.AssignObstacleFromJSON(parsed["data"] as Dictionary<string, object>);
             } else {
-                Debug.LogError($"SocketServer: No action in message: {json}");
-                continue;
+                return $"Invalid action: {action}";
             }
+        } catch (Exception e) {
+            return $"Error applying {action}: {e.Message}";
         }
+        return null;
     }
 
     private void _handleConnections(CancellationToken token) {
         try {
             while (true && !token.IsCancellationRequested) {
-                TcpClient client = null;
-                NetworkStream stream = null;
                 try {
-                    client = listener.AcceptTcpClient();
-                    stream = client.GetStream();
-                    byte[] buffer = new byte[client.ReceiveBufferSize];
-                    int bytesRead = stream.Read(buffer, 0, buffer.Length);
-                    string json = Encoding.UTF8.GetString(buffer, 0, bytesRead);
-                    incomingMessages.Enqueue(json);
+                    TcpClient client = listener.AcceptTcpClient();
+                    var conn = new Connection { client = client, stream = client.GetStream() };
+                    lock (connections) connections.Add(conn);
+                    var clientThread = new Thread(() => _handleClient(conn, token));
+                    clientThread.IsBackground = true;
+                    clientThread.Start();
                 } catch (SocketException e) {
                     if (isShuttingDown || token.IsCancellationRequested) break;
                     Debug.LogError($"SocketServer: SocketException: {e.Message}");
                 } catch (Exception e) {
                     if (isShuttingDown || token.IsCancellationRequested) break;
                     Debug.LogError($"SocketServer: Exception: {e.Message}");
-                } finally {
-                    client?.Close();
-                    stream?.Close();
                 }
             }
         } catch (ObjectDisposedException e) {
@@ -81,6 +125,57 @@ public class SocketServer : MonoBehaviour {
         }
     }
 
+    private void _handleClient(Connection conn, CancellationToken token) {
+        try {
+            int first = conn.stream.ReadByte();
+            if (first < 0) return;
+            if (first == '{') {
+                // old raw JSON, the sender closes the connection after it
+                var legacy = new System.IO.MemoryStream();
+                legacy.WriteByte((byte)first);
+                byte[] buffer = new byte[conn.client.ReceiveBufferSize];
+                int bytesRead;
+                while ((bytesRead = conn.stream.Read(buffer, 0, buffer.Length)) > 0) {
+                    legacy.Write(buffer, 0, bytesRead);
+                }
+                incomingMessages.Enqueue((Encoding.UTF8.GetString(legacy.ToArray()), null));
+                return;
+            }
+
+            byte[] header = new byte[4];
+            header[0] = (byte)first;
+            if (!_readExactly(conn.stream, header, 1, 3)) return;
+            while (!token.IsCancellationRequested) {
+                int length = (header[0] << 24) | (header[1] << 16) | (header[2] << 8) | header[3];
+                if (length < 0 || length > MAX_FRAME) {
+                    Debug.LogError($"SocketServer: Invalid frame length {length}");
+                    return;
+                }
+                byte[] payload = new byte[length];
+                if (!_readExactly(conn.stream, payload, 0, length)) return;
+                incomingMessages.Enqueue((Encoding.UTF8.GetString(payload), conn));
+                if (!_readExactly(conn.stream, header, 0, 4)) return;
+            }
+        } catch (Exception e) {
+            if (!isShuttingDown && !token.IsCancellationRequested) {
+                Debug.LogWarning($"SocketServer: Connection closed: {e.Message}");
+            }
+        } finally {
+            conn.Close();
+            lock (connections) connections.Remove(conn);
+        }
+    }
+
+    private static bool _readExactly(NetworkStream stream, byte[] buffer, int offset, int count) {
+        while (count > 0) {
+            int read = stream.Read(buffer, offset, count);
+            if (read <= 0) return false;
+            offset += read;
+            count -= read;
+        }
+        return true;
+    }
+
     void _cleanUp() {
         if (isShuttingDown) return;
         isShuttingDown = true;
@@ -96,6 +191,11 @@ public class SocketServer : MonoBehaviour {
             Debug.LogWarning($"SocketServer: Exception during listener.Stop(): {e.Message}");
         }
 
+        lock (connections) {
+            foreach (var conn in connections) conn.Close();
+            connections.Clear();
+        }
+
         try {
             if (serverThread != null && serverThread.IsAlive) {
                 if (!serverThread.Join(1000)) {
@@ -30,7 +30,7 @@ CONFIG = {
     'opset': 12,  # ONNX opset version (default: 12). Use 12+ for best compatibility.
 
     # Export with dynamic axes (variable image size)
-    'dynamic': False,  # True = allow variable image sizes (not always supported), False = fixed size (recommended)
+    'dynamic': False,  # True = allow variable image sizes and batch size (needed for INFERENCE_METHOD 'batching'), False = fixed size (recommended)
 
     # Device to use for export
     'device': 'cpu',  # 'cpu' or 'cuda'. Use 'cpu' for best compatibility.
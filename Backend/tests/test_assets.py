@@ -0,0 +1,51 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gzip, re
+from starlette.testclient import TestClient
+from webapp.ASGI import app
+from webapp.tools.assets import ASSETS, IMMUTABLE, fingerprint_urls
+
+def test_layout_uses_fingerprinted_urls():
+    html = TestClient(app).get("/monitor").text
+    for rel in ["css/bootstrap.min.css", "js/bootstrap.bundle.min.js", "js/monitor.js"]:
+        assert ASSETS[rel].url in html
+    assert 'src="/static/js/monitor.js"' not in html
+
+def test_fingerprint_urls_keeps_unknown_paths():
+    source = '<img src="/static/img/logo.png"><script src="/static/js/layout.js"></script>'
+    out = fingerprint_urls(source)
+    assert '/static/img/logo.png' in out
+    assert re.search(r'/static/js/layout\.[0-9a-f]{10}\.js', out)
+
+def test_fingerprinted_asset_is_immutable_and_compressed():
+    client = TestClient(app)
+    asset = ASSETS["css/bootstrap.min.css"]
+    res = client.get(asset.url, headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert res.headers["cache-control"] == IMMUTABLE
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert int(res.headers["content-length"]) == len(asset.bodies["gzip"]) < len(asset.bodies["identity"]) // 3
+    assert res.content == asset.bodies["identity"]
+
+def test_plain_and_stale_urls_revalidate():
+    client = TestClient(app)
+    asset = ASSETS["js/monitor.js"]
+    res = client.get("/static/js/monitor.js", headers={"Accept-Encoding": "identity"})
+    assert res.headers["cache-control"] == "no-cache" and "content-encoding" not in res.headers
+    assert res.content == asset.bodies["identity"]
+    res = client.get("/static/js/monitor.0123456789.js")
+    assert res.status_code == 200 and res.headers["cache-control"] == "no-cache"
+    res = client.get("/static/js/monitor.js", headers={"If-None-Match": asset.etag, "Accept-Encoding": "identity"})
+    assert res.status_code == 304
+
+def test_accept_encoding_negotiation():
+    asset = ASSETS["css/bootstrap.min.css"]
+    encoding, body = asset.pick("gzip;q=0, identity")
+    assert encoding == "identity" and body is asset.bodies["identity"]
+    encoding, body = asset.pick("gzip, deflate")
+    assert encoding == "gzip" and gzip.decompress(body) == asset.bodies["identity"]
+    if "br" in asset.bodies:
+        assert asset.pick("gzip, br")[0] == "br"
+    assert asset.etag_for("gzip") != asset.etag_for("identity")
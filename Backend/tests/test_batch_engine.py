@@ -0,0 +1,150 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import queue, threading, time
+import pytest
+from webapp.AUGV.obstacle import AUGVBatchEngine, GLOBAL_AGENT
+
+class FakeQueue(queue.Queue):
+    """ The parts of FrameMailbox the engine reads """
+    last_scale = 1.0
+    last_trace = None
+    last_received_at = None
+
+class FakeAgent:
+    def __init__(self, agent_id, use_yolo=True):
+        self.agent_id = agent_id
+        self.use_yolo = use_yolo
+        self.q = FakeQueue()
+        self.published = []
+        self.observed = []
+
+    def _observe(self, timings, marks=None, trace=None):
+        self.observed.append(timings)
+
+    def _rescale(self, detections, feet_list, scale):
+        return detections, feet_list
+
+    def _publish_result(self, detections, blocked_offsets, feet_list):
+        self.published.append((detections, blocked_offsets, feet_list))
+
+def _engine(max_batch=4, max_wait_ms=20):
+    engine = AUGVBatchEngine()
+    engine.max_batch = max_batch
+    engine.max_wait = max_wait_ms / 1000.0
+    return engine
+
+@pytest.fixture
+def agents():
+    made = []
+    def make(engine, count, **kwargs):
+        for i in range(count):
+            agent = FakeAgent(f"BATCH_{len(made)}", **kwargs)
+            GLOBAL_AGENT[agent.agent_id] = agent
+            engine.register(agent)
+            made.append(agent)
+        return made[-count:]
+    yield make
+    for agent in made:
+        GLOBAL_AGENT.pop(agent.agent_id, None)
+
+def test_full_batch_closes_at_once(agents):
+    engine = _engine(max_batch=2, max_wait_ms=1000)
+    for agent in agents(engine, 3):
+        agent.q.put(f"frame-{agent.agent_id}")
+    started = time.perf_counter()
+    batch = engine._collect()
+    assert time.perf_counter() - started < 0.5
+    assert len(batch) == 2 and len({agent.agent_id for agent, _, _ in batch}) == 2
+    # the third agent goes into the next batch
+    assert [agent.agent_id for agent, _, _ in engine._collect()] == ["BATCH_2"]
+
+def test_one_frame_per_agent_until_the_deadline(agents):
+    engine = _engine(max_batch=4, max_wait_ms=30)
+    first, second = agents(engine, 2)
+    first.q.put("a1")
+    first.q.put("a2")
+    second.q.put("b1")
+    started = time.perf_counter()
+    batch = engine._collect()
+    assert time.perf_counter() - started >= 0.03
+    assert [(agent.agent_id, frame) for agent, frame, _ in batch] == [("BATCH_0", "a1"), ("BATCH_1", "b1")]
+    assert [frame for _, frame, _ in engine._collect()] == ["a2"]
+
+def test_disconnected_agents_leave_the_engine(agents):
+    engine = _engine()
+    gone, kept = agents(engine, 2)
+    GLOBAL_AGENT.pop(gone.agent_id)
+    assert engine._active_agents() == [kept]
+    assert gone.agent_id not in engine.agents
+
+def test_results_are_routed_per_agent(agents, monkeypatch):
+    engine = _engine(max_batch=4, max_wait_ms=5)
+    batches = []
+    def infer(frames):
+        batches.append(list(frames))
+        engine.last_timings, engine.last_marks = (0.01, 0.001), (0.0, 0.01, 0.011)
+        return [([{"frame": frame}], {(0, 1)}, [[1.0, 2.0]]) for frame in frames]
+    monkeypatch.setattr(engine, "_load_model", lambda: None)
+    monkeypatch.setattr(engine, "_infer_batch", infer)
+    yolo = agents(engine, 3)
+    off, = agents(engine, 1, use_yolo=False)
+    for agent in yolo + [off]:
+        agent.q.put(f"frame-{agent.agent_id}")
+    thread = threading.Thread(target=engine.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and not all(agent.published for agent in yolo + [off]):
+        time.sleep(0.01)
+    engine.stop()
+    thread.join(timeout=2)
+    # one forward pass, without the agent that has YOLO off
+    assert batches == [[f"frame-{agent.agent_id}" for agent in yolo]]
+    for agent in yolo:
+        assert agent.published == [([{"frame": f"frame-{agent.agent_id}"}], {(0, 1)}, [[1.0, 2.0]])]
+        assert agent.observed[0][1:] == (0.01, 0.001)
+    assert off.published == [([], set(), [])] and off.observed == [None]
+
+def test_collect_benchmark(benchmark, agents):
+    engine = _engine(max_batch=8, max_wait_ms=1000)
+    batch_agents = agents(engine, 8)
+    def collect():
+        for agent in batch_agents:
+            agent.q.put("frame")
+        return engine._collect()
+    assert len(benchmark(collect)) == 8
+
+@pytest.mark.parametrize("fail", [True, False])
+def test_an_agent_that_leaves_during_the_pass_gets_nothing(agents, monkeypatch, fail):
+    from webapp.AUGV.obstacle import AGENT_STATE
+    engine = _engine(max_batch=4, max_wait_ms=5)
+    leaving, staying = agents(engine, 2)
+    passes = []
+    def infer(frames):
+        # the controller cleans up an agent while its frame is in the forward pass
+        GLOBAL_AGENT.pop(leaving.agent_id, None)
+        AGENT_STATE.pop(leaving.agent_id, None)
+        passes.append(frames)
+        if fail:
+            raise RuntimeError("CUDA error")
+        engine.last_timings, engine.last_marks = (0.01, 0.001), (0.0, 0.01, 0.011)
+        return [([], set(), []) for frame in frames]
+    monkeypatch.setattr(engine, "_load_model", lambda: None)
+    monkeypatch.setattr(engine, "_infer_batch", infer)
+    leaving.q.put("frame")
+    staying.q.put("frame")
+    thread = threading.Thread(target=engine.run, daemon=True)
+    thread.start()
+    done = lambda: AGENT_STATE.get(staying.agent_id, {}).get("status") == "error" if fail else staying.published
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and not done():
+        time.sleep(0.01)
+    time.sleep(0.05)
+    alive, served = thread.is_alive(), bool(done())
+    engine.stop()
+    thread.join(timeout=2)
+    AGENT_STATE.pop(staying.agent_id, None)
+    assert served and len(passes[0]) == 2
+    # the engine thread survived, the agent that left got no state back and no result
+    assert alive
+    assert leaving.agent_id not in AGENT_STATE and not leaving.published
@@ -0,0 +1,104 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import csv, time
+import pytest
+from webapp.bench import runner
+from webapp.bench.__main__ import main
+from webapp.bench.baseline import compare, load_baseline, save_baseline, write_csv
+from webapp.bench.runner import Scenario, matrix, run_scenario, scenario_key
+
+class FakeEngine:
+    """ Stands in for BenchEngine, a pass takes a fixed time per frame """
+    def __init__(self, scenario, model_path):
+        self.max_batch = scenario.batch if scenario.method == "batching" else 1
+
+    def _infer_batch(self, frames):
+        time.sleep(0.002 * len(frames))
+        return [([], set(), [])] * len(frames)
+
+def _result(key, fps_total, p95, error=None):
+    return {"scenario": key, "fps_total": fps_total, "latency_ms": {"p95": p95}, "error": error}
+
+def test_matrix_only_batches_with_batching():
+    scenarios = matrix(methods=("threading", "batching"), agents=(1, 4), batches=(1, 4))
+    assert len(scenarios) == 6
+    assert {s.batch for s in scenarios if s.method == "threading"} == {1}
+    assert scenario_key(scenarios[0]) == "pt-cpu-threading-a1-fps0-640x480-b1"
+    with pytest.raises(ValueError):
+        matrix(methods=("fibers",))
+
+def test_compare_flags_regressions_over_the_threshold():
+    baseline = {r["scenario"]: r for r in (_result("a", 100, 10), _result("b", 100, 10), _result("c", 100, 10), _result("gone", 1, 1))}
+    rows = compare([_result("a", 95, 10.5), _result("b", 80, 10), _result("c", 100, 13), _result("new", 1, 1)], baseline, threshold=0.1)
+    status = {row["scenario"]: row["status"] for row in rows}
+    assert status == {"a": "ok", "b": "regression", "c": "regression", "new": "new", "gone": "missing"}
+    assert [row["regressions"] for row in rows[:3]] == [[], ["fps_total"], ["latency_p95"]]
+
+def test_compare_flags_a_scenario_that_now_fails():
+    baseline = {r["scenario"]: r for r in (_result("a", 100, 10), _result("b", 1, 1, error="no CUDA"))}
+    rows = compare([_result("a", 0, 0, error="model load failed"), _result("b", 1, 1, error="no CUDA")], baseline)
+    assert [(row["status"], row["regressions"]) for row in rows] == [("regression", ["error"]), ("error", [])]
+    assert rows[0]["error"] == "model load failed"
+
+def test_baseline_and_csv_round_trip(tmp_path):
+    results = [dict(_result("a", 100, 10), latency_ms={"p50": 8, "p95": 10, "p99": 11, "max": 12})]
+    path = save_baseline(results, str(tmp_path / "host.json"))
+    assert load_baseline(path)["a"]["fps_total"] == 100
+    assert load_baseline(str(tmp_path / "none.json")) is None
+    write_csv(results, str(tmp_path / "run.csv"))
+    with open(tmp_path / "run.csv") as f:
+        row = next(csv.DictReader(f))
+    assert row["scenario"] == "a" and row["latency_p95"] == "10"
+
+@pytest.mark.parametrize("method", ["threading", "multiprocessing", "batching"])
+def test_run_scenario(monkeypatch, method):
+    monkeypatch.setattr(runner, "BenchEngine", FakeEngine)
+    result = run_scenario(Scenario("pt", "cpu", method, 2, 0.0, "64x48", 2), passes=10)
+    assert result["error"] is None
+    assert result["frames"] == 20
+    assert result["latency_ms"]["count"] == (10 if method == "batching" else 20)
+    assert 100 < result["fps_per_agent"] < 500
+
+def test_fps_cap(monkeypatch):
+    monkeypatch.setattr(runner, "BenchEngine", FakeEngine)
+    result = run_scenario(Scenario("pt", "cpu", "threading", 1, 50.0, "64x48", 1), passes=10)
+    assert 40 < result["fps_per_agent"] <= 55
+
+def test_scenario_error_does_not_stop_the_run(monkeypatch):
+    def broken(scenario, model_path):
+        raise RuntimeError("CUDA not available")
+    monkeypatch.setattr(runner, "BenchEngine", broken)
+    assert run_scenario(Scenario("pt", "cuda", "threading", 1, 0.0, "64x48", 1), passes=2)["error"] == "CUDA not available"
+
+def test_cli_gates_on_the_baseline(monkeypatch, tmp_path):
+    monkeypatch.setattr(runner, "BenchEngine", FakeEngine)
+    baseline = str(tmp_path / "base.json")
+    args = ["--agents", "1", "--size", "64x48", "--passes", "5"]
+    assert main(args + ["--compare", baseline]) == 2
+    assert main(args + ["--save-baseline", baseline]) == 0
+    assert main(args + ["--compare", baseline, "--threshold", "5"]) == 0
+    monkeypatch.setattr(FakeEngine, "_infer_batch", lambda self, frames: time.sleep(0.02))
+    assert main(args + ["--compare", baseline, "--json", str(tmp_path / "run.json")]) == 1
+    monkeypatch.setattr(runner, "BenchEngine", lambda scenario, model_path: 1 / 0)
+    assert main(args + ["--compare", baseline, "--threshold", "5"]) == 1
+
+def test_infer_batch_benchmark(benchmark):
+    scenario = Scenario("pt", "cpu", "threading", 1, 0.0, "64x48", 1)
+    benchmark(runner.run_agent, FakeEngine(scenario, None), scenario, 1, warmup=0)
+
+def _burn(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+def test_resource_monitor_counts_the_children():
+    import multiprocessing
+    with runner.ResourceMonitor(interval=0.05) as monitor:
+        child = multiprocessing.Process(target=_burn, args=(0.5,))
+        child.start()
+        child.join()
+    summary = monitor.summary()
+    assert monitor.cpu and summary["rss_max"] > 0
+    # the child burns a whole core, this process mostly waits
+    assert max(monitor.cpu) > 50
@@ -0,0 +1,69 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio, json, tracemalloc
+import numpy as np
+from webapp.AUGV.monitor import MonitorClient, MonitorFrame
+from webapp.AUGV.protocol import encode_frame, parse_frame
+
+JPEG = bytes(range(256)) * 400 # ~100KB, a 640x480 frame
+FRAMES = 20
+
+# --- Original ingest: split, json header, np.frombuffer, header + data for the monitor ---
+def ingest_legacy(raw):
+    header, data = raw.split(b"\n", 1)
+    params = json.loads(header.decode('utf-8'))
+    buf = np.frombuffer(data, dtype=np.uint8)
+    payload = json.dumps({"agent_id": "AUGV_1", "detections": []}).encode() + b"\n" + data
+    return params, buf, payload
+
+async def ingest_split(raw):
+    header, data = parse_frame(raw)
+    buf = np.frombuffer(data, dtype=np.uint8)
+    pieces = await MonitorFrame("AUGV_1", data).pieces_for("full")
+    return header, buf, pieces
+
+def allocated_per_frame(fn, raws):
+    tracemalloc.start()
+    kept = [fn(raw) for raw in raws]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / len(raws)
+
+def test_ingest_allocations_per_frame():
+    legacy_raws = [json.dumps({"useYolo": True, "capturedAt": 1.0}).encode() + b"\n" + JPEG for _ in range(FRAMES)]
+    v2_raws = [encode_frame(JPEG, seq=i, captured_at=1.0, use_yolo=True) for i in range(FRAMES)]
+    loop = asyncio.new_event_loop()
+    try:
+        legacy = allocated_per_frame(ingest_legacy, legacy_raws)
+        split = allocated_per_frame(lambda raw: loop.run_until_complete(ingest_split(raw)), v2_raws)
+    finally:
+        loop.close()
+    print(f"Allocated per frame, legacy: {legacy / 1024:.1f}KB, zero-copy: {split / 1024:.1f}KB")
+    # legacy copies the JPEG twice (split + monitor payload)
+    assert legacy > 2 * len(JPEG)
+    assert split < 4096
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+def test_monitor_split_framing_sends_the_ingest_view():
+    async def main():
+        ws = RecordingWebSocket()
+        client = MonitorClient(ws).start()
+        client.subscribe(framing="split")
+        header, data = parse_frame(encode_frame(JPEG))
+        client.post(MonitorFrame("AUGV_1", data, [{"label": "person"}]))
+        await asyncio.sleep(0.01)
+        await client.stop()
+        return ws.sent, data
+    sent, data = asyncio.run(main())
+    assert json.loads(sent[0]) == {"agent_id": "AUGV_1", "detections": [{"label": "person"}]}
+    assert sent[1] is data
@@ -0,0 +1,56 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json, time
+import pytest
+from starlette.testclient import TestClient
+from webapp.ASGI import app
+from webapp.AUGV.maps import MAPS, MapRepository
+
+LAYOUT = ["..W..", ".A..W", "....."]
+
+def test_map_repository_caches_parsed_map(tmp_path):
+    repo = MapRepository(str(tmp_path))
+    saved = repo.save("warehouse", LAYOUT)
+    assert repo.names() == ["warehouse"]
+    entry = repo.get("warehouse")
+    assert entry is saved and entry.layout == LAYOUT
+    assert repo.get("warehouse") is entry
+
+def test_map_repository_reloads_on_mtime(tmp_path):
+    repo = MapRepository(str(tmp_path))
+    first = repo.save("warehouse", LAYOUT)
+    path = tmp_path / "warehouse.json"
+    path.write_text(json.dumps({"name": "warehouse", "layout": ["W"]}))
+    os.utime(path, (time.time() + 5, time.time() + 5))
+    entry = repo.get("warehouse")
+    assert entry is not first and entry.layout == ["W"] and entry.etag != first.etag
+
+def test_map_repository_delete_and_names(tmp_path):
+    repo = MapRepository(str(tmp_path))
+    repo.save("a", LAYOUT)
+    repo.save("b", LAYOUT)
+    assert repo.names() == ["a", "b"]
+    assert repo.delete("a") and not repo.delete("a")
+    assert repo.names() == ["b"] and repo.get("a") is None
+
+def test_map_repository_refuses_paths(tmp_path):
+    repo = MapRepository(str(tmp_path))
+    for name in ["../x", "a/b", ".hidden", "", None]:
+        with pytest.raises(ValueError):
+            repo.path(name)
+
+def test_get_map_etag_and_304():
+    client = TestClient(app)
+    res = client.get("/maps/default")
+    assert res.status_code == 200
+    assert res.json() == MAPS.get("default").data
+    etag = res.headers["etag"]
+    res = client.get("/maps/default", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert client.get("/maps/does_not_exist").status_code == 404
+    assert "default" in client.get("/maps").json()
+
+def test_get_map_benchmark(benchmark):
+    client = TestClient(app)
+    benchmark(client.get, "/maps/default")
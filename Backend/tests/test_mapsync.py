@@ -0,0 +1,59 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json, time
+from webapp.AUGV.maps import MapRepository
+from webapp.AUGV.mapsync import MapSync
+from webapp.tools.config import CONFIG
+
+LAYOUT = ["..W..", ".A..W", "....."]
+
+def make_sync(tmp_path):
+    repo = MapRepository(str(tmp_path / "maps_json"))
+    sync = MapSync(repo, tmp_path / "Maps")
+    repo.on_change.append(sync.schedule)
+    return repo, sync
+
+def test_map_sync_debounces_a_burst(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, 'MAP_SYNC_DEBOUNCE_MS', 50)
+    repo, sync = make_sync(tmp_path)
+    sync.start()
+    t0 = time.monotonic()
+    for i in range(20):
+        repo.save("warehouse", LAYOUT + [str(i)])
+    assert time.monotonic() - t0 < 0.5
+    deadline = time.monotonic() + 2
+    while sync.copied == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sync.stop()
+    # 20 saves, one copy of the last version
+    assert sync.copied == 1
+    assert json.loads((tmp_path / "Maps" / "warehouse.json").read_text())["layout"][-1] == "19"
+    assert not [p for p in (tmp_path / "Maps").iterdir() if p.name.startswith(".")]
+
+def test_map_sync_only_copies_changed_maps(tmp_path):
+    repo, sync = make_sync(tmp_path)
+    for name in ["a", "b", "c"]:
+        repo.save(name, LAYOUT)
+    sync.stop()
+    assert sync.copied == 3
+    repo.save("b", LAYOUT)
+    repo.save("c", LAYOUT + ["W"])
+    sync.stop()
+    assert sync.copied == 4 and sync.skipped == 1
+
+def test_map_sync_skips_identical_existing_file(tmp_path):
+    repo, sync = make_sync(tmp_path)
+    entry = repo.save("a", LAYOUT)
+    (tmp_path / "Maps").mkdir()
+    (tmp_path / "Maps" / "a.json").write_bytes(entry.body)
+    sync.stop()
+    assert sync.copied == 0 and sync.skipped == 1
+
+def test_map_sync_copies_maps_never_saved(tmp_path):
+    repo, sync = make_sync(tmp_path)
+    (tmp_path / "maps_json" / "legacy.json").write_text(json.dumps({"layout": LAYOUT}))
+    sync.schedule_all()
+    sync.stop()
+    assert sync.copied == 1
+    assert json.loads((tmp_path / "Maps" / "legacy.json").read_text())["layout"] == LAYOUT
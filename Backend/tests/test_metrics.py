@@ -0,0 +1,72 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+from starlette.testclient import TestClient
+from webapp.ASGI import app
+from webapp.tools import metrics
+from webapp.tools.metrics import Counter, Gauge, Histogram
+from webapp.AUGV.transport import OutboundChannel
+
+def test_counter_and_gauge_render():
+    counter = Counter("test_frames_total", "Frames.", ("agent",))
+    counter.inc("AUGV_1")
+    counter.inc("AUGV_1", amount=2)
+    counter.inc('AUGV_"2"')
+    gauge = Gauge("test_clients", "Clients.", collect=lambda: {(): 3})
+    out = []
+    counter.render(out)
+    gauge.render(out)
+    assert out == [
+        "# HELP test_frames_total Frames.",
+        "# TYPE test_frames_total counter",
+        'test_frames_total{agent="AUGV_\\"2\\""} 1',
+        'test_frames_total{agent="AUGV_1"} 3',
+        "# HELP test_clients Clients.",
+        "# TYPE test_clients gauge",
+        "test_clients 3",
+    ]
+    counter.forget("agent", "AUGV_1")
+    assert counter.value("AUGV_1") == 0
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Latency.", ("stage",), buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value, "decode")
+    cumulative, count, total = histogram.snapshot("decode")
+    assert cumulative == [1, 3, 4, 5]
+    assert count == 5
+    assert abs(total - 5.605) < 1e-9
+    out = []
+    histogram.render(out)
+    assert 'test_seconds_bucket{stage="decode",le="0.1"} 3' in out
+    assert 'test_seconds_bucket{stage="decode",le="+Inf"} 5' in out
+    assert 'test_seconds_count{stage="decode"} 5' in out
+
+def test_outbound_channel_keeps_the_enqueue_time():
+    async def main():
+        channel = OutboundChannel()
+        channel.put_nowait({"action": "route"})
+        await channel.get()
+        return channel.last_enqueued_at
+    assert asyncio.run(main()) is not None
+
+def test_metrics_endpoint():
+    metrics.FRAMES_RECEIVED.inc("AUGV_test")
+    metrics.STAGE_SECONDS.observe(0.002, "decode")
+    res = TestClient(app).get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'augv_frames_received_total{agent="AUGV_test"} 1' in res.text
+    assert 'augv_stage_seconds_bucket{stage="decode",le="0.0025"}' in res.text
+    assert "process_resident_memory_bytes " in res.text
+    metrics.forget("AUGV_test")
+    assert "AUGV_test" not in TestClient(app).get("/metrics").text
+
+def test_counter_inc_benchmark(benchmark):
+    counter = Counter("bench_total", "Bench.", ("agent",))
+    benchmark(counter.inc, "AUGV_1")
+
+def test_histogram_observe_benchmark(benchmark):
+    histogram = Histogram("bench_seconds", "Bench.", ("stage",))
+    benchmark(histogram.observe, 0.012, "inference")
@@ -0,0 +1,77 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio, json, time
+import cv2, numpy as np
+from webapp.AUGV import monitor
+from webapp.AUGV.monitor import MonitorClient, MonitorFrame, publish, register_monitor, unregister_monitor
+
+class SlowWebSocket:
+    def __init__(self, delay):
+        self.delay = delay
+        self.received = []
+
+    async def send_bytes(self, payload):
+        await asyncio.sleep(self.delay)
+        self.received.append(payload)
+
+def test_monitor_client_drops_oldest():
+    async def main():
+        client = MonitorClient(SlowWebSocket(0), maxsize=2)
+        for i in range(5):
+            client.post(MonitorFrame("AUGV_1", bytes([i])))
+        assert client.dropped == 3
+        assert [frame.data for frame in client.pending] == [b"\x03", b"\x04"]
+    asyncio.run(main())
+
+def test_monitor_frame_payload_built_once():
+    frame = MonitorFrame("AUGV_1", b"jpeg", [{"label": "person"}])
+    payload = frame.payload()
+    assert frame.payload() is payload
+    assert payload.endswith(b"\njpeg") and b'"agent_id": "AUGV_1"' in payload
+
+def test_publish_does_not_wait_for_slow_clients():
+    async def main():
+        fast, slow = SlowWebSocket(0), SlowWebSocket(0.5)
+        clients = [register_monitor(fast)] + [register_monitor(slow) for _ in range(20)]
+        t0 = time.perf_counter()
+        for i in range(100):
+            publish("AUGV_1", bytes([i]))
+        elapsed = time.perf_counter() - t0
+        for _ in range(100):
+            if not clients[0].pending and len(fast.received) == 4:
+                break
+            await asyncio.sleep(0.01)
+        for client in clients:
+            await unregister_monitor(client)
+        monitor.forget("AUGV_1")
+        assert elapsed < 0.1
+        assert not monitor.MONITOR_CLIENTS
+        assert all(client.dropped > 0 for client in clients[1:])
+        # the newest frame is always the last one queued
+        assert fast.received[-1].endswith(bytes([99]))
+    asyncio.run(main())
+
+def test_monitor_client_subscription_filters_and_throttles():
+    async def main():
+        client = MonitorClient(SlowWebSocket(0), maxsize=8)
+        client.subscribe(agents=["AUGV_2"], max_fps=1, tier="thumb")
+        for i in range(5):
+            client.post(MonitorFrame("AUGV_1", bytes([i])))
+            client.post(MonitorFrame("AUGV_2", bytes([i])))
+        assert [frame.agent_id for frame in client.pending] == ["AUGV_2"]
+        assert client.throttled == 4
+    asyncio.run(main())
+
+def test_monitor_thumb_tier_encoded_once():
+    jpg = cv2.imencode('.jpg', np.random.randint(0, 255, (720, 1280, 3), np.uint8))[1].tobytes()
+    frame = MonitorFrame("AUGV_1", jpg, [{"bbox": [100, 100, 20, 40]}])
+    async def main():
+        return await asyncio.gather(*[frame.payload_for("thumb") for _ in range(10)])
+    payloads = asyncio.run(main())
+    # same object for every client, a single re-encode
+    assert all(payload is payloads[0] for payload in payloads)
+    header, data = payloads[0].split(b"\n", 1)
+    assert json.loads(header)["scale"] == 0.25
+    assert len(data) < len(jpg) // 4
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape == (180, 320, 3)
@@ -0,0 +1,91 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import numpy as np
+from webapp.AUGV.obstacle import AUGVMixin
+
+CONF_THRES = 0.6
+RATIO, DW, DH = 1.0, 0.0, 80.0
+ORIG_W, ORIG_H = 640, 480
+
+# --- Original per-row loop, kept here as the reference ---
+def postprocess_onnx_loop(outputs, ratio, dw, dh, orig_w, orig_h):
+    detections = []
+    feet_list = []
+    output = np.squeeze(outputs[0]).T
+    for det in output:
+        cls_id = det[4:].argmax()
+        conf_score = det[4:].max()
+        if cls_id != 0 or conf_score < CONF_THRES:
+            continue
+        x, y, w, h = det[:4]
+        x_mapped = np.clip((x - dw) / ratio, 0, orig_w)
+        y_mapped = np.clip((y - dh) / ratio, 0, orig_h)
+        w_mapped = np.clip(w / ratio, 0, orig_w)
+        h_mapped = np.clip(h / ratio, 0, orig_h)
+        feet_list.append((x_mapped, y_mapped + h_mapped/2))
+        detections.append({
+            "label": "person",
+            "confidence": round(float(conf_score), 3),
+            "bbox": [round(float(v), 2) for v in [x_mapped, y_mapped, w_mapped, h_mapped]],
+            "feet": [float(x_mapped), float(y_mapped + h_mapped/2)],
+        })
+    return detections, feet_list
+
+def make_output(people, duplicates=20, seed=0):
+    """ Synthetic YOLOv8 output (1, 84, 8400), each person is repeated by nearby anchors """
+    rng = np.random.default_rng(seed)
+    out = rng.uniform(0, 0.3, (8400, 84)).astype(np.float32)
+    out[:, :4] = rng.uniform(0, 640, (8400, 4))
+    row = 0
+    for cx, cy, w, h in people:
+        for _ in range(duplicates):
+            out[row, :4] = (cx + rng.uniform(-2, 2), cy + rng.uniform(-2, 2), w, h)
+            out[row, 4] = rng.uniform(0.7, 0.95)
+            row += 1
+    return [out.T[np.newaxis]]
+
+PEOPLE = [(100, 200, 40, 120), (300, 250, 50, 140), (500, 220, 45, 130)]
+
+def test_postprocess_onnx_nms_removes_duplicates():
+    outputs = make_output(PEOPLE)
+    detections, _, feet_list = AUGVMixin()._postprocess_onnx(outputs, 640, 640, RATIO, DW, DH, ORIG_W, ORIG_H)
+    ref_detections, _ = postprocess_onnx_loop(outputs, RATIO, DW, DH, ORIG_W, ORIG_H)
+    assert len(ref_detections) == len(PEOPLE) * 20
+    assert len(detections) == len(feet_list) == len(PEOPLE)
+    for det, feet in zip(detections, feet_list):
+        assert set(det) == {"label", "confidence", "bbox", "feet"}
+        assert len(det["bbox"]) == 4 and det["feet"] == list(feet)
+        assert all(type(v) is float for v in feet)
+
+def test_postprocess_onnx_output_equivalence():
+    # No duplicates, so the NMS keeps everything and it must match the loop
+    outputs = make_output(PEOPLE, duplicates=1)
+    detections, _, _ = AUGVMixin()._postprocess_onnx(outputs, 640, 640, RATIO, DW, DH, ORIG_W, ORIG_H)
+    ref_detections, _ = postprocess_onnx_loop(outputs, RATIO, DW, DH, ORIG_W, ORIG_H)
+    key = lambda d: d["bbox"]
+    assert sorted(detections, key=key) == sorted(ref_detections, key=key)
+
+def test_postprocess_onnx_perf():
+    outputs = make_output(PEOPLE)
+    mixin = AUGVMixin()
+    mixin._postprocess_onnx(outputs, 640, 640, RATIO, DW, DH, ORIG_W, ORIG_H)
+    t0 = time.time()
+    for _ in range(20):
+        postprocess_onnx_loop(outputs, RATIO, DW, DH, ORIG_W, ORIG_H)
+    t1 = time.time()
+    for _ in range(20):
+        mixin._postprocess_onnx(outputs, 640, 640, RATIO, DW, DH, ORIG_W, ORIG_H)
+    t2 = time.time()
+    print(f"Loop: {t1-t0:.4f}s, Vectorized: {t2-t1:.4f}s, Speedup: {(t1-t0)/max(t2-t1, 1e-9):.1f}x")
+    assert (t2-t1) < (t1-t0)
+
+def test_postprocess_onnx_loop_benchmark(benchmark):
+    outputs = make_output(PEOPLE)
+    benchmark(postprocess_onnx_loop, outputs, RATIO, DW, DH, ORIG_W, ORIG_H)
+
+def test_postprocess_onnx_vectorized_benchmark(benchmark):
+    outputs = make_output(PEOPLE)
+    mixin = AUGVMixin()
+    benchmark(mixin._postprocess_onnx, outputs, 640, 640, RATIO, DW, DH, ORIG_W, ORIG_H)
@@ -0,0 +1,64 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time, tracemalloc
+import numpy as np
+from webapp.AUGV.obstacle import AUGVMixin
+
+FRAME_SHAPES = [(480, 640, 3), (320, 640, 3), (720, 1280, 3)]
+
+# --- Original allocating path (letterbox, astype, transpose, expand_dims) + BGR -> RGB ---
+def preprocess_onnx_alloc(mixin, frame):
+    img, ratio, (dw, dh) = mixin._letterbox(frame, (640, 640))
+    img = img[:, :, ::-1].astype(np.float32) / 255.0
+    img = np.transpose(img, (2, 0, 1))
+    img = np.expand_dims(img, 0)
+    return img, ratio, (dw, dh)
+
+def test_preprocess_onnx_output_equivalence():
+    mixin = AUGVMixin()
+    for shape in FRAME_SHAPES:
+        frame = np.random.randint(0, 255, shape, dtype=np.uint8)
+        image, ratio, pad = mixin._preprocess_onnx_image(frame)
+        ref_image, ref_ratio, ref_pad = preprocess_onnx_alloc(mixin, frame)
+        assert image.shape == (1, 3, 640, 640) and image.dtype == np.float32
+        assert (ratio, pad) == (ref_ratio, ref_pad)
+        assert np.allclose(image, ref_image, atol=1e-6)
+
+def test_preprocess_onnx_reuses_buffer():
+    mixin = AUGVMixin()
+    frame = np.random.randint(0, 255, FRAME_SHAPES[0], dtype=np.uint8)
+    first, _, _ = mixin._preprocess_onnx_image(frame)
+    mixin._preprocess_onnx_image(frame)
+    tracemalloc.start()
+    for _ in range(10):
+        image, _, _ = mixin._preprocess_onnx_image(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert image is first
+    # a single 1x3x640x640 float32 tensor is ~4.9MB, nothing close to that per frame
+    assert peak < 64 * 1024
+
+def test_preprocess_onnx_perf():
+    mixin = AUGVMixin()
+    frame = np.random.randint(0, 255, FRAME_SHAPES[2], dtype=np.uint8)
+    mixin._preprocess_onnx_image(frame)
+    t0 = time.time()
+    for _ in range(50):
+        preprocess_onnx_alloc(mixin, frame)
+    t1 = time.time()
+    for _ in range(50):
+        mixin._preprocess_onnx_image(frame)
+    t2 = time.time()
+    print(f"Allocating: {t1-t0:.4f}s, Reused buffer: {t2-t1:.4f}s")
+    assert (t2-t1) < (t1-t0)
+
+def test_preprocess_onnx_alloc_benchmark(benchmark):
+    mixin = AUGVMixin()
+    frame = np.random.randint(0, 255, FRAME_SHAPES[0], dtype=np.uint8)
+    benchmark(preprocess_onnx_alloc, mixin, frame)
+
+def test_preprocess_onnx_buffer_benchmark(benchmark):
+    mixin = AUGVMixin()
+    frame = np.random.randint(0, 255, FRAME_SHAPES[0], dtype=np.uint8)
+    benchmark(mixin._preprocess_onnx_image, frame)
@@ -0,0 +1,63 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import numpy as np
+import pytest
+from webapp.AUGV.protocol import (
+    FRAME_HEADER, PROTO_V1, PROTO_V2, ProtocolError,
+    decode_obstacle, encode_frame, encode_obstacle, negotiate, obstacle_captured_at, parse_frame,
+)
+
+JPEG = bytes(range(256)) * 200
+
+def test_negotiate_falls_back_to_v1():
+    assert negotiate({"proto": "2"}) == PROTO_V2
+    assert negotiate({}) == PROTO_V1
+    assert negotiate({"proto": "9"}) == PROTO_V1
+    assert negotiate({"proto": "abc"}) == PROTO_V1
+
+def test_parse_frame_v2_is_zero_copy():
+    raw = encode_frame(JPEG, seq=7, captured_at=1700000000.25, use_yolo=True)
+    header, data = parse_frame(raw)
+    assert header == (PROTO_V2, 7, 1700000000.25, True)
+    assert isinstance(data, memoryview) and data.obj is raw
+    assert data == JPEG
+
+def test_parse_frame_v1_fallback():
+    raw = json.dumps({"useYolo": True, "capturedAt": 12.5}).encode() + b"\n" + JPEG
+    header, data = parse_frame(raw)
+    assert header.version == PROTO_V1 and header.use_yolo and header.captured_at == 12.5
+    assert data.obj is raw and data == JPEG
+
+def test_parse_frame_rejects_truncated_v2():
+    raw = encode_frame(JPEG)
+    with pytest.raises(ProtocolError):
+        parse_frame(raw[:FRAME_HEADER.size + 10])
+
+def test_obstacle_roundtrip():
+    feet = [(100.5, 200.25), (320.0, 479.0)]
+    raw = encode_obstacle(feet)
+    assert len(raw) == 8 + len(feet) * 8
+    assert np.allclose(decode_obstacle(raw), feet)
+    assert decode_obstacle(encode_obstacle([])).shape == (0, 2)
+    assert obstacle_captured_at(raw) is None
+
+def test_obstacle_echoes_captured_at():
+    feet = [(100.5, 200.25)]
+    raw = encode_obstacle(feet, captured_at=1700000000.125)
+    assert np.allclose(decode_obstacle(raw), feet)
+    assert obstacle_captured_at(raw) == 1700000000.125
+
+def parse_frame_v1(raw):
+    header, data = raw.split(b"\n", 1)
+    params = json.loads(header.decode('utf-8'))
+    return params.get("useYolo", False), data
+
+def test_parse_frame_v1_split_benchmark(benchmark):
+    raw = json.dumps({"useYolo": True, "capturedAt": 12.5}).encode() + b"\n" + JPEG * 4
+    benchmark(parse_frame_v1, raw)
+
+def test_parse_frame_v2_benchmark(benchmark):
+    raw = encode_frame(JPEG * 4, seq=1, captured_at=12.5, use_yolo=True)
+    benchmark(parse_frame, raw)
@@ -0,0 +1,125 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio, time
+import pytest
+from starlette.testclient import TestClient
+from webapp.ASGI import app
+from webapp.AUGV import recorder as recorder_module
+from webapp.AUGV.protocol import encode_frame
+from webapp.AUGV.recorder import Recorder, Segment, read_records, segment_paths
+from webapp.AUGV.replay import Replayer
+from webapp.tools.config import CONFIG
+
+def _record(directory, frames, session="run"):
+    rec = Recorder(str(directory))
+    rec.start(session)
+    for agent_id, payload in frames:
+        rec.record(agent_id, payload)
+    return rec.stop()
+
+def test_round_trip_across_segments(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, 'RECORD_SEGMENT_MB', 1 / 1024)
+    frames = [(f"AUGV_{i % 2 + 1}", bytes([i]) * 300) for i in range(20)]
+    stats = _record(tmp_path, frames)
+    assert stats["recorded"] == 20 and stats["dropped"] == 0
+    assert len(stats["segments"]) > 1
+    records = list(read_records(str(tmp_path / "run")))
+    assert [(r.agent_id, bytes(r.payload)) for r in records] == frames
+    assert all(a.t <= b.t for a, b in zip(records, records[1:]))
+    # a session name is never appended to twice
+    try:
+        Recorder(str(tmp_path)).start("run")
+        assert False, "session reused"
+    except ValueError:
+        pass
+
+def test_truncated_tail_is_ignored(tmp_path):
+    _record(tmp_path, [("AUGV_1", b"a" * 100), ("AUGV_1", b"b" * 100)])
+    path = segment_paths(str(tmp_path / "run"))[0]
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)
+    with Segment(path) as segment:
+        assert [bytes(r.payload) for r in segment] == [b"a" * 100]
+
+def test_segment_paths_match_the_session_only(tmp_path):
+    for name in ("run-00000.augvrec", "run-00001.augvrec", "run-2-00000.augvrec", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert [os.path.basename(p) for p in segment_paths(str(tmp_path / "run"))] == ["run-00000.augvrec", "run-00001.augvrec"]
+    assert len(segment_paths(str(tmp_path))) == 3
+
+class FakeWebSocket:
+    def __init__(self, url, log):
+        self.url = url
+        self.log = log
+        self.closed = asyncio.Event()
+
+    async def send(self, payload):
+        self.log.append((time.monotonic(), self.url, bytes(payload)))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.closed.wait()
+        raise StopAsyncIteration
+
+    async def close(self):
+        self.closed.set()
+
+def _replay(records, speed, loops=1):
+    log = []
+    async def connect(url):
+        return FakeWebSocket(url, log)
+    stats = asyncio.run(Replayer(records, "ws://server/", speed, loops, connect=connect).run())
+    return stats, log
+
+def test_replay_keeps_the_recorded_timing():
+    records = [recorder_module.Record(t, "AUGV_1" if i % 2 else "AUGV_2", encode_frame(b"x", i, use_yolo=True))
+               for i, t in enumerate((1.0, 1.1, 1.2, 1.3))]
+    stats, log = _replay(records, speed=1)
+    assert stats["sent"] == 4
+    assert {url for _, url, _ in log} == {"ws://server/ws/augv/AUGV_1?proto=2", "ws://server/ws/augv/AUGV_2?proto=2"}
+    gaps = [b[0] - a[0] for a, b in zip(log, log[1:])]
+    assert all(0.07 < gap < 0.2 for gap in gaps)
+
+    stats, log = _replay(records, speed=0, loops=3)
+    assert stats["sent"] == 12
+    assert log[-1][0] - log[0][0] < 0.1
+
+def test_replay_loops_keep_the_agents_aligned():
+    # AUGV_1 sends 5 frames, AUGV_2 only 2 over the same 0.2s
+    records = sorted([recorder_module.Record(t, "AUGV_1", b"a") for t in (0.0, 0.05, 0.1, 0.15, 0.2)] +
+                     [recorder_module.Record(t, "AUGV_2", b"b") for t in (0.0, 0.2)], key=lambda r: r.t)
+    replayer = Replayer(records, "ws://server/", loops=2)
+    assert replayer.period == pytest.approx(0.25)
+    stats, log = _replay(records, speed=1, loops=2)
+    start = log[0][0]
+    # the first loop is 7 frames, both tracks start the second one at the same time
+    firsts = {}
+    for t, url, _ in log[7:]:
+        firsts.setdefault(url.rsplit("/", 1)[1], t - start)
+    assert abs(firsts["AUGV_1"] - firsts["AUGV_2"]) < 0.03
+    assert firsts["AUGV_1"] == pytest.approx(0.25, abs=0.03)
+
+def test_record_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(recorder_module.RECORDER, "directory", str(tmp_path))
+    client = TestClient(app)
+    assert client.post("/record/stop").status_code == 400
+    assert client.post("/record/start", json={"name": "../x"}).status_code == 400
+    res = client.post("/record/start", json={"name": "bench"})
+    assert res.json() == {"status": "ok", "session": "bench"}
+    assert client.post("/record/start").status_code == 400
+    recorder_module.RECORDER.record("AUGV_1", b"frame")
+    stopped = client.post("/record/stop").json()
+    assert stopped["recorded"] == 1 and stopped["segments"] == ["bench-00000.augvrec"]
+    assert client.get("/record/stats").json()["active"] is False
+
+def test_record_benchmark(benchmark, tmp_path):
+    rec = Recorder(str(tmp_path))
+    rec.start("bench")
+    payload = b"\xff" * 40_000
+    try:
+        benchmark(rec.record, "AUGV_1", payload)
+    finally:
+        rec.stop()
@@ -0,0 +1,69 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio, multiprocessing, time
+import numpy as np
+from starlette.testclient import TestClient
+from webapp.ASGI import app
+from webapp.tools import resources
+from webapp.tools.resources import Ring, ResourceSampler, WORKER_DTYPE, columns
+
+def _burn(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+def test_ring_keeps_the_newest_rows_in_order():
+    ring = Ring(WORKER_DTYPE, 4)
+    for i in range(6):
+        ring.append((float(i), i * 10.0, i))
+    rows = ring.rows()
+    assert rows["t"].tolist() == [2.0, 3.0, 4.0, 5.0]
+    assert ring.rows(since=3.0)["rss"].tolist() == [4, 5]
+    assert columns(ring.rows(since=4.0)) == {"t": [5.0], "cpu": [50.0], "rss": [5]}
+
+def test_sampler_accounts_for_threads_and_workers():
+    worker = multiprocessing.Process(target=_burn, args=(1.0,), daemon=True)
+    worker.start()
+    try:
+        sampler = ResourceSampler(workers=lambda: {"AUGV_1": worker.pid}, interval=0.2, size=8)
+        sampler.sample()
+        time.sleep(0.3)
+        latest = sampler.sample()
+    finally:
+        worker.join()
+    assert latest["process"]["rss"] > 0
+    assert "MainThread" in latest["threads"]
+    assert latest["workers"]["AUGV_1"]["cpu"] > 10
+    assert sampler.history.count == 2
+    snapshot = sampler.snapshot()
+    assert len(snapshot["history"]["t"]) == 2
+    assert snapshot["history"]["gpu_load"][0] is None or isinstance(snapshot["history"]["gpu_load"][0], float)
+    assert len(snapshot["workers"]["AUGV_1"]["cpu"]) == 2
+
+def test_sampler_task_does_not_block_the_loop():
+    async def main():
+        sampler = ResourceSampler(interval=0.05, size=16).start()
+        ticks = 0
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < 0.3:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        await sampler.stop()
+        return sampler, ticks
+    sampler, ticks = asyncio.run(main())
+    assert sampler.history.count >= 2
+    assert ticks > 15
+
+def test_resources_endpoint():
+    with TestClient(app) as client:
+        for _ in range(50):
+            if resources.RESOURCE_SAMPLER.history.count:
+                break
+            time.sleep(0.05)
+        body = client.get("/resources").json()
+        assert body["latest"]["process"]["rss"] > 0
+        last = body["history"]["t"][-1]
+        assert client.get("/resources", params={"since": last}).json()["history"]["t"] == []
+        assert client.get("/resources", params={"since": "x"}).status_code == 400
+        assert "augv_worker_cpu_percent" in client.get("/metrics").text
@@ -0,0 +1,89 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio, json
+import cv2, numpy as np
+from webapp.AUGV.protocol import PROTO_V1, PROTO_V2, encode_frame, encode_obstacle, parse_frame
+from webapp.AUGV.recorder import Recorder
+from webapp.AUGV.simulator import FleetSimulator, load_corpus, percentiles, read_stamp, stamp, synthetic_corpus
+
+class FakeServer:
+    """ Answers every frame with an obstacle after delay and forwards it to the monitors """
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.monitors = []
+
+    async def connect(self, url):
+        ws = FakeSocket(self, url)
+        if "/ws/monitor" in url:
+            self.monitors.append(ws)
+        return ws
+
+class FakeSocket:
+    def __init__(self, server, url):
+        self.server = server
+        self.proto = PROTO_V2 if "proto=2" in url else PROTO_V1
+        self.inbox = asyncio.Queue()
+
+    async def send(self, message):
+        if isinstance(message, str):
+            return
+        header, data = parse_frame(message)
+        asyncio.get_running_loop().call_later(self.server.delay, self._answer, header.captured_at, bytes(data))
+
+    def _answer(self, captured_at, data):
+        if self.proto == PROTO_V2:
+            self.inbox.put_nowait(encode_obstacle([(1.0, 2.0)], captured_at))
+        else:
+            self.inbox.put_nowait(json.dumps({"action": "obstacle", "data": {"feet": [[1.0, 2.0]], "capturedAt": captured_at}}))
+        for monitor in self.server.monitors:
+            monitor.inbox.put_nowait(b'{"agent_id": "x"}\n' + data)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def close(self):
+        self.inbox.put_nowait(None)
+
+def test_stamp_survives_jpeg_decode():
+    jpeg = synthetic_corpus(count=1)[0]
+    data = stamp(jpeg, 3, 42)
+    assert read_stamp(data) == (3, 42)
+    assert read_stamp(jpeg) is None
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape == (480, 640, 3)
+
+def test_percentiles():
+    assert percentiles([])["p50"] is None
+    stats = percentiles([i / 1000 for i in range(1, 101)])
+    assert stats["count"] == 100 and stats["max"] == 100.0
+    assert 50 <= stats["p50"] <= 51 and 99 <= stats["p99"] <= 100
+
+def test_corpus_from_a_recording(tmp_path):
+    rec = Recorder(str(tmp_path))
+    rec.start("run")
+    rec.record("AUGV_1", encode_frame(b"jpeg-1"))
+    rec.stop()
+    assert load_corpus(str(tmp_path / "run")) == [b"jpeg-1"]
+
+def test_fleet_reports_latency_and_drops():
+    for proto in (PROTO_V1, PROTO_V2):
+        server = FakeServer(delay=0.02)
+        simulator = FleetSimulator("ws://server", agents=2, monitors=1, fps=40, duration=0.5, warmup=0.1, proto=proto,
+                                   connect=server.connect, agent_stats=lambda: {"SIM_1": {"seq": 10, "superseded": 2, "dropped": 0}})
+        report = asyncio.run(simulator.run())
+        assert report["sent"] >= 30
+        assert report["answered"] >= report["sent"] - 4
+        assert 15 <= report["rtt_ms"]["p50"] < 60
+        assert report["monitor_drop_rate"] <= 0.1
+        assert report["per_agent"]["SIM_1"]["server"]["drop_rate"] == 0.2
+        assert "server" not in report["per_agent"]["SIM_2"]
+
+def test_stamp_benchmark(benchmark):
+    jpeg = synthetic_corpus(count=1)[0]
+    benchmark(lambda: read_stamp(stamp(jpeg, 1, 7)))
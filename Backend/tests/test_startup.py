@@ -0,0 +1,62 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import subprocess, types
+from starlette.testclient import TestClient
+from webapp.ASGI import app
+from webapp.tools import startup
+from webapp.tools.config import CONFIG, load_yolo
+from webapp.AUGV import obstacle
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def test_importing_the_app_leaves_out_the_heavy_modules():
+    code = ("import sys, webapp; "
+            "print('loaded:' + ','.join(m for m in ('torch', 'ultralytics', 'onnxruntime', 'numba') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip().splitlines()[-1] == "loaded:"
+
+def test_phases_add_up_and_report():
+    startup.PHASES.pop("test", None)
+    with startup.phase("test"):
+        pass
+    with startup.phase("test"):
+        pass
+    assert startup.PHASES["test"] >= 0.0
+    assert "test " in startup.report() and startup.report().startswith("[Startup] ")
+    startup.PHASES.pop("test")
+
+def test_startup_metric_after_serving():
+    with TestClient(app) as client:
+        body = client.get("/metrics").text
+    assert 'augv_startup_seconds{phase="startup"}' in body
+    assert 'augv_startup_seconds{phase="ready"}' in body
+
+def test_onnx_backend_is_not_preloaded(monkeypatch):
+    monkeypatch.setitem(CONFIG, 'BACKEND', 'onnx')
+    assert startup.preload_backend() is None
+
+def test_load_yolo_detects_the_device(monkeypatch):
+    class YOLO:
+        def __init__(self, name):
+            self.device = None
+        def to(self, device):
+            self.device = device
+    cuda = types.SimpleNamespace(is_available=lambda: True)
+    monkeypatch.setitem(sys.modules, "ultralytics", types.SimpleNamespace(YOLO=YOLO))
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(cuda=cuda))
+    assert load_yolo("yolov8n.pt").device == "cuda"
+    assert load_yolo("yolov8n.pt", "cpu").device == "cpu"
+
+def test_cached_offset_matches_python():
+    args = (obstacle._cam_height, obstacle._cam_forward, obstacle._cam_rot_x, obstacle._cam_fov,
+            obstacle._grid_size, obstacle._node_center)
+    for feet in ((320.0, 470.0), (100.0, 300.0), (600.0, 250.0)):
+        expected = obstacle._offset(*feet, 640, 480, 480, *args)
+        got = obstacle._get_offset(*feet, 640, 480, 480)
+        assert abs(got[0] - expected[0]) < 1e-6 and abs(got[1] - expected[1]) < 1e-6
+
+def test_offset_benchmark(benchmark):
+    obstacle._get_offset(320.0, 470.0, 640, 480, 480)
+    benchmark(obstacle._get_offset, 320.0, 470.0, 640, 480, 480)
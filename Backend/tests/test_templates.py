@@ -0,0 +1,66 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+from starlette.testclient import TestClient
+from webapp.ASGI import app
+from email.utils import parsedate_to_datetime
+from webapp.tools.assets import get_asset
+from webapp.tools.templates import Template, get_template
+
+def test_template_pre_split_render(tmp_path):
+    path = tmp_path / "page.xml"
+    path.write_text("<title><t t-title/></title><main><t t-out/></main><t t-keep/>", encoding="utf-8")
+    template = Template(str(path))
+    assert template.render(title="A", out="<p>B</p>") == "<title>A</title><main><p>B</p></main><t t-keep/>"
+
+def test_template_reload_on_mtime(tmp_path):
+    path = tmp_path / "page.xml"
+    path.write_text("v1", encoding="utf-8")
+    template = Template(str(path))
+    path.write_text("v2", encoding="utf-8")
+    os.utime(path, (time.time() + 5, time.time() + 5))
+    assert template.changed()
+    template.load()
+    assert template.render() == "v2" and not template.changed()
+
+def test_pages_etag_and_304():
+    client = TestClient(app)
+    for page in ["/", "/monitor", "/map", "/client"]:
+        res = client.get(page)
+        assert res.status_code == 200
+        assert "ETag" in res.headers
+        assert "<t t-out/>" not in res.text
+        last_modified = res.headers.get("Last-Modified")
+        res = client.get(page, headers={"If-None-Match": res.headers["ETag"]})
+        assert res.status_code == 304 and res.content == b""
+        if page != "/monitor":
+            res = client.get(page, headers={"If-Modified-Since": last_modified})
+            assert res.status_code == 304
+    res = client.get("/", headers={"If-None-Match": '"stale"'})
+    assert res.status_code == 200
+
+def test_live_page_is_not_validated_by_date():
+    client = TestClient(app)
+    res = client.get("/monitor")
+    # the agent list is live, only the ETag of the body can tell it did not change
+    assert "Last-Modified" not in res.headers
+    res = client.get("/monitor", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert res.status_code == 200
+
+def test_last_modified_follows_the_assets(monkeypatch):
+    client = TestClient(app)
+    before = parsedate_to_datetime(client.get("/map").headers["Last-Modified"]).timestamp()
+    layout = get_template("web_layout.xml")
+    assert layout.assets
+    monkeypatch.setattr(get_asset(layout.assets[0]), "mtime", before + 60)
+    after = parsedate_to_datetime(client.get("/map").headers["Last-Modified"]).timestamp()
+    assert after == int(before + 60)
+
+def test_not_found_page():
+    res = TestClient(app).get("/nope")
+    assert res.status_code == 404 and "Yolo 404" in res.text
+
+def test_page_render_benchmark(benchmark):
+    client = TestClient(app)
+    benchmark(client.get, "/monitor")
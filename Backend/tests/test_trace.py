@@ -0,0 +1,94 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio, time
+import cv2, numpy as np
+from starlette.testclient import TestClient
+from webapp.ASGI import app
+from webapp.tools import trace as tracing
+from webapp.tools.config import CONFIG
+from webapp.tools.trace import FrameTrace
+from webapp.AUGV.decode import FrameDecoder
+from webapp.AUGV.transport import FrameMailbox, OutboundChannel, SharedFrameRing
+
+def test_sample_one_in_n(monkeypatch):
+    monkeypatch.setitem(CONFIG, 'TRACE_SAMPLE_EVERY', 3)
+    sampled = [tracing.sample("AUGV_sample") is not None for _ in range(7)]
+    assert sampled == [True, False, False, True, False, False, True]
+    monkeypatch.setitem(CONFIG, 'TRACE_SAMPLE_EVERY', 0)
+    assert tracing.sample("AUGV_sample") is None
+    tracing.forget("AUGV_sample")
+
+def test_trace_follows_the_frame_to_the_mailbox():
+    tracing.clear()
+    ok, jpg = cv2.imencode('.jpg', np.zeros((48, 64, 3), np.uint8))
+    mailbox = FrameMailbox()
+    decoder = FrameDecoder("AUGV_1", mailbox)
+    trace = FrameTrace("AUGV_1")
+    decoder._decode(jpg.tobytes(), None, trace)
+    mailbox.get(timeout=1)
+    assert mailbox.last_trace is trace
+    assert [name for name, _ in trace.marks] == ["receive", "decode_wait", "decode"]
+    # a newer frame supersedes the pending one and finishes its trace
+    first, second = FrameTrace("AUGV_1"), FrameTrace("AUGV_1")
+    mailbox.put_nowait(np.zeros((2, 2, 3), np.uint8), trace=first)
+    mailbox.put_nowait(np.zeros((2, 2, 3), np.uint8), trace=second)
+    assert first.status == "superseded" and list(tracing.TRACES) == [first]
+    assert second.status is None
+
+def test_shared_frame_ring_keeps_the_traces_in_the_controller():
+    ring = SharedFrameRing((4, 4, 3), slots=3)
+    try:
+        first, second = FrameTrace("AUGV_1"), FrameTrace("AUGV_1")
+        ring.put_nowait(np.zeros((4, 4, 3), np.uint8), trace=first)
+        ring.put_nowait(np.zeros((4, 4, 3), np.uint8), trace=second)
+        ring.get(timeout=1)
+        assert first.status == "superseded"
+        assert ring.take_trace(ring.last_seq) is second
+    finally:
+        ring.release()
+
+def test_outbound_channel_carries_the_trace():
+    async def main():
+        channel = OutboundChannel()
+        old, new = FrameTrace("AUGV_1"), FrameTrace("AUGV_1")
+        channel.put_nowait({"action": "obstacle", "data": {}}, trace=old)
+        channel.put_nowait({"action": "obstacle", "data": {}}, trace=new)
+        await channel.get()
+        return channel, old, new
+    channel, old, new = asyncio.run(main())
+    assert old.status == "coalesced"
+    assert channel.last_trace is new
+
+def test_chrome_trace_nests_the_spans():
+    trace = FrameTrace("AUGV_1", t=1.0)
+    for i, name in enumerate(("decode_wait", "decode", "queue_wait", "inference", "postprocess", "outbound_wait", "dispatch")):
+        trace.mark(name, 1.0 + (i + 1) * 0.001)
+    trace.finish()
+    events = tracing.chrome_trace([trace])["traceEvents"]
+    spans = [e for e in events if e["ph"] in ("b", "e")]
+    assert spans[0]["name"] == "frame" and spans[-1]["name"] == "frame"
+    assert spans[0]["args"]["status"] == "ok"
+    assert len(spans) == 2 + 7 * 2
+    assert all(e["id"] == trace.id for e in spans)
+    inference = [e["ts"] for e in spans if e["name"] == "inference"]
+    assert round(inference[1] - inference[0]) == 1000
+
+def test_debug_trace_endpoint():
+    tracing.clear()
+    for agent_id in ("AUGV_1", "AUGV_2"):
+        FrameTrace(agent_id).finish("no_obstacle")
+    client = TestClient(app)
+    res = client.get("/debug/trace", params={"agent": "AUGV_2"})
+    assert res.status_code == 200
+    names = [e["args"]["name"] for e in res.json()["traceEvents"] if e["name"] == "thread_name"]
+    assert names == ["AUGV_2"]
+    client.get("/debug/trace", params={"clear": 1})
+    assert not tracing.TRACES
+
+def test_trace_mark_benchmark(benchmark):
+    trace = FrameTrace("AUGV_1")
+    def mark():
+        trace.mark("decode")
+        del trace.marks[1:]
+    benchmark(mark)
@@ -0,0 +1,110 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio, threading, time
+import cv2, numpy as np
+from webapp.AUGV.transport import OutboundChannel, FrameMailbox, SharedFrameRing
+from webapp.AUGV.decode import FrameDecoder
+
+def obstacle(i):
+    return {"action": "obstacle", "data": {"agent_id": "AUGV_1", "feet": [(i, i)]}}
+
+def test_outbound_channel_coalesces_obstacle():
+    channel = OutboundChannel(maxsize=4)
+    for i in range(1000):
+        channel.put_nowait(obstacle(i))
+    assert channel.qsize() == 1
+    assert channel.coalesced == 999
+    msg = asyncio.run(channel.get())
+    assert msg["data"]["feet"] == [(999, 999)]
+
+def test_outbound_channel_is_bounded():
+    channel = OutboundChannel(maxsize=4)
+    for i in range(10):
+        channel.put_nowait({"action": "route", "data": i})
+    assert channel.qsize() == 4
+    assert channel.dropped == 6
+    async def drain():
+        return [(await channel.get())["data"] for _ in range(4)]
+    assert asyncio.run(drain()) == [6, 7, 8, 9]
+
+def test_outbound_channel_wakes_from_thread():
+    channel = OutboundChannel()
+    async def consume():
+        threading.Thread(target=lambda: (time.sleep(0.05), channel.put_nowait(obstacle(1)))).start()
+        return await asyncio.wait_for(channel.get(), timeout=2)
+    assert asyncio.run(consume())["data"]["feet"] == [(1, 1)]
+
+def test_frame_mailbox_latest_frame_wins():
+    mailbox = FrameMailbox()
+    for i in range(5):
+        mailbox.put_nowait(i, captured_at=100.0 + i)
+    mailbox.drop()
+    time.sleep(0.01)
+    assert mailbox.get_nowait() == 4
+    assert (mailbox.last_seq, mailbox.last_captured_at) == (5, 104.0)
+    stats = mailbox.stats()
+    assert (stats["seq"], stats["superseded"], stats["dropped"], stats["taken"]) == (5, 4, 1, 1)
+    assert stats["age_last_ms"] >= 10
+    mailbox.put(None)
+    assert mailbox.get() is None and mailbox.empty()
+
+def test_shared_frame_ring_latest_frame_wins():
+    ring = SharedFrameRing((48, 64, 3))
+    try:
+        for i in range(5):
+            ring.put_nowait(np.full((48, 64, 3), i, dtype=np.uint8), captured_at=100.0 + i)
+        frame = ring.get_nowait()
+        assert frame.shape == (48, 64, 3) and frame[0, 0, 0] == 4
+        assert (ring.last_seq, ring.last_captured_at) == (5, 104.0)
+        # the slot being read is not overwritten by the next frames
+        for i in range(5, 10):
+            ring.put_nowait(np.full((48, 64, 3), i, dtype=np.uint8))
+        assert frame[0, 0, 0] == 4
+        stats = ring.stats()
+        assert (stats["seq"], stats["superseded"], stats["taken"]) == (10, 8, 1)
+        ring.put(None)
+        assert ring.get() is None
+    finally:
+        ring.release()
+
+def test_frame_decoder_newest_jpeg_wins():
+    mailbox = FrameMailbox()
+    decoder = FrameDecoder("AUGV_1", mailbox)
+    jpegs = [cv2.imencode('.jpg', np.full((48, 64, 3), i * 10, np.uint8))[1].tobytes() for i in range(10)]
+    for i, jpg in enumerate(jpegs):
+        decoder.submit(jpg, captured_at=float(i))
+    deadline = time.time() + 2
+    while mailbox.last_captured_at != 9.0 and time.time() < deadline:
+        time.sleep(0.01)
+    frame = mailbox.get(timeout=1)
+    assert frame.shape == (48, 64, 3) and abs(int(frame[0, 0, 0]) - 90) <= 2
+    assert mailbox.last_scale == 1.0
+    stats = mailbox.stats()
+    # every JPEG is either decoded or replaced before its decode started
+    assert stats["seq"] + decoder.superseded == len(jpegs)
+
+def test_mp_result_drain_survives_a_bad_result(monkeypatch):
+    from webapp.AUGV import obstacle
+    import queue
+    published = []
+    class Agent:
+        q = type("Ring", (), {"take_trace": lambda self, seq: None})()
+        def _observe(self, timings, marks=None, trace=None):
+            pass
+        def _publish_result(self, detections, blocked_offsets, feet_list):
+            published.append(detections)
+    results = queue.Queue()
+    monkeypatch.setattr(obstacle, "MP_RESULTS", results)
+    monkeypatch.setitem(obstacle.GLOBAL_AGENT, "AUGV_MP", Agent())
+    results.put(("AUGV_MP", "result", ("too", "short")))
+    results.put(("AUGV_MP", "result", (["ok"], [], [], None, None, 0, None)))
+    async def drain():
+        task = asyncio.get_running_loop().create_task(obstacle.drain_mp_results())
+        deadline = time.monotonic() + 2
+        while not published and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        assert not task.done()
+        task.cancel()
+    asyncio.run(drain())
+    assert published == [["ok"]]
@@ -0,0 +1,116 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from webapp.bench import runner, tuner
+from webapp.tools.config import CONFIG
+
+def _fake_run(capacity, latency_ms, calls=None):
+    """ A backend that serves capacity frames/s in total, a pass takes latency_ms until it is saturated """
+    def run(scenario, passes, onnx_model, frames):
+        if calls is not None:
+            calls.append(scenario)
+        fps_total = min(scenario.agents * 1000.0 / latency_ms, capacity)
+        return {"agents": scenario.agents, "batch": scenario.batch, "error": None, "fps_total": fps_total,
+                "fps_per_agent": fps_total / scenario.agents, "latency_ms": {"p95": scenario.agents * 1000.0 / fps_total}}
+    return run
+
+def test_ramp():
+    assert tuner.ramp(1) == [1]
+    assert tuner.ramp(5) == [1, 2, 4, 5]
+    assert tuner.ramp(8) == [1, 2, 4, 8]
+
+def test_candidate_stops_when_throughput_plateaus():
+    calls = []
+    row = tuner.tune_candidate("pt", "cpu", "threading", 16, 1000, "64x48", 5, 0.05, run=_fake_run(40, 50, calls))
+    # 20 fps per agent, saturated at 2 agents: 1, 2, 4 and no more
+    assert [s.agents for s in calls] == [1, 2, 4]
+    assert row["estimated"] and row["fps_per_agent"] == 2.5
+    assert row["p95"] == pytest.approx(400.0)
+
+def test_candidate_reaches_the_target():
+    row = tuner.tune_candidate("onnx", "cpu", "batching", 4, 100, "64x48", 5, 0.05, run=_fake_run(1000, 20))
+    assert not row["estimated"] and row["fps_per_agent"] == 50 and row["batch"] == 4
+
+def test_candidate_error():
+    run = lambda scenario, *args: {"agents": scenario.agents, "error": "no CUDA"}
+    assert tuner.tune_candidate("onnx", "cuda", "threading", 4, 100, "64x48", 5, 0.05, run=run)["error"] == "no CUDA"
+
+def test_choose_prefers_the_slo():
+    rows = [{"error": None, "fps_per_agent": 30, "p95": 150}, {"error": None, "fps_per_agent": 20, "p95": 60},
+            {"error": "boom"}]
+    assert tuner.choose(rows, 100)["fps_per_agent"] == 20
+    assert tuner.choose(rows, 10)["p95"] == 60
+    assert tuner.choose([{"error": "boom"}], 100) is None
+
+def test_tune_builds_a_profile(monkeypatch):
+    monkeypatch.setattr(tuner, "load_frames", lambda size, source=None: [])
+    profile = tuner.tune(target=4, slo_ms=100, pairs=[("pt", "cpu"), ("onnx", "cpu")], run=_fake_run(400, 20))
+    assert profile["target_agents"] == 4 and len(profile["rows"]) == 6
+    assert profile["settings"]["INFERENCE_METHOD"] in tuner.METHODS
+    assert profile["settings"]["TARGET_FPS"] == 40
+
+def test_profiles_are_keyed_by_host_and_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(tuner, "FINGERPRINT_PATH", str(tmp_path / "fingerprint.json"))
+    model = tmp_path / "model.onnx"
+    model.write_bytes(b"one")
+    key = tuner.profile_key("yolov8n.pt", str(model))
+    model.write_bytes(b"two")
+    os.utime(model, ns=(1, 1))
+    assert tuner.profile_key("yolov8n.pt", str(model)) != key
+    path = str(tmp_path / "profiles.json")
+    tuner.save_profile(key, {"created": "now", "settings": {"TARGET_FPS": 7}}, path)
+    assert tuner.load_profile(key, path)["settings"] == {"TARGET_FPS": 7}
+    assert tuner.load_profile("other", path) is None
+
+def test_profile_key_is_cached_between_starts(tmp_path, monkeypatch):
+    monkeypatch.setattr(tuner, "FINGERPRINT_PATH", str(tmp_path / "fingerprint.json"))
+    model = tmp_path / "model.onnx"
+    model.write_bytes(b"weights")
+    gpus, hashed = [], []
+    monkeypatch.setattr(tuner, "_gpus", lambda: gpus.append(True) or [])
+    digest = tuner.hashlib.sha256
+    monkeypatch.setattr(tuner.hashlib, "sha256", lambda *args: hashed.append(True) or digest(*args))
+    key = tuner.profile_key("yolov8n.pt", str(model))
+    assert gpus == [True] and len(hashed) == 2
+    assert tuner.profile_key("yolov8n.pt", str(model)) == key
+    # only the key digest itself, no model file and no nvidia-smi
+    assert gpus == [True] and len(hashed) == 3
+
+def test_start_applies_the_profile_and_tunes_only_without_one(monkeypatch):
+    launched = []
+    profiles = {}
+    monkeypatch.setattr(tuner, "launch", lambda: launched.append(True))
+    monkeypatch.setattr(tuner, "profile_key", lambda: "host")
+    monkeypatch.setattr(tuner, "load_profile", lambda key: profiles.get(key))
+    monkeypatch.setitem(CONFIG, 'TARGET_FPS', 10)
+    tuner.start('auto')
+    assert launched == [True]
+    profiles["host"] = {"created": "now", "settings": {"TARGET_FPS": 7}}
+    tuner.start('auto')
+    assert launched == [True] and CONFIG['TARGET_FPS'] == 7
+    tuner.start('off')
+    assert launched == [True]
+
+def test_load_frames_resizes_the_corpus(tmp_path):
+    frames = tuner.load_frames("64x48", str(tmp_path))
+    assert len(frames) == tuner.CORPUS_FRAMES
+    assert all(frame.shape == (48, 64, 3) for frame in frames)
+
+def test_run_scenario_uses_the_corpus(monkeypatch):
+    seen = []
+    class Engine:
+        max_batch = 1
+        def __init__(self, scenario, model_path):
+            pass
+        def _infer_batch(self, frames):
+            seen.extend(id(frame) for frame in frames)
+    monkeypatch.setattr(runner, "BenchEngine", Engine)
+    frames = tuner.load_frames("64x48", None, count=2)
+    result = runner.run_scenario(runner.Scenario("pt", "cpu", "threading", 1, 0.0, "64x48", 1), 4, None, frames)
+    assert result["error"] is None
+    assert set(seen) == {id(frame) for frame in frames}
+
+def test_tune_benchmark(benchmark, monkeypatch):
+    monkeypatch.setattr(tuner, "load_frames", lambda size, source=None: [])
+    benchmark(tuner.tune, target=8, slo_ms=100, pairs=[("pt", "cpu"), ("onnx", "cpu")], run=_fake_run(400, 20))
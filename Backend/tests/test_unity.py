@@ -0,0 +1,104 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio, time
+import pytest
+from webapp.AUGV.unity import UnityLink, encode_frame, read_frame
+from webapp.tools.config import CONFIG
+
+class FakeUnity:
+    """ Stands in for SocketServer.cs, acks the messages it got in reverse order by batch """
+    def __init__(self, batch=1, ack=True):
+        self.batch = batch
+        self.ack = ack
+        self.received = []
+        self.writers = []
+
+    async def handle(self, reader, writer):
+        self.writers.append(writer)
+        batch = []
+        try:
+            while True:
+                msg = await read_frame(reader)
+                self.received.append(msg)
+                batch.append(msg)
+                if len(batch) >= self.batch:
+                    if self.ack:
+                        for m in reversed(batch):
+                            writer.write(encode_frame({"ack": m["id"], "status": "ok"}))
+                        await writer.drain()
+                    batch = []
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        for writer in self.writers:
+            writer.close()
+        await self.server.wait_closed()
+
+def test_unity_link_pipelines_on_one_connection():
+    async def main():
+        unity = FakeUnity(batch=5)
+        link = UnityLink("127.0.0.1", await unity.start())
+        acks = await link.send_many([{"action": "route", "data": {"agent_{}".format(i): []}} for i in range(5)])
+        await link.close()
+        await unity.stop()
+        return link, unity, acks
+    link, unity, acks = asyncio.run(main())
+    # all 5 were written before the first ack came back, the acks came in reverse
+    assert [ack["status"] for ack in acks] == ["ok"] * 5
+    assert [ack["ack"] for ack in acks] == [msg["id"] for msg in unity.received]
+    assert link.connects == 1
+    assert link.acked == 5
+
+def test_unity_link_reconnects_after_a_drop():
+    async def main():
+        unity = FakeUnity()
+        link = UnityLink("127.0.0.1", await unity.start())
+        await link.send({"action": "route", "data": {}})
+        unity.writers[0].close()
+        await asyncio.sleep(0.05)
+        assert not link.connected
+        ack = await link.send({"action": "route", "data": {}})
+        await link.close()
+        await unity.stop()
+        return link, ack
+    link, ack = asyncio.run(main())
+    assert ack["status"] == "ok"
+    assert link.connects == 2
+
+def test_unity_link_backs_off_when_unity_is_down(monkeypatch):
+    monkeypatch.setitem(CONFIG, 'UNITY_BACKOFF_MIN_S', 5.0)
+    async def main():
+        unity = FakeUnity()
+        port = await unity.start()
+        await unity.stop()
+        link = UnityLink("127.0.0.1", port)
+        with pytest.raises(ConnectionError):
+            await link.send({"action": "route", "data": {}})
+        t0 = time.monotonic()
+        with pytest.raises(ConnectionError, match="retrying"):
+            await link.send({"action": "route", "data": {}})
+        return time.monotonic() - t0
+    assert asyncio.run(main()) < 0.05
+
+def test_unity_link_times_out_without_ack():
+    async def main():
+        unity = FakeUnity(ack=False)
+        link = UnityLink("127.0.0.1", await unity.start())
+        with pytest.raises(TimeoutError):
+            await link.send({"action": "route", "data": {}}, timeout=0.1)
+        stats = link.stats()
+        await link.close()
+        await unity.stop()
+        return stats
+    stats = asyncio.run(main())
+    assert stats["failed"] == 1
+    assert stats["in_flight"] == 0
@@ -1,43 +1,55 @@
 from starlette.applications import Starlette
-from starlette.staticfiles import StaticFiles
 from starlette.requests import Request
 
 from .AUGV.controller import AGENT_FRAMES
-from .AUGV.obstacle import AGENT_PROCS, AGENT_QUEUES, AGENT_OUT_QUEUES, AGENT_STATE, GLOBAL_AGENT
+from .AUGV.obstacle import AGENT_PROCS, AGENT_QUEUES, AGENT_OUT_QUEUES, AGENT_STATE, GLOBAL_AGENT, stop_batch_engine, stop_mp_result_drain
+from .AUGV.monitor import stop_monitors
+from .AUGV.mapsync import start_map_sync, stop_map_sync
+from .AUGV.unity import close_unity_link
+from .AUGV.recorder import RECORDER
 import os
-from .tools.decorator import endroute, ROUTES, render_layout
-import threading, psutil, time
+from .tools.decorator import endroute, ROUTES, render_page
+from .tools.assets import AssetStaticFiles
+from .tools import resources as _resources
+from .tools.resources import start_resource_sampler, stop_resource_sampler
+from .tools import startup
+from starlette.responses import JSONResponse
 import queue
 
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 
-def log_resource_usage():
-    import shutil
+def _worker_pids():
+    """ The multiprocessing agents, named in the resource sampler """
+    return {agent_id: proc.pid for agent_id, proc in list(AGENT_PROCS.items()) if getattr(proc, 'pid', None)}
+
+async def start_resources():
+    await start_resource_sampler(_worker_pids)
+
+async def on_startup():
+    """ Startup handlers, timed (webapp/tools/startup.py), the PT backend is imported in the background once serving """
+    with startup.phase("startup"):
+        start_map_sync()
+        await start_resources()
+    startup.ready()
+    startup.preload_backend()
+
+@endroute("/resources", type="http", methods=["GET"])
+async def resources(req: Request):
+    """ Latest sample and history of the resource sampler (webapp/tools/resources.py), ?since=<t> for the new rows only """
+    sampler = _resources.RESOURCE_SAMPLER
+    if sampler is None:
+        return JSONResponse({"status": "error", "error": "Resource sampler not running"}, status_code=503)
+    since = req.query_params.get("since")
     try:
-        import GPUtil
-    except ImportError:
-        GPUtil = None
-    while True:
-        cpu = psutil.cpu_percent(interval=1)
-        mem = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        net = psutil.net_io_counters()
-        log = f"[Resource] CPU: {cpu}% | Mem: {mem.percent}% ({mem.used//(1024**2)}MB/{mem.total//(1024**2)}MB) | Disk: {disk.percent}% | Net: sent {net.bytes_sent//(1024**2)}MB recv {net.bytes_recv//(1024**2)}MB"
-        if GPUtil:
-            gpus = GPUtil.getGPUs()
-            for gpu in gpus:
-                log += f" | GPU {gpu.id}: {gpu.load*100:.1f}% {gpu.memoryUsed}MB/{gpu.memoryTotal}MB"
-        print(log)
-        time.sleep(10)
-
-threading.Thread(target=log_resource_usage, daemon=True).start()
+        since = float(since) if since else None
+    except ValueError:
+        return JSONResponse({"status": "error", "error": "Invalid since"}, status_code=400)
+    return JSONResponse(sampler.snapshot(since))
 
 @endroute("/monitor", type="http", methods=["GET"])
 async def monitor_frontend(req: Request):
     EXPECTED_AGENTS = [f"AUGV_{i}" for i in range(1, 6)]
-    agents = list(set(AGENT_FRAMES.keys()) | set(EXPECTED_AGENTS))
-    with open("webapp/static/xml/page_monitor.xml", "r", encoding="utf-8") as f:
-        base_template = f.read()
+    agents = sorted(set(AGENT_FRAMES.keys()) | set(EXPECTED_AGENTS))
     agents_monitor = ""
     for agent in agents:
         agents_monitor += f'''
@@ -48,31 +60,22 @@ async def monitor_frontend(req: Request):
             </div>
         </div>
         '''
-    content = base_template.replace("<t t-agents/>", agents_monitor)
-    return render_layout("Yolo Monitor", content)
+    return render_page(req, "Yolo Monitor", "page_monitor.xml", agents=agents_monitor)
 
 @endroute("/", type="http", methods=["GET"])
 async def home(req: Request):
-    with open("webapp/static/xml/page_home.xml", "r", encoding="utf-8") as f:
-        content = f.read()
-    return render_layout("Yolo Home", content)
+    return render_page(req, "Yolo Home", "page_home.xml")
 
 @endroute("/map", type="http", methods=["GET"])
 async def map(req: Request):
-    with open("webapp/static/xml/page_map.xml", "r", encoding="utf-8") as f:
-        content = f.read()
-    return render_layout("Yolo Map", content)
+    return render_page(req, "Yolo Map", "page_map.xml")
 
 @endroute("/client", type="http", methods=["GET"])
 async def client_frontend(req: Request):
-    with open("webapp/static/xml/page_client.xml", "r", encoding="utf-8") as f:
-        content = f.read()
-    return render_layout("Client Route Editor", content)
+    return render_page(req, "Client Route Editor", "page_client.xml")
 
 async def not_found(req: Request, exc):
-    with open("webapp/static/xml/page_404.xml", "r", encoding="utf-8") as f:
-        content = f.read()
-    return render_layout("Yolo 404", content)
+    return render_page(req, "Yolo 404", "page_404.xml", status_code=404)
 
 async def on_shutdown():
     """ This function is called when the server is shutting down, to make sure all processes and queues are closed. """
@@ -87,24 +90,33 @@ async def on_shutdown():
             except Exception as e:
                 print(f"Error shutting down agent {agent_id}: {e}")
 
-        for agent_id in list(GLOBAL_AGENT.keys()):
-            _cleanup_model(agent_id)
-        
-        _cleanup_all_queues()
+    for agent_id in list(GLOBAL_AGENT.keys()):
+        _cleanup_model(agent_id)
+
+    stop_batch_engine()
+    stop_mp_result_drain()
+    await stop_monitors()
+    stop_map_sync()
+    await close_unity_link()
+    await stop_resource_sampler()
+    RECORDER.stop()
+    
+    _cleanup_all_queues()
 
-        AGENT_FRAMES.clear()
-        AGENT_OUT_QUEUES.clear()
-        AGENT_QUEUES.clear()
-        AGENT_STATE.clear()
-        GLOBAL_AGENT.clear()
-        AGENT_PROCS.clear()
+    AGENT_FRAMES.clear()
+    AGENT_OUT_QUEUES.clear()
+    AGENT_QUEUES.clear()
+    AGENT_STATE.clear()
+    GLOBAL_AGENT.clear()
+    AGENT_PROCS.clear()
 
-        print("All processes and queues cleaned up completely")
+    print("All processes and queues cleaned up completely")
 
 app = Starlette(routes=ROUTES, debug=True)
 app.add_exception_handler(404, not_found)
+app.add_event_handler("startup", on_startup)
 app.add_event_handler("shutdown", on_shutdown)
-app.mount("/static", StaticFiles(directory=STATIC_DIR, html=True), name="static")
+app.mount("/static", AssetStaticFiles(directory=STATIC_DIR, html=True), name="static")
 
 application = app
 
@@ -135,16 +147,12 @@ def _cleanup_all_queues():
                     q.get_nowait()
                 except queue.Empty:
                     break
+            if hasattr(q, 'release'):
+                q.release()
             AGENT_QUEUES.pop(agent_id, None)
             
             if agent_id in AGENT_OUT_QUEUES:
-                q = AGENT_OUT_QUEUES.get(agent_id)
-                while q and not q.empty():
-                    try:
-                        q.get_nowait()
-                    except queue.Empty:
-                        break
-                AGENT_OUT_QUEUES.pop(agent_id, None)
+                AGENT_OUT_QUEUES.pop(agent_id).clear()
 
             print(f"[ASGI] Queues cleaned up for agent {agent_id}")
         
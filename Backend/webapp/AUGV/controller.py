@@ -8,33 +8,56 @@ it will handle all the websocket and post requests
 """
 
 from webapp.tools.decorator import endroute
-from webapp.AUGV.obstacle import AGENT_QUEUES, AGENT_STATE, AGENT_OUT_QUEUES, AGENT_PROCS, create_agent, GLOBAL_AGENT
+from webapp.AUGV.obstacle import AGENT_QUEUES, AGENT_STATE, AGENT_OUT_QUEUES, AGENT_PROCS, create_agent, create_out_channel, GLOBAL_AGENT, start_mp_result_drain
+from webapp.AUGV.decode import AGENT_DECODERS, create_decoder
+from webapp.AUGV.protocol import PROTO_V2, ProtocolError, encode_obstacle, negotiate, parse_frame
+from webapp.AUGV.maps import MAPS
+from webapp.AUGV.unity import get_unity_link
+from webapp.AUGV.recorder import RECORDER
+from webapp.AUGV.monitor import MONITOR_CLIENTS, forget, publish, register_monitor, unregister_monitor
 from webapp.tools.config import CONFIG
+from webapp.tools import metrics, trace as tracing
+from webapp.tools.metrics import FRAMES_RECEIVED, OUTBOUND_MESSAGES, STAGE_SECONDS
 
-import os, cv2, numpy as np, asyncio, json, socket, shutil
-from pathlib import Path
+import os, cv2, numpy as np, asyncio, json, time
 
 from starlette.websockets import WebSocketDisconnect, WebSocket
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
 from starlette.requests import Request
 
-MONITOR_CLIENTS = set()
 AGENT_FRAMES = {}
 
 @endroute("/ws/augv/{agent_id}", type="ws")
 async def augv_ws(ws: WebSocket):
     agent_id = ws.path_params["agent_id"]
+    proto = negotiate(ws.query_params)
     await ws.accept()
+    if proto == PROTO_V2:
+        await ws.send_json({"action": "hello", "proto": proto})
+    out_channel = create_out_channel(agent_id)
     
     if agent_id not in AGENT_QUEUES:
         agent = create_agent(agent_id)
         agent.start()
+        if CONFIG['INFERENCE_METHOD'] == 'multiprocessing':
+            start_mp_result_drain()
 
     async def _dispatch():
         while True:
             try:
-                msg = await AGENT_OUT_QUEUES[agent_id].get()
-                await ws.send_json(msg)
+                msg = await out_channel.get()
+                trace = out_channel.last_trace
+                if trace is not None:
+                    trace.mark("outbound_wait")
+                if proto == PROTO_V2 and msg.get("action") == "obstacle":
+                    await ws.send_bytes(encode_obstacle(msg["data"]["feet"], msg["data"].get("capturedAt")))
+                else:
+                    await ws.send_json(msg)
+                OUTBOUND_MESSAGES.inc(agent_id)
+                STAGE_SECONDS.observe(time.monotonic() - out_channel.last_enqueued_at, "dispatch")
+                if trace is not None:
+                    trace.mark("dispatch")
+                    trace.finish()
             except asyncio.CancelledError:
                 print(f"[Controller] Agent {agent_id} asyncio cancelled")
                 break
@@ -50,41 +73,31 @@ async def augv_ws(ws: WebSocket):
     try:
         while True:
             raw = await ws.receive_bytes()
-            header, data = raw.split(b"\n", 1)
-            params = json.loads(header.decode('utf-8'))
-            useYolo = params.get("useYolo", False)
-            if useYolo:
-                xx = GLOBAL_AGENT[agent_id]
-                xx.use_yolo = True
-            else:
-                xx = GLOBAL_AGENT[agent_id]
-                xx.use_yolo = False
+            received_at = time.perf_counter()
+            FRAMES_RECEIVED.inc(agent_id)
+            if RECORDER.active:
+                RECORDER.record(agent_id, raw)
+            try:
+                header, data = parse_frame(raw)
+            except (ProtocolError, ValueError) as e:
+                print(f"[Controller] Invalid frame from agent {agent_id}: {e}")
+                AGENT_QUEUES[agent_id].drop()
+                continue
+            useYolo = header.use_yolo
+            agent = GLOBAL_AGENT[agent_id]
+            agent.use_yolo = bool(useYolo)
 
             AGENT_FRAMES[agent_id] = data
 
-            try:
-                frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
-                
-                if frame is not None and not AGENT_QUEUES[agent_id].full():
-                    AGENT_QUEUES[agent_id].put_nowait(frame)
-                
-            except Exception as e:
-                print(f"Error processing frame for agent {agent_id}: {e}")
+            if useYolo:
+                # decode off the event loop, the newest frame wins (webapp/AUGV/decode.py)
+                trace = tracing.sample(agent_id, received_at)
+                create_decoder(agent_id, AGENT_QUEUES[agent_id]).submit(data, captured_at=header.captured_at, trace=trace)
+            elif AGENT_STATE.get(agent_id, {}).get("detections"):
+                # the frame only goes to the monitor, clear the last detections
+                AGENT_STATE[agent_id] = {"status": "safe", "detections": [], "blocked_offsets": []}
         
-            if MONITOR_CLIENTS:
-                header = json.dumps({
-                    "agent_id": agent_id,
-                    "detections": AGENT_STATE.get(agent_id, {}).get("detections", [])
-                }).encode() + b"\n"
-                payload = header + data
-
-                send_task = [client.send_bytes(payload) for client in list(MONITOR_CLIENTS)]
-                results = await asyncio.gather(*send_task, return_exceptions=True)
-
-                for client, result in zip(list(MONITOR_CLIENTS), results):
-                    if isinstance(result, Exception):
-                        print(f"Error sending to monitor client: {result}")
-                        MONITOR_CLIENTS.discard(client)
+            publish(agent_id, data, AGENT_STATE.get(agent_id, {}).get("detections", []))
 
     except WebSocketDisconnect:
         print(f"[Controller] Agent {agent_id} disconnected")
@@ -98,23 +111,21 @@ async def augv_ws(ws: WebSocket):
 @endroute("/ws/monitor", type="ws") 
 async def monitor_ws(ws: WebSocket):
     await ws.accept()
-    MONITOR_CLIENTS.add(ws)
+    client = register_monitor(ws)
 
     try:
-        for agent_id, frame in AGENT_FRAMES.items():
-            try:
-                header = json.dumps({
-                    "agent_id": agent_id
-                }).encode() + b"\n"
-                await ws.send_bytes(header + frame)
-            except WebSocketDisconnect:
-                print(f"Monitor client disconnected")
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                print("Monitor client disconnected")
                 break
-            except Exception as e:
-                print(f"Error sending frame to monitor client: {e}")
-            
-            while True:
-                await asyncio.sleep(10)
+            if msg.get("text"):
+                try:
+                    body = json.loads(msg["text"])
+                    if body.get("action") == "subscribe":
+                        client.subscribe(body.get("agents"), body.get("max_fps"), body.get("tier", "full"), body.get("framing", "joined"))
+                except (ValueError, TypeError) as e:
+                    print(f"Invalid monitor subscription: {e}")
             
     except WebSocketDisconnect:
         print("Monitor client disconnected")
@@ -122,34 +133,121 @@ async def monitor_ws(ws: WebSocket):
         print(f"Error in monitor websocket: {e}")
     finally:
         print("Monitor client websocket closed")
-        MONITOR_CLIENTS.discard(ws)
+        await unregister_monitor(client)
 
-# Controller json
-MAPS_DIR = os.path.join(os.path.dirname(__file__), "maps_json")
-os.makedirs(MAPS_DIR, exist_ok=True)
+@endroute("/monitor/stats", type="http", methods=["GET"])
+async def monitor_stats(req: Request):
+    """ Per monitor client subscription and counters (pending, sent, dropped, throttled) """
+    return JSONResponse([client.stats() for client in list(MONITOR_CLIENTS)])
+
+@endroute("/agents/stats", type="http", methods=["GET"])
+async def agents_stats(req: Request):
+    """ Per agent frame counters (superseded, dropped) and frame age at inference """
+    stats = {}
+    for agent_id, q in list(AGENT_QUEUES.items()):
+        stats[agent_id] = q.stats() if hasattr(q, 'stats') else {}
+        if agent_id in AGENT_DECODERS:
+            stats[agent_id].update(AGENT_DECODERS[agent_id].stats())
+    return JSONResponse(stats)
+
+@endroute("/metrics", type="http", methods=["GET"])
+async def metrics_endpoint(req: Request):
+    """ Prometheus text format, see webapp/tools/metrics.py """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def _frame_counts(labels):
+    """ Scrape time values of the mailbox / decoder stats per agent, labels is {stats key: label value or None} """
+    def collect():
+        values = {}
+        for agent_id, q in list(AGENT_QUEUES.items()):
+            stats = q.stats() if hasattr(q, 'stats') else {}
+            decoder = AGENT_DECODERS.get(agent_id)
+            if decoder is not None:
+                stats.update(decoder.stats())
+            for key, label in labels.items():
+                values[(agent_id, label) if label else (agent_id,)] = stats.get(key, 0)
+        return values
+    return collect
+
+def _outbound_counts():
+    values = {}
+    for agent_id, channel in list(AGENT_OUT_QUEUES.items()):
+        values[(agent_id, "dropped")] = channel.dropped
+        values[(agent_id, "coalesced")] = channel.coalesced
+    return values
+
+metrics.register(metrics.Counter("augv_frames_superseded_total", "Frames replaced by a newer one before they were used.",
+                                 ("agent", "stage"), collect=_frame_counts({"decode_superseded": "decode", "superseded": "mailbox"})))
+metrics.register(metrics.Counter("augv_frames_dropped_total", "Frames that could not be parsed or decoded.",
+                                 ("agent",), collect=_frame_counts({"dropped": None})))
+metrics.register(metrics.Counter("augv_outbound_skipped_total", "Messages to the agent that were never sent (coalesced into a newer one, or dropped).",
+                                 ("agent", "reason"), collect=_outbound_counts))
+metrics.register(metrics.Gauge("augv_agents_connected", "Agents with an open websocket.", collect=lambda: {(): len(AGENT_QUEUES)}))
+metrics.register(metrics.Gauge("augv_monitor_clients", "Connected monitor dashboards.", collect=lambda: {(): len(MONITOR_CLIENTS)}))
+
+@endroute("/debug/trace", type="http", methods=["GET"])
+async def debug_trace(req: Request):
+    """ The sampled frame traces as Chrome trace-event JSON, ?agent=AUGV_1 to filter, ?clear=1 to empty the buffer """
+    traces = list(tracing.TRACES)
+    agent_id = req.query_params.get("agent")
+    if agent_id:
+        traces = [trace for trace in traces if trace.agent_id == agent_id]
+    if req.query_params.get("clear"):
+        tracing.clear()
+    return JSONResponse(tracing.chrome_trace(traces), headers={"Content-Disposition": "attachment; filename=augv_trace.json"})
 
+@endroute("/record/start", type="http", methods=["POST"])
+async def record_start(req: Request):
+    """ Starts recording the agent websockets, {"name": "session"} is optional (default is the time) """
+    try:
+        body = await req.json() if await req.body() else {}
+        session = RECORDER.start(body.get("name"))
+    except (ValueError, TypeError, AttributeError, RuntimeError) as e:
+        return JSONResponse({"status": "error", "error": str(e)}, status_code=400)
+    return JSONResponse({"status": "ok", "session": session})
+
+@endroute("/record/stop", type="http", methods=["POST"])
+async def record_stop(req: Request):
+    stats = await asyncio.get_running_loop().run_in_executor(None, RECORDER.stop)
+    if stats is None:
+        return JSONResponse({"status": "error", "error": "Not recording"}, status_code=400)
+    return JSONResponse({"status": "ok", **stats})
+
+@endroute("/record/stats", type="http", methods=["GET"])
+async def record_stats(req: Request):
+    return JSONResponse(RECORDER.stats())
+
+# Controller json
 @endroute("/maps", type="http", methods=["GET"])
 async def get_maps(req: Request):
-    map_list = [f[:-5] for f in os.listdir(MAPS_DIR) if f.endswith(".json")]
-    return JSONResponse(map_list)
+    return JSONResponse(MAPS.names())
 
 @endroute("/maps/{map_name}", type="http", methods=["GET"])
 async def get_map(req: Request):
     map_name = req.path_params["map_name"]
-    file_path = os.path.join(MAPS_DIR, f"{map_name}.json")
-    with open(file_path, "r") as f:
-        return JSONResponse(json.load(f))
+    try:
+        entry = MAPS.get(map_name)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "error": str(e)}, status_code=400)
+    if entry is None:
+        return JSONResponse({"status": "error", "error": "Map not found"}, status_code=404)
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if entry.etag in [tag.strip() for tag in req.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
 
 @endroute("/maps/delete", type="http", methods=["POST"])
 async def delete_map(req: Request):
     body = await req.json()
     map_name = body.get("name")
-    file_path = os.path.join(MAPS_DIR, f"{map_name}.json")
     print(map_name)
     if map_name == "default":
         return JSONResponse({"status": "error", "error": "Default map cannot be deleted"}, status_code=400)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    try:
+        deleted = MAPS.delete(map_name)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "error": str(e)}, status_code=400)
+    if deleted:
         return JSONResponse({"status": "ok"})
     else:
         return JSONResponse({"status": "error", "error": "Map not found"}, status_code=404)
@@ -159,76 +257,81 @@ async def save_map(req: Request):
     data = await req.json()
     map_name = data.get("name")
     map_data = data.get("layout")
-    file_path = os.path.join(MAPS_DIR, f"{map_name}.json")
     
     if not map_data or not isinstance(map_data, list):
         return JSONResponse({"status": "error", "error": "Invalid map data"}, status_code=400)
     if map_name == "default":
         return JSONResponse({"status": "error", "error": "Default map cannot be saved"}, status_code=400)
 
-    with open(file_path, "w") as f:
-        json.dump({"name": map_name, "layout": map_data}, f)
+    try:
+        MAPS.save(map_name, map_data)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "error": str(e)}, status_code=400)
 
-    copy_map_json_to_unity()
+    # copied to Unity Assets/Maps in the background (webapp/AUGV/mapsync.py)
     return JSONResponse({"status": "ok"})
 
 
 
 @endroute("/send-routes", type="http", methods=["POST"])
 async def send_routes(req: Request):
+    """ One route message or a list of them, pipelined on the Unity connection (webapp/AUGV/unity.py) """
     body = await req.json()
-    try:
-        unity_port = CONFIG['UNITY_PORT']
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect(("localhost", unity_port))
-        s.send(json.dumps(body).encode())
-        s.close()
-        return JSONResponse({"status": "ok"})
-    except Exception as e:
-        return JSONResponse({"status": "error", "error": str(e)}, status_code=500)
-
-def copy_map_json_to_unity():
-    src_dir = Path(__file__).parent / 'maps_json'
-    unity_maps_dir = Path(__file__).parent.parent.parent.parent / 'Assets' / 'Maps'
-    if not src_dir.exists():
-        print(f"[MapCopy] Source directory does not exist: {src_dir}")
-        return
-    unity_maps_dir.mkdir(parents=True, exist_ok=True)
-    for json_file in src_dir.glob('*.json'):
-        dest = unity_maps_dir / json_file.name
-        shutil.copy2(json_file, dest)
-        print(f"[MapCopy] Copied {json_file} -> {dest}")
-    
+    msgs = body if isinstance(body, list) else [body]
+    results = await get_unity_link().send_many(msgs)
+    errors = []
+    for result in results:
+        if isinstance(result, Exception):
+            errors.append(str(result))
+        elif result.get("status") != "ok":
+            errors.append(result.get("error") or "Unity rejected the message")
+    if errors:
+        return JSONResponse({"status": "error", "error": "; ".join(errors)}, status_code=500)
+    return JSONResponse({"status": "ok", "acked": len(msgs)})
+
+@endroute("/unity/stats", type="http", methods=["GET"])
+async def unity_stats(req: Request):
+    return JSONResponse(get_unity_link().stats())
+
+def _stop_agent_proc(agent_id, proc, q):
+    """ Stops a multiprocessing agent and releases its ring, blocking """
+    if proc and proc.is_alive():
+        try:
+            # close the ring first so the agent process leaves its get() and exits by itself
+            if hasattr(q, 'close'):
+                q.close()
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.terminate()
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.kill()
+        except Exception as e:
+            print(f"[Controller] Error shutting down process {agent_id}: {e}")
+    if hasattr(q, 'release'):
+        q.release()
+
 async def _cleanup(agent_id):
     """ Cleanup for agent disconnection """
     try:
         AGENT_FRAMES.pop(agent_id, None)
+        AGENT_DECODERS.pop(agent_id, None)
+        forget(agent_id)
+        metrics.forget(agent_id)
+        tracing.forget(agent_id)
         AGENT_OUT_QUEUES.pop(agent_id, None)
-        AGENT_QUEUES.pop(agent_id, None)
+        q = AGENT_QUEUES.pop(agent_id, None)
         AGENT_STATE.pop(agent_id, None)
         GLOBAL_AGENT.pop(agent_id, None)
 
         if CONFIG['INFERENCE_METHOD'] == 'multiprocessing':
-            proc = AGENT_PROCS.pop(agent_id, None)
-            if proc and proc.is_alive():
-                try:
-                    proc.terminate()
-                    proc.join(timeout=5)
-                    if proc.is_alive():
-                        proc.kill()
-                except Exception as e:
-                    print(f"[Controller] Error shutting down process {agent_id}: {e}")
-
-        dead_clients = []
-        for client in MONITOR_CLIENTS:
-            try:
-                if client.state.value == 3:
-                    dead_clients.append(client)
-            except:
-                dead_clients.append(client)
-        
+            # the joins take up to seconds, off the loop so the other agents keep going
+            await asyncio.get_running_loop().run_in_executor(None, _stop_agent_proc, agent_id, AGENT_PROCS.pop(agent_id, None), q)
+
+        # a monitor client whose sender task ended has a closed websocket
+        dead_clients = [client for client in list(MONITOR_CLIENTS) if client.task is None or client.task.done()]
         for client in dead_clients:
-            MONITOR_CLIENTS.discard(client)
+            await unregister_monitor(client)
         
         print(f"[Controller] {len(dead_clients)} monitor clients disconnected")
         
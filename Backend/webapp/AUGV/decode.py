@@ -0,0 +1,109 @@
+###
+### webapp/AUGV/decode.py
+###
+
+"""
+This is the decode stage for our webapp AUGV
+It decodes the JPEG frames from Unity off the event loop, before they reach AGENT_QUEUES.
+
+...
+
+Dragons:
+>>> DECODE_POOL
+    - One bounded thread pool (DECODE_WORKERS) shared by all agents.
+    - cv2.imdecode releases the GIL, so the event loop keeps serving the other websockets.
+>>> FrameDecoder
+    - One per agent, the controller only calls submit() and never waits.
+    - At most one decode in flight per agent, a newer JPEG replaces the waiting one (superseded).
+    - The controller only submits when the agent detector is enabled (useYolo),
+        the monitor gets the JPEG bytes as they are.
+    - DECODE_REDUCED: decode with IMREAD_REDUCED_COLOR_2 when the half size frame is still
+        at least the model input (IMGSZ), the scale goes with the frame so the detections
+        are mapped back to the camera resolution.
+    - A sampled FrameTrace (webapp/tools/trace.py) goes with the frame into the mailbox.
+"""
+
+import threading, time
+import cv2, numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from webapp.tools.config import CONFIG
+from webapp.tools.metrics import FRAMES_DECODED, STAGE_SECONDS
+
+DECODE_POOL = ThreadPoolExecutor(max_workers=CONFIG.get('DECODE_WORKERS', 2), thread_name_prefix="decode")
+AGENT_DECODERS = {}
+
+class FrameDecoder:
+    def __init__(self, agent_id, mailbox):
+        self.agent_id = agent_id
+        self.mailbox = mailbox
+        self.superseded = 0
+        self.reduced = None
+        self._busy = False
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def submit(self, data, captured_at=None, trace=None):
+        with self._lock:
+            if self._busy:
+                if self._pending is not None:
+                    self.superseded += 1
+                    if self._pending[2] is not None:
+                        self._pending[2].finish("superseded")
+                self._pending = (data, captured_at, trace)
+                return
+            self._busy = True
+        DECODE_POOL.submit(self._run, data, captured_at, trace)
+
+    def _run(self, data, captured_at, trace):
+        while True:
+            try:
+                self._decode(data, captured_at, trace)
+            except Exception as e:
+                self.mailbox.drop()
+                if trace is not None:
+                    trace.finish("dropped")
+                print(f"[Decode] Error decoding frame for agent {self.agent_id}: {e}")
+            with self._lock:
+                if self._pending is None:
+                    self._busy = False
+                    return
+                data, captured_at, trace = self._pending
+                self._pending = None
+
+    def _decode(self, data, captured_at, trace=None):
+        started = time.perf_counter()
+        buf = np.frombuffer(data, dtype=np.uint8)
+        if self.reduced:
+            frame, scale = cv2.imdecode(buf, cv2.IMREAD_REDUCED_COLOR_2), 2.0
+        else:
+            frame, scale = cv2.imdecode(buf, cv2.IMREAD_COLOR), 1.0
+        if frame is None:
+            self.mailbox.drop()
+            if trace is not None:
+                trace.finish("dropped")
+            return
+        if self.reduced is None:
+            self.reduced = _use_reduced(frame.shape)
+        decoded = time.perf_counter()
+        STAGE_SECONDS.observe(decoded - started, "decode")
+        FRAMES_DECODED.inc(self.agent_id)
+        if trace is not None:
+            trace.mark("decode_wait", started)
+            trace.mark("decode", decoded)
+        self.mailbox.put_nowait(frame, captured_at=captured_at, scale=scale, trace=trace)
+
+    def stats(self):
+        return {"decode_superseded": self.superseded, "decode_reduced": bool(self.reduced)}
+
+def _use_reduced(shape):
+    """ Half size decode only when it does not go below the model input """
+    if not CONFIG.get('DECODE_REDUCED', False):
+        return False
+    imgsz = CONFIG.get('IMGSZ', 640)
+    return max(shape[:2]) // 2 >= imgsz
+
+def create_decoder(agent_id, mailbox):
+    decoder = AGENT_DECODERS.get(agent_id)
+    if decoder is None or decoder.mailbox is not mailbox:
+        decoder = AGENT_DECODERS[agent_id] = FrameDecoder(agent_id, mailbox)
+    return decoder
@@ -0,0 +1,122 @@
+###
+### webapp/AUGV/maps.py
+###
+
+"""
+This is the map repository for our webapp AUGV
+It keeps the parsed maps of maps_json in memory, for the /maps routes and anything else that needs a layout.
+
+...
+
+Dragons:
+>>> MapEntry
+    - name, the raw file bytes (served as they are by /maps/{name}), the parsed data,
+        and the ETag (sha256 of the bytes).
+>>> MapRepository
+    - get() checks the file mtime/size (one os.stat) and only reads and parses it again when it changed,
+        so a map edited by hand is picked up on the next request.
+    - save() and delete() update the cache right away, save() writes to a temp file and renames it.
+    - names() is cached until the directory mtime changes.
+    - Map names are file names, anything with a path separator or starting with "." is refused.
+    - on_change callbacks get (name, entry or None) after a save or delete, see webapp/AUGV/mapsync.py.
+"""
+
+import hashlib, json, os, threading
+
+class MapEntry:
+    __slots__ = ("name", "body", "data", "etag", "mtime", "size")
+
+    def __init__(self, name, body, mtime, size):
+        self.name = name
+        self.body = body
+        self.data = json.loads(body)
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        self.mtime = mtime
+        self.size = size
+
+    @property
+    def layout(self):
+        return self.data.get("layout")
+
+class MapRepository:
+    def __init__(self, directory):
+        self.directory = directory
+        self.on_change = []
+        self._entries = {}
+        self._names = None
+        self._names_mtime = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        if not name or not isinstance(name, str) or os.sep in name or "/" in name or name.startswith("."):
+            raise ValueError(f"Invalid map name {name!r}")
+        return os.path.join(self.directory, f"{name}.json")
+
+    def names(self):
+        mtime = os.stat(self.directory).st_mtime_ns
+        with self._lock:
+            if self._names is None or mtime != self._names_mtime:
+                self._names = sorted(f[:-5] for f in os.listdir(self.directory) if f.endswith(".json"))
+                self._names_mtime = mtime
+            return list(self._names)
+
+    def get(self, name):
+        path = self.path(name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(name, None)
+            return None
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.mtime == st.st_mtime_ns and entry.size == st.st_size:
+                return entry
+        with open(path, "rb") as f:
+            body = f.read()
+        entry = MapEntry(name, body, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            self._entries[name] = entry
+        return entry
+
+    def layout(self, name):
+        entry = self.get(name)
+        return entry.layout if entry is not None else None
+
+    def save(self, name, layout):
+        path = self.path(name)
+        body = json.dumps({"name": name, "layout": layout}).encode("utf-8")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+        st = os.stat(path)
+        entry = MapEntry(name, body, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            self._entries[name] = entry
+            self._names = None
+        self._notify(name, entry)
+        return entry
+
+    def delete(self, name):
+        path = self.path(name)
+        with self._lock:
+            self._entries.pop(name, None)
+            self._names = None
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        self._notify(name, None)
+        return True
+
+    def _notify(self, name, entry):
+        for callback in list(self.on_change):
+            try:
+                callback(name, entry)
+            except Exception as e:
+                print(f"[Maps] Error in change callback for {name}: {e}")
+
+MAPS_DIR = os.path.join(os.path.dirname(__file__), "maps_json")
+MAPS = MapRepository(MAPS_DIR)
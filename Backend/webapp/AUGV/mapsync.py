@@ -0,0 +1,149 @@
+###
+### webapp/AUGV/mapsync.py
+###
+
+"""
+This is the map sync for our webapp AUGV
+It copies the saved maps of maps_json to the Unity Assets/Maps folder, in the background.
+
+...
+
+Dragons:
+>>> MapSync
+    - Registered on MAPS.on_change, save_map never waits for the copy.
+    - start_map_sync() schedules every map of maps_json once (schedule_all), maps that were never saved
+        through save_map (older ones, dropped in by hand) reach Assets/Maps too, the sha256 skip keeps it cheap.
+    - Debounce: the worker waits MAP_SYNC_DEBOUNCE_MS after the last save before it copies,
+        a burst of saves is one batch, MAP_SYNC_MAX_DELAY_MS caps how long a busy editor can delay it.
+    - Incremental: only the saved map is copied, and only when its sha256 differs from the
+        file already in Assets/Maps (hashed once, then remembered).
+    - Atomic: written to a hidden temp file next to the target then renamed,
+        Unity ignores dot files and never reads a half-written map.
+    - A deleted map is left in Assets/Maps, same as the old full copy.
+"""
+
+import hashlib, os, threading, time
+from pathlib import Path
+from webapp.AUGV.maps import MAPS
+from webapp.tools.config import CONFIG
+
+UNITY_MAPS_DIR = Path(__file__).parent.parent.parent.parent / 'Assets' / 'Maps'
+
+class MapSync(threading.Thread):
+    def __init__(self, repository, target_dir):
+        super().__init__(daemon=True, name="map-sync")
+        self.repository = repository
+        self.target_dir = Path(target_dir)
+        self.copied = 0
+        self.skipped = 0
+        self._pending = set()
+        self._first_at = None
+        self._last_at = None
+        self._synced = {}
+        self._running = True
+        self._cond = threading.Condition()
+
+    def schedule(self, name, entry=None):
+        with self._cond:
+            now = time.monotonic()
+            self._pending.add(name)
+            self._first_at = self._first_at or now
+            self._last_at = now
+            self._cond.notify()
+
+    def schedule_all(self):
+        for name in self.repository.names():
+            self.schedule(name)
+
+    def stop(self, flush=True):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self.is_alive():
+            self.join(timeout=5)
+        if flush:
+            self._sync(self._take())
+
+    def _take(self):
+        with self._cond:
+            names, self._pending = self._pending, set()
+            self._first_at = self._last_at = None
+        return names
+
+    def _wait_batch(self):
+        """ Blocks until the debounce window of the pending saves is over """
+        debounce = CONFIG.get('MAP_SYNC_DEBOUNCE_MS', 200) / 1000.0
+        max_delay = CONFIG.get('MAP_SYNC_MAX_DELAY_MS', 2000) / 1000.0
+        with self._cond:
+            while self._running:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                due = min(self._last_at + debounce, self._first_at + max_delay)
+                if now >= due:
+                    break
+                self._cond.wait(due - now)
+        return self._take()
+
+    def run(self):
+        while self._running:
+            names = self._wait_batch()
+            if names:
+                self._sync(names)
+
+    def _sync(self, names):
+        for name in sorted(names):
+            try:
+                self._sync_one(name)
+            except Exception as e:
+                print(f"[MapCopy] Error syncing map {name}: {e}")
+
+    def _sync_one(self, name):
+        entry = self.repository.get(name)
+        if entry is None:
+            return
+        dest = self.target_dir / f"{name}.json"
+        digest = hashlib.sha256(entry.body).hexdigest()
+        if name not in self._synced and dest.exists():
+            self._synced[name] = hashlib.sha256(dest.read_bytes()).hexdigest()
+        if self._synced.get(name) == digest:
+            self.skipped += 1
+            return
+        self.target_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.target_dir / f".{name}.json.tmp"
+        with open(tmp, "wb") as f:
+            f.write(entry.body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, dest)
+        self._synced[name] = digest
+        self.copied += 1
+        print(f"[MapCopy] Copied {name}.json -> {dest}")
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {"pending": pending, "copied": self.copied, "skipped": self.skipped}
+
+MAP_SYNC = None
+_MAP_SYNC_LOCK = threading.Lock()
+
+def start_map_sync():
+    global MAP_SYNC
+    with _MAP_SYNC_LOCK:
+        if MAP_SYNC is None:
+            MAP_SYNC = MapSync(MAPS, UNITY_MAPS_DIR)
+            MAP_SYNC.start()
+            MAPS.on_change.append(MAP_SYNC.schedule)
+            MAP_SYNC.schedule_all()
+        return MAP_SYNC
+
+def stop_map_sync():
+    global MAP_SYNC
+    with _MAP_SYNC_LOCK:
+        if MAP_SYNC is not None:
+            if MAP_SYNC.schedule in MAPS.on_change:
+                MAPS.on_change.remove(MAP_SYNC.schedule)
+            MAP_SYNC.stop()
+            MAP_SYNC = None
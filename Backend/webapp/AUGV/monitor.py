@@ -0,0 +1,231 @@
+###
+### webapp/AUGV/monitor.py
+###
+
+"""
+This is the monitor broadcaster for our webapp AUGV
+It fans the agent frames out to the /ws/monitor dashboards, away from the agent ingest loop.
+
+...
+
+Dragons:
+>>> publish()
+    - Called by augv_ws for every frame, it never awaits.
+    - It builds one MonitorFrame and posts the same reference to every client,
+        the header + JPEG payload is joined once, on the first send.
+    - The newest MonitorFrame of every agent is kept in LATEST_FRAMES for the snapshot
+        a dashboard gets when it connects or subscribes.
+>>> MonitorFrame tiers
+    - "full" is the JPEG from Unity as it is.
+    - "thumb" is decoded at reduced size, resized to MONITOR_THUMB_WIDTH and re-encoded
+        on DECODE_POOL, once per frame however many clients want it (the future is cached).
+    - The thumb header carries "scale" so the dashboard maps the bbox to the smaller image.
+>>> Framing
+    - "joined" (default): one binary message, header + b"\n" + JPEG, built once per frame.
+    - "split": a text message with the JSON header then a binary message with the JPEG,
+        scatter/gather without a joined copy. For "full" the JPEG sent is the memoryview
+        of the websocket bytes from Unity, uvicorn (websockets) sends any bytes-like as is.
+        The client task sends both back to back, so the pair is never interleaved.
+>>> MonitorClient
+    - One per dashboard, a bounded deque (MONITOR_QUEUE_SIZE) with drop-oldest,
+        a slow browser tab only loses its own oldest frames (dropped).
+    - Served by its own background task, the task ends when the send fails
+        and monitor_ws unregisters the client when the websocket closes.
+    - subscribe(): the dashboard sends
+        {"action": "subscribe", "agents": ["AUGV_1"], "max_fps": 10, "tier": "thumb", "framing": "split"}
+        agents null means all of them, frames above max_fps are skipped (throttled).
+        Without it a client gets every frame of every agent in "full".
+"""
+
+import asyncio, json, time
+import cv2, numpy as np
+from collections import deque
+from webapp.AUGV.decode import DECODE_POOL
+from webapp.tools.config import CONFIG
+from webapp.tools.metrics import MONITOR_BYTES
+
+MONITOR_CLIENTS = set()
+LATEST_FRAMES = {}
+MONITOR_TIERS = ("full", "thumb")
+MONITOR_FRAMINGS = ("joined", "split")
+
+class MonitorFrame:
+    __slots__ = ("agent_id", "data", "detections", "_header", "_payload", "_tiers")
+
+    def __init__(self, agent_id, data, detections=None):
+        self.agent_id = agent_id
+        self.data = data
+        self.detections = detections or []
+        self._header = None
+        self._payload = None
+        self._tiers = {}
+
+    def header(self):
+        if self._header is None:
+            self._header = json.dumps({
+                "agent_id": self.agent_id,
+                "detections": self.detections
+            })
+        return self._header
+
+    def payload(self):
+        """ Joined header + b"\n" + JPEG, the one copy left for clients on the "joined" framing """
+        if self._payload is None:
+            self._payload = b"\n".join((self.header().encode(), self.data))
+        return self._payload
+
+    async def pieces_for(self, tier="full"):
+        """ (header str, JPEG bytes-like), the JPEG of "full" is the view of the websocket bytes """
+        if tier == "full":
+            return self.header(), self.data
+        pending = self._tiers.get(tier)
+        if pending is None:
+            pending = self._tiers[tier] = asyncio.get_running_loop().run_in_executor(DECODE_POOL, self._encode_thumb)
+        # shielded, a client cancelled while waiting must not cancel it for the others
+        return await asyncio.shield(pending)
+
+    async def payload_for(self, tier="full"):
+        if tier == "full":
+            return self.payload()
+        joined = self._tiers.get((tier, "joined"))
+        if joined is None:
+            header, data = await self.pieces_for(tier)
+            joined = self._tiers.setdefault((tier, "joined"), b"\n".join((header.encode(), data)))
+        return joined
+
+    def _encode_thumb(self):
+        """ Downscale and re-encode the JPEG, falls back to the full frame """
+        thumb_w = CONFIG.get('MONITOR_THUMB_WIDTH', 320)
+        buf = np.frombuffer(self.data, dtype=np.uint8)
+        frame = cv2.imdecode(buf, cv2.IMREAD_REDUCED_COLOR_2)
+        if frame is None:
+            return self.header(), self.data
+        h, w = frame.shape[:2]
+        orig_w = w * 2
+        if w > thumb_w:
+            frame = cv2.resize(frame, (thumb_w, max(1, round(h * thumb_w / w))), interpolation=cv2.INTER_AREA)
+        ok, jpg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, CONFIG.get('MONITOR_THUMB_QUALITY', 60)])
+        if not ok:
+            return self.header(), self.data
+        header = json.dumps({
+            "agent_id": self.agent_id,
+            "detections": self.detections,
+            "scale": frame.shape[1] / orig_w
+        })
+        return header, jpg.tobytes()
+
+class MonitorClient:
+    def __init__(self, ws, maxsize=None):
+        self.ws = ws
+        self.pending = deque(maxlen=maxsize or CONFIG.get('MONITOR_QUEUE_SIZE', 4))
+        self.sent = 0
+        self.dropped = 0
+        self.throttled = 0
+        self.agents = None
+        self.tier = "full"
+        self.framing = "joined"
+        self.min_interval = 0.0
+        self.task = None
+        self._last_post = {}
+        self._wakeup = asyncio.Event()
+
+    def subscribe(self, agents=None, max_fps=None, tier="full", framing="joined"):
+        if tier not in MONITOR_TIERS:
+            raise ValueError(f"Unknown monitor tier {tier}, expected one of {MONITOR_TIERS}")
+        if framing not in MONITOR_FRAMINGS:
+            raise ValueError(f"Unknown monitor framing {framing}, expected one of {MONITOR_FRAMINGS}")
+        self.framing = framing
+        self.agents = set(agents) if agents is not None else None
+        self.min_interval = 1.0 / float(max_fps) if max_fps and float(max_fps) > 0 else 0.0
+        self.tier = tier
+        self._last_post.clear()
+        self.pending.clear()
+        for agent_id, frame in list(LATEST_FRAMES.items()):
+            self.post(frame)
+
+    def wants(self, agent_id):
+        return self.agents is None or agent_id in self.agents
+
+    def post(self, frame):
+        if not self.wants(frame.agent_id):
+            return
+        if self.min_interval:
+            now = time.monotonic()
+            if now - self._last_post.get(frame.agent_id, 0.0) < self.min_interval:
+                self.throttled += 1
+                return
+            self._last_post[frame.agent_id] = now
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(frame)
+        self._wakeup.set()
+
+    def start(self):
+        self.task = asyncio.create_task(self._serve())
+        return self
+
+    async def _serve(self):
+        try:
+            while True:
+                while not self.pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                frame = self.pending.popleft()
+                if self.framing == "split":
+                    header, data = await frame.pieces_for(self.tier)
+                    await self.ws.send_text(header)
+                    await self.ws.send_bytes(data)
+                    size = len(header) + len(data)
+                else:
+                    payload = await frame.payload_for(self.tier)
+                    await self.ws.send_bytes(payload)
+                    size = len(payload)
+                self.sent += 1
+                MONITOR_BYTES.inc(frame.agent_id, amount=size)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[Monitor] Error sending to monitor client: {e}")
+        finally:
+            self.pending.clear()
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "agents": sorted(self.agents) if self.agents is not None else None,
+            "tier": self.tier,
+            "framing": self.framing,
+            "max_fps": round(1.0 / self.min_interval, 2) if self.min_interval else None,
+            "pending": len(self.pending),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "throttled": self.throttled,
+        }
+
+def publish(agent_id, data, detections=None):
+    frame = LATEST_FRAMES[agent_id] = MonitorFrame(agent_id, data, detections)
+    for client in MONITOR_CLIENTS:
+        client.post(frame)
+
+def forget(agent_id):
+    LATEST_FRAMES.pop(agent_id, None)
+
+def register_monitor(ws):
+    client = MonitorClient(ws).start()
+    MONITOR_CLIENTS.add(client)
+    for agent_id, frame in list(LATEST_FRAMES.items()):
+        client.post(frame)
+    return client
+
+async def unregister_monitor(client):
+    MONITOR_CLIENTS.discard(client)
+    await client.stop()
+
+async def stop_monitors():
+    for client in list(MONITOR_CLIENTS):
+        await unregister_monitor(client)
+    LATEST_FRAMES.clear()
@@ -26,6 +26,9 @@ Dragons:
     - It is using the camera config from /webapp/tools/config.py
     - It is using the distance-based bias for dy.
     - It is using the numba to speed up the calculation.
+    - numba is imported and _offset() compiled on the first call (cache=True, the machine code
+        stays in __pycache__ for the next boots), the camera config goes in as arguments so
+        the cache never keeps an old one.
     - In simple it will convert camera 3d viewpoint into 2d grid offset from agent/camera position,
         :dy: forward/backward
         :dx: left/right
@@ -36,24 +39,103 @@ Dragons:
     - feet_y => center_y + half_det_height
     -> Will result in the middle and very bottom of bbox detections.
     - And we let unity to decide the offset from the feet list using RayCast.
+>>> [New] AUGVBatchEngine from /webapp/AUGV/obstacle.py
+    - Used when CONFIG['INFERENCE_METHOD'] == 'batching'.
+    - Only one model is loaded, every agent is a lightweight AUGVBatch handle.
+    - Frames from all agents are grouped into one forward pass (BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS).
+    - ONNX needs a dynamic batch export (export_yolov8_onnx.py 'dynamic': True),
+        a static export still shares the model but runs frame by frame.
+>>> [New] SharedFrameRing from /webapp/AUGV/transport.py
+    - The multiprocessing agents get their frames through shared memory, not a pickling Queue.
+>>> [New] AUGVMixinMP from /webapp/AUGV/obstacle.py
+    - AGENT_STATE / AGENT_OUT_QUEUES are only copies inside the agent process.
+    - Results go through MP_RESULTS and drain_mp_results() applies them on the parent event loop,
+        the blocking get() runs on its own single thread executor, not the default one of the loop.
+    - A result that fails to apply is logged and skipped, the drain keeps going for the other agents.
+>>> [New] Metrics from /webapp/tools/metrics.py
+    - _process_frame() keeps the queue wait, inference and postprocess time in last_timings,
+        _observe() records them where the metrics live (the agent thread, or the parent for the
+        multiprocessing agents, the timings go with the result).
+    - The batch engine times the whole batch, every frame of it gets the batch inference time.
+>>> [New] Traces from /webapp/tools/trace.py
+    - _observe() also marks the queue_wait / inference / postprocess spans of a sampled frame
+        (last_marks), _send_to_unity_feet() hands the trace to the outbound channel,
+        _end_trace() finishes it when nothing is sent to Unity.
+>>> [New] capturedAt echo
+    - The obstacle message carries the capturedAt of the frame it was computed from (when Unity sent one),
+        webapp/AUGV/simulator.py times the round trip with it.
 """
 
-from webapp.tools.config import CONFIG
-from ultralytics import YOLO
-import threading, queue, numpy as np, math, asyncio
-from collections import defaultdict
-from numba import njit
+import threading, queue, numpy as np, math, asyncio, time
 import multiprocessing
-from webapp.tools.config import CONFIG, get_onnx_session
+from concurrent.futures import ThreadPoolExecutor
+from webapp.tools.config import CONFIG, get_onnx_session, load_yolo
+from webapp.tools.metrics import FRAMES_INFERRED, STAGE_SECONDS
+from webapp.AUGV.transport import FrameMailbox, SharedFrameRing, OutboundChannel
 import cv2
 
 AGENT_QUEUES, AGENT_STATE = {}, {}
-AGENT_OUT_QUEUES = defaultdict(asyncio.Queue)
+# agent_id -> OutboundChannel, created by the controller when the agent connects
+AGENT_OUT_QUEUES = {}
 
 # TRACK ALL RUNGING MULTIPROCESSING AGENTS
 AGENT_PROCS = {}
 GLOBAL_AGENT = {}
 
+# RESULTS OF THE MULTIPROCESSING AGENTS, DRAINED ON THE EVENT LOOP
+MP_RESULTS = None
+_MP_RESULT_DRAIN = None
+_MP_RESULT_EXECUTOR = None
+
+# SHARED INFERENCE ENGINE (INFERENCE_METHOD == 'batching')
+BATCH_ENGINE = None
+_BATCH_ENGINE_LOCK = threading.Lock()
+
+_INV_255 = np.float32(1.0 / 255.0)
+
+class _LetterboxBuffer:
+    """
+    Reusable letterbox for one (3, H, W) float32 input slot.
+    Resize, BGR -> RGB, /255 and HWC -> CHW are written straight into the slot,
+    same geometry as AUGVMixin._letterbox.
+    The padding and the resize buffer are only rebuilt when the frame shape changes.
+    """
+    def __init__(self, slot, color=114):
+        self.slot = slot
+        self.pad_value = color / 255.0
+        self._frame_shape = None
+
+    def _prepare(self, shape):
+        new_h, new_w = self.slot.shape[1:]
+        ratio = min(new_h / shape[0], new_w / shape[1])
+        new_unpad = (int(round(shape[1] * ratio)), int(round(shape[0] * ratio)))
+        dw = (new_w - new_unpad[0]) / 2
+        dh = (new_h - new_unpad[1]) / 2
+        top, left = int(round(dh - 0.1)), int(round(dw - 0.1))
+
+        self.slot.fill(self.pad_value)
+        if new_unpad == (shape[1], shape[0]):
+            self._resized = None
+        else:
+            self._resized = np.empty((new_unpad[1], new_unpad[0], 3), dtype=np.uint8)
+        self._new_unpad = new_unpad
+        self._window = self.slot[:, top:top + new_unpad[1], left:left + new_unpad[0]]
+        self._geometry = (ratio, (dw, dh))
+        self._frame_shape = shape
+
+    def fill(self, frame):
+        """ Returns ratio, (dw, dh) like _letterbox """
+        if frame.shape != self._frame_shape:
+            self._prepare(frame.shape)
+        image = frame
+        if self._resized is not None:
+            cv2.resize(frame, self._new_unpad, dst=self._resized, interpolation=cv2.INTER_LINEAR)
+            image = self._resized
+        for c in range(3):
+            # channel c of the RGB tensor is channel 2 - c of the BGR frame
+            np.multiply(image[:, :, 2 - c], _INV_255, out=self._window[c])
+        return self._geometry
+
 # ======== 
 # YOLO
 # ========
@@ -61,9 +143,13 @@ class AUGVMixin:
     def _populate_data(self, agent_id, onnx=False, mp=False):
         self.agent_id = agent_id
         if mp:
-            self.q = multiprocessing.Queue(maxsize=1)
+            max_w, max_h = CONFIG.get('SHM_MAX_FRAME_SIZE', (1280, 720))
+            self.q = SharedFrameRing((max_h, max_w, 3), slots=CONFIG.get('SHM_RING_SLOTS', 3))
+            # the agent process only sees shared values, see AUGVMixinMP
+            self._use_yolo_flag = multiprocessing.Value('b', 0, lock=False)
+            self.results = get_mp_results()
         else:
-            self.q = queue.Queue(maxsize=1)
+            self.q = FrameMailbox()
         AGENT_QUEUES[agent_id] = self.q
         AGENT_STATE[agent_id] = {
             'status': 'waiting',
@@ -73,6 +159,11 @@ class AUGVMixin:
         self.AGENT_QUEUES = AGENT_QUEUES
         self.last_detection = set()
         self.use_yolo = False
+        # (queue_wait, inference, postprocess) seconds of the last frame, None when the detector was off
+        self.last_timings = None
+        # perf_counter at the start of inference, end of inference, end of postprocess
+        self.last_marks = None
+        self._trace = None
         GLOBAL_AGENT[agent_id] = self
         if onnx:
             self.class_names = ["person"]
@@ -91,19 +182,23 @@ class AUGVMixin:
             except:
                 pass
 
-    def _process_frame(self, frame):
+    def _process_frame(self, frame, scale=1.0):
         detections = []
         blocked_offsets = set()
         feet_list = []
 
+        self.last_timings = None
         if not self.use_yolo:
             return detections, blocked_offsets, feet_list
+        queue_wait = _queue_wait(self.q)
+        started = time.perf_counter()
         if self.onnx:
             if not hasattr(self, 'ort_sess') or not hasattr(self, 'input_name'):
                 raise ValueError("ORT session and input name must be set for onnx")
             orig_h, orig_w = frame.shape[:2]
             image, ratio, (dw, dh) = self._preprocess_onnx_image(frame)
             outputs = self.ort_sess.run(None, {self.input_name: image}) # type: ignore[attr-defined]
+            inferred = time.perf_counter()
             detections, blocked_offsets, feet_list = self._postprocess_onnx(outputs, 640, 640, ratio, dw, dh, orig_w, orig_h)
         else:
             if not hasattr(self, 'model'):
@@ -112,6 +207,7 @@ class AUGVMixin:
             image = np.ascontiguousarray(frame)
             img_h, img_w = image.shape[:2]
             res = list(self.model.predict(image, conf=conf_thres, verbose=False, stream=True))[0] # type: ignore[attr-defined]
+            inferred = time.perf_counter()
 
             detections, blocked_offsets, feet_list = self._postprocess_pt(res, img_h, img_w)
         
@@ -120,8 +216,46 @@ class AUGVMixin:
         # [fixed] numpy conversion on different device machine
         feet_list = self._convert_numpy_to_float(feet_list)
 
+        if scale != 1.0:
+            detections, feet_list = self._rescale(detections, feet_list, scale)
+
+        finished = time.perf_counter()
+        self.last_timings = (queue_wait, inferred - started, finished - inferred)
+        self.last_marks = (started, inferred, finished)
         return detections, blocked_offsets, feet_list
 
+    def _observe(self, timings, marks=None, trace=None):
+        """ Metrics and trace of one frame, in the parent process (webapp/tools/metrics.py, webapp/tools/trace.py) """
+        if trace is not None:
+            if timings is None:
+                trace.finish("skipped")
+            else:
+                for name, t in zip(("queue_wait", "inference", "postprocess"), marks):
+                    trace.mark(name, t)
+                self._trace = trace
+        if timings is None:
+            return
+        queue_wait, inference, postprocess = timings
+        FRAMES_INFERRED.inc(self.agent_id)
+        if queue_wait is not None:
+            STAGE_SECONDS.observe(queue_wait, "queue_wait")
+        STAGE_SECONDS.observe(inference, "inference")
+        STAGE_SECONDS.observe(postprocess, "postprocess")
+
+    def _end_trace(self, status="no_obstacle"):
+        """ The frame did not send anything to Unity """
+        if self._trace is not None:
+            self._trace.finish(status)
+            self._trace = None
+
+    def _rescale(self, detections, feet_list, scale):
+        """ Map detections of a reduced decode back to the camera resolution """
+        for det in detections:
+            det["bbox"] = [round(v * scale, 2) for v in det["bbox"]]
+            det["feet"] = [v * scale for v in det["feet"]]
+        feet_list = [(feet_x * scale, feet_y * scale) for feet_x, feet_y in feet_list]
+        return detections, feet_list
+
     def _postprocess_pt(self, res, img_h, img_w):
         detections = []
         blocked_offsets = set()
@@ -146,48 +280,60 @@ class AUGVMixin:
         return detections, blocked_offsets, feet_list
     
     def _postprocess_onnx(self, outputs, img_w, img_h, ratio, dw, dh, orig_w, orig_h):
-        detections = []
+        """
+        Vectorized YOLOv8 post-processing.
+        - confidence mask over the whole (8400, 84) output instead of looping rows,
+        - keep only rows where person (class 0) is the best class,
+        - NMS so one person gives one feet point,
+        - letterbox inverse mapping in bulk.
+        """
         blocked_offsets = set()
-        feet_list = []
         conf_thres = CONFIG.get('CONF_THRES', 0.6)
+        iou_thres = CONFIG.get('IOU_THRES', 0.45)
         output = np.squeeze(outputs[0]).T
-        for det in output:
-            cls_id = det[4:].argmax()
-            conf_score = det[4:].max()
-            if cls_id != 0 or conf_score < conf_thres:
-                continue
-            x, y, w, h = det[:4]
-
-            # Scale the bounding box to the original image size
-            x_mapped = (x - dw) / ratio
-            y_mapped = (y - dh) / ratio
-            w_mapped = w / ratio
-            h_mapped = h / ratio
-            x_mapped = np.clip(x_mapped, 0, orig_w)
-            y_mapped = np.clip(y_mapped, 0, orig_h)
-            w_mapped = np.clip(w_mapped, 0, orig_w)
-            h_mapped = np.clip(h_mapped, 0, orig_h)
-
-            feet_x = x_mapped
-            feet_y = y_mapped + h_mapped/2
-            feet_list.append((feet_x, feet_y) if feet_x is not None and feet_y is not None else None)
-            # dx, dy = _get_offset(feet_x, feet_y, orig_w, orig_h, h_mapped)
-            # blocked_offsets.add((dx, dy) if dx is not None and dy is not None and dy > 0 and dy <= 5 else None)
-            detections.append({
-                "label": "person",
-                "confidence": round(float(conf_score), 3),
-                "bbox": [round(float(v), 2) for v in [x_mapped, y_mapped, w_mapped, h_mapped]],
-                "feet": [float(feet_x), float(feet_y)],
-                # "offset": [int(dx), int(dy)]
-            })
+
+        # Cheap pre-filter on the person column, then check it is the argmax
+        candidates = output[output[:, 4] >= conf_thres]
+        if len(candidates):
+            candidates = candidates[candidates[:, 4:].argmax(axis=1) == 0]
+        if not len(candidates):
+            return [], blocked_offsets, []
+
+        boxes = candidates[:, :4].astype(np.float64)
+        scores = candidates[:, 4].astype(np.float64)
+        keep = _nms_xywh(boxes, scores, iou_thres)
+        boxes, scores = boxes[keep], scores[keep]
+
+        # Scale the bounding boxes to the original image size
+        mapped = np.empty_like(boxes)
+        mapped[:, 0] = np.clip((boxes[:, 0] - dw) / ratio, 0, orig_w)
+        mapped[:, 1] = np.clip((boxes[:, 1] - dh) / ratio, 0, orig_h)
+        mapped[:, 2] = np.clip(boxes[:, 2] / ratio, 0, orig_w)
+        mapped[:, 3] = np.clip(boxes[:, 3] / ratio, 0, orig_h)
+
+        feet = np.stack((mapped[:, 0], mapped[:, 1] + mapped[:, 3] / 2), axis=1).tolist()
+        bboxes = np.round(mapped, 2).tolist()
+        confs = np.round(scores, 3).tolist()
+
+        feet_list = [(feet_x, feet_y) for feet_x, feet_y in feet]
+        detections = [{
+            "label": "person",
+            "confidence": conf,
+            "bbox": bbox,
+            "feet": foot,
+        } for conf, bbox, foot in zip(confs, bboxes, feet)]
         return detections, blocked_offsets, feet_list
 
     def _preprocess_onnx_image(self, frame):
-        img, ratio, (dw, dh) = self._letterbox(frame, (640, 640))
-        img = img.astype(np.float32) / 255.0
-        img = np.transpose(img, (2, 0, 1)) # HWC -> CHW
-        img = np.expand_dims(img, 0) # Add batch dimension
-        return img, ratio, (dw, dh)
+        """
+        Letterbox the frame into the agent's preallocated (1, 3, 640, 640) input tensor.
+        The same tensor is returned on every call, consume it before the next frame.
+        """
+        if getattr(self, '_onnx_input', None) is None:
+            self._onnx_input = np.empty((1, 3, 640, 640), dtype=np.float32)
+            self._onnx_letterbox = _LetterboxBuffer(self._onnx_input[0])
+        ratio, (dw, dh) = self._onnx_letterbox.fill(frame)
+        return self._onnx_input, ratio, (dw, dh)
     
     def _letterbox(self, img, new_shape=(640, 640), color=(114, 114, 114)):
 
@@ -239,20 +385,41 @@ class AUGVMixin:
     def _send_to_unity_feet(self, agent_id, feet_list):
         # TODO: test if this is needed or not.
         if self.last_detection == feet_list:
+            self._end_trace("unchanged")
             return
         
+        channel = AGENT_OUT_QUEUES.get(agent_id)
+        if channel is None:
+            self._end_trace("dropped")
+            return
+        trace, self._trace = self._trace, None
+        data = {"agent_id": agent_id, "feet": feet_list}
+        captured_at = getattr(self.q, 'last_captured_at', None)
+        if captured_at is not None:
+            # echoed back so Unity (and the fleet simulator) can time the round trip
+            data["capturedAt"] = captured_at
         try:
-            AGENT_OUT_QUEUES[agent_id].put_nowait({
-                "action": "obstacle",
-                "data": {
-                    "agent_id": agent_id,
-                    "feet": feet_list
-                }
-            })
+            channel.put_nowait({"action": "obstacle", "data": data}, trace=trace)
             self.last_detection = feet_list.copy()
         except Exception as e:
             print(f"Error sending to Unity for agent {agent_id}: {e}")
 
+    def _publish_result(self, detections, blocked_offsets, feet_list):
+        """ Send the detection result to Unity and update the agent state """
+        if blocked_offsets:
+            """ Deprecated: Use _send_to_unity_feet instead """
+            self._send_to_unity(self.agent_id, blocked_offsets)
+
+        if feet_list:
+            self._send_to_unity_feet(self.agent_id, feet_list)
+
+        AGENT_STATE[self.agent_id] = {
+            "status": "blocked" if blocked_offsets else "safe",
+            "detections": detections,
+            "blocked_offsets": list(blocked_offsets)
+        }
+        self._end_trace()
+
     def _convert_numpy_to_float(self, feet_list):
         """
         Fixed numpy conversion could be different on,
@@ -274,10 +441,7 @@ class AUGVYolo(threading.Thread, AUGVMixin):
     
     def run(self):
         try:
-            model = YOLO(CONFIG['MODEL_NAME'])
-            device = CONFIG.get("DEVICE", "cpu")
-            model.to(device)
-            self.model = model
+            self.model = load_yolo(CONFIG['MODEL_NAME'], CONFIG.get("DEVICE", "cpu"))
         except Exception as e:
             print(f"Error loading YOLO model for agent {self.agent_id}: {e}")
             AGENT_STATE[self.agent_id]['status'] = 'error'
@@ -288,20 +452,9 @@ class AUGVYolo(threading.Thread, AUGVMixin):
                 frame = self.q.get()
                 if frame is None:
                     continue
-                detections, blocked_offsets, feet_list = self._process_frame(frame)
-                
-                if blocked_offsets:
-                    """ Deprecated: use _send_to_unity_feet instead """
-                    self._send_to_unity(self.agent_id, blocked_offsets)
-                
-                if feet_list:
-                    self._send_to_unity_feet(self.agent_id, feet_list)
-                
-                AGENT_STATE[self.agent_id] = {
-                    "status": "blocked" if blocked_offsets else "safe",
-                    "detections": detections,
-                    "blocked_offsets": [offset for offset in blocked_offsets if offset is not None]
-                }
+                detections, blocked_offsets, feet_list = self._process_frame(frame, self.q.last_scale)
+                self._observe(self.last_timings, self.last_marks, self.q.last_trace)
+                self._publish_result(detections, blocked_offsets, feet_list)
             except queue.Empty:
                 continue
             except Exception as e:
@@ -310,7 +463,35 @@ class AUGVYolo(threading.Thread, AUGVMixin):
                 break
         
 
-class AUGVYoloMP(multiprocessing.Process, AUGVMixin):
+class AUGVMixinMP(AUGVMixin):
+    """
+    The agent process works on a copy of this object,
+    so use_yolo is a shared flag and the results go back through MP_RESULTS,
+    the parent applies them to AGENT_STATE / AGENT_OUT_QUEUES (see drain_mp_results).
+    """
+    @property
+    def use_yolo(self):
+        return bool(self._use_yolo_flag.value)
+
+    @use_yolo.setter
+    def use_yolo(self, value):
+        self._use_yolo_flag.value = bool(value)
+
+    def _forward_result(self, detections, blocked_offsets, feet_list):
+        try:
+            self.results.put_nowait((self.agent_id, "result", (detections, list(blocked_offsets), feet_list,
+                                                               self.last_timings, self.last_marks, self.q.last_seq,
+                                                               self.q.last_captured_at)))
+        except queue.Full:
+            pass
+
+    def _forward_error(self, error):
+        try:
+            self.results.put_nowait((self.agent_id, "error", str(error)))
+        except queue.Full:
+            pass
+
+class AUGVYoloMP(multiprocessing.Process, AUGVMixinMP):
     def __init__(self, agent_id):
         super().__init__(daemon=True)
         self._populate_data(agent_id, onnx=False, mp=True)
@@ -318,13 +499,10 @@ class AUGVYoloMP(multiprocessing.Process, AUGVMixin):
     
     def run(self):
         try:
-            model = YOLO(CONFIG['MODEL_NAME'])
-            device = CONFIG.get("DEVICE", "cpu")
-            model.to(device)
-            self.model = model
+            self.model = load_yolo(CONFIG['MODEL_NAME'], CONFIG.get("DEVICE", "cpu"))
         except Exception as e:
             print(f"Error loading YOLO model for agent {self.agent_id}: {e}")
-            AGENT_STATE[self.agent_id]['status'] = 'error'
+            self._forward_error(e)
             return
         
         while self._running:
@@ -333,25 +511,13 @@ class AUGVYoloMP(multiprocessing.Process, AUGVMixin):
                 if frame is None:
                     break
 
-                detections, blocked_offsets, feet_list = self._process_frame(frame)
-
-                if blocked_offsets:
-                    """ Deprecated: Use _send_to_unity_feet instead """
-                    self._send_to_unity(self.agent_id, blocked_offsets)
-                
-                if feet_list:
-                    self._send_to_unity_feet(self.agent_id, feet_list)
-                
-                AGENT_STATE[self.agent_id] = {
-                    "status": "blocked" if blocked_offsets else "safe",
-                    "detections": detections,
-                    "blocked_offsets": [offset for offset in blocked_offsets if offset is not None]
-                }
+                detections, blocked_offsets, feet_list = self._process_frame(frame, self.q.last_scale)
+                self._forward_result(detections, blocked_offsets, feet_list)
             except queue.Empty:
                 continue
             except Exception as e:
                 print(f"Error in AgentYoloMP for agent {self.agent_id}: {e}")
-                AGENT_STATE[self.agent_id]['status'] = 'error'
+                self._forward_error(e)
                 break
         
 
@@ -370,20 +536,9 @@ class AUGVOnnx(threading.Thread, AUGVMixin):
                 if frame is None:
                     continue
 
-                detections, blocked_offsets, feet_list = self._process_frame(frame)
-
-                if blocked_offsets:
-                    """ Deprecated: Use _send_to_unity_feet instead """
-                    self._send_to_unity(self.agent_id, blocked_offsets)
-                
-                if feet_list:
-                    self._send_to_unity_feet(self.agent_id, feet_list)
-
-                AGENT_STATE[self.agent_id] = {
-                    "status": "blocked" if blocked_offsets else "safe",
-                    "detections": detections,
-                    "blocked_offsets": list(blocked_offsets)
-                }
+                detections, blocked_offsets, feet_list = self._process_frame(frame, self.q.last_scale)
+                self._observe(self.last_timings, self.last_marks, self.q.last_trace)
+                self._publish_result(detections, blocked_offsets, feet_list)
             except queue.Empty:
                 continue
             except Exception as e:
@@ -392,16 +547,22 @@ class AUGVOnnx(threading.Thread, AUGVMixin):
                 break
         
 
-class AUGVOnnxMP(multiprocessing.Process, AUGVMixin):
+class AUGVOnnxMP(multiprocessing.Process, AUGVMixinMP):
     def __init__(self, agent_id):
         super().__init__(daemon=True)
         self._populate_data(agent_id, onnx=True, mp=True)
         self.ort_sess = None
         self.input_name = None
+        AGENT_PROCS[agent_id] = self
     
     def run(self):
-        self.ort_sess = get_onnx_session(CONFIG['MODEL_NAME'], CONFIG.get('BACKEND_DEVICE', 'cpu'))
-        self.input_name = self.ort_sess.get_inputs()[0].name
+        try:
+            self.ort_sess = get_onnx_session(CONFIG['MODEL_NAME'], CONFIG.get('BACKEND_DEVICE', 'cpu'))
+            self.input_name = self.ort_sess.get_inputs()[0].name
+        except Exception as e:
+            print(f"Error loading ONNX model for agent {self.agent_id}: {e}")
+            self._forward_error(e)
+            return
 
         while self._running:        
             try:
@@ -409,26 +570,304 @@ class AUGVOnnxMP(multiprocessing.Process, AUGVMixin):
                 if frame is None:
                     break
                 
-                detections, blocked_offsets, feet_list = self._process_frame(frame)
-                
-                if blocked_offsets:
-                    """ Deprecated: Use _send_to_unity_feet instead """
-                    self._send_to_unity(self.agent_id, blocked_offsets)
-                
-                if feet_list:
-                    self._send_to_unity_feet(self.agent_id, feet_list)
-
-                AGENT_STATE[self.agent_id] = {
-                    "status": "blocked" if blocked_offsets else "safe",
-                    "detections": detections,
-                    "blocked_offsets": list(blocked_offsets)
-                }
+                detections, blocked_offsets, feet_list = self._process_frame(frame, self.q.last_scale)
+                self._forward_result(detections, blocked_offsets, feet_list)
             except queue.Empty:
                 continue
             except Exception as e:
                 print(f"Error in AgentOnnxMP for agent {self.agent_id}: {e}")
-                AGENT_STATE[self.agent_id]['status'] = 'error'
+                self._forward_error(e)
+                break
+
+def get_mp_results():
+    """ Results queue shared by all the multiprocessing agents, created in the parent on first use """
+    global MP_RESULTS
+    if MP_RESULTS is None:
+        MP_RESULTS = multiprocessing.Queue(maxsize=CONFIG.get('MP_RESULTS_MAXSIZE', 256))
+    return MP_RESULTS
+
+def _get_mp_result(results, timeout=0.5):
+    try:
+        return results.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+def _apply_mp_result(msg):
+    agent_id, kind, payload = msg
+    agent = GLOBAL_AGENT.get(agent_id)
+    if agent is None:
+        return
+    if kind == "error":
+        print(f"[Obstacle] Agent process {agent_id} error: {payload}")
+        AGENT_STATE.setdefault(agent_id, {})['status'] = 'error'
+    else:
+        detections, blocked_offsets, feet_list, timings, marks, seq, captured_at = payload
+        agent._observe(timings, marks, agent.q.take_trace(seq))
+        # the parent side ring never takes a frame, it mirrors the one of the agent process
+        agent.q.last_captured_at = captured_at
+        agent._publish_result(detections, set(map(tuple, blocked_offsets)), feet_list)
+
+async def drain_mp_results():
+    """
+    Runs on the event loop of the parent process.
+    Applies the results of the multiprocessing agents to AGENT_STATE / AGENT_OUT_QUEUES,
+    through the parent side agent object, so the usual _publish_result is used.
+    """
+    global _MP_RESULT_EXECUTOR
+    if _MP_RESULT_EXECUTOR is None:
+        _MP_RESULT_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mp-results")
+    loop = asyncio.get_running_loop()
+    results = get_mp_results()
+    while True:
+        msg = await loop.run_in_executor(_MP_RESULT_EXECUTOR, _get_mp_result, results)
+        while msg is not None:
+            try:
+                _apply_mp_result(msg)
+            except Exception as e:
+                print(f"[Obstacle] Error applying the result of agent process {msg[0] if isinstance(msg, tuple) and msg else '?'}: {e}")
+            try:
+                msg = results.get_nowait()
+            except queue.Empty:
+                msg = None
+
+def start_mp_result_drain():
+    """ Start drain_mp_results on the running loop, once """
+    global _MP_RESULT_DRAIN
+    if _MP_RESULT_DRAIN is None or _MP_RESULT_DRAIN.done():
+        _MP_RESULT_DRAIN = asyncio.get_running_loop().create_task(drain_mp_results())
+
+def stop_mp_result_drain():
+    global _MP_RESULT_DRAIN
+    if _MP_RESULT_DRAIN is not None:
+        _MP_RESULT_DRAIN.cancel()
+        _MP_RESULT_DRAIN = None
+
+#### BATCHING
+class AUGVBatchEngine(threading.Thread, AUGVMixin):
+    """
+    One shared model for every agent.
+    Frames from all the registered agents are grouped into a dynamic batch,
+    the batch is closed when it is full or BATCH_MAX_WAIT_MS after its first frame,
+    then a single forward pass is done and the results are routed back per agent.
+    """
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.onnx = CONFIG.get('BACKEND', 'pt') == 'onnx'
+        self.max_batch = max(1, int(CONFIG.get('BATCH_MAX_SIZE', 8)))
+        self.max_wait = CONFIG.get('BATCH_MAX_WAIT_MS', 5) / 1000.0
+        self.agents = {}
+        self.dynamic_batch = True
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = True
+
+    def register(self, agent):
+        with self._lock:
+            self.agents[agent.agent_id] = agent
+        self._wakeup.set()
+
+    def unregister(self, agent_id):
+        with self._lock:
+            self.agents.pop(agent_id, None)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    def _load_model(self):
+        if self.onnx:
+            self.ort_sess = get_onnx_session(CONFIG['MODEL_NAME'], CONFIG.get('BACKEND_DEVICE', 'cpu'))
+            model_input = self.ort_sess.get_inputs()[0]
+            self.input_name = model_input.name
+            # static (batch=1) exports can not take a stacked input, those run frame by frame.
+            self.dynamic_batch = not isinstance(model_input.shape[0], int) or model_input.shape[0] != 1
+            # one preallocated input slot per batch position
+            self._batch_input = np.empty((self.max_batch, 3, 640, 640), dtype=np.float32)
+            self._batch_slots = [_LetterboxBuffer(self._batch_input[i]) for i in range(self.max_batch)]
+        else:
+            self.model = load_yolo(CONFIG['MODEL_NAME'], CONFIG.get("DEVICE", "cpu"))
+
+    def _active_agents(self):
+        """ Registered agents that are still connected to the controller """
+        with self._lock:
+            for agent_id, agent in list(self.agents.items()):
+                if GLOBAL_AGENT.get(agent_id) is not agent:
+                    self.agents.pop(agent_id, None)
+            return list(self.agents.values())
+
+    def _collect(self):
+        """
+        Wait for the first frame, then keep sweeping the agent queues
+        until the batch is full or the max wait deadline is passed.
+        At most one frame per agent goes into a batch.
+        """
+        batch, taken = [], set()
+        deadline = None
+        while self._running:
+            for agent in self._active_agents():
+                if len(batch) >= self.max_batch:
+                    break
+                if agent.agent_id in taken:
+                    continue
+                try:
+                    frame = agent.q.get_nowait()
+                except queue.Empty:
+                    continue
+                if frame is None:
+                    continue
+                batch.append((agent, frame, agent.q.last_scale))
+                taken.add(agent.agent_id)
+
+            if len(batch) >= self.max_batch:
                 break
+            if not batch:
+                self._wakeup.wait(timeout=0.5)
+                self._wakeup.clear()
+                continue
+
+            if deadline is None:
+                deadline = time.perf_counter() + self.max_wait
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._wakeup.wait(timeout=remaining)
+            self._wakeup.clear()
+        return batch
+
+    def _infer_batch(self, frames):
+        """
+        Single forward pass over all the frames, returns one result per frame.
+        self.last_timings gets the (inference, postprocess) seconds of the whole batch, self.last_marks its start and ends.
+        """
+        results = []
+        started = time.perf_counter()
+        if self.onnx:
+            metas = []
+            for slot, frame in zip(self._batch_slots, frames):
+                orig_h, orig_w = frame.shape[:2]
+                ratio, (dw, dh) = slot.fill(frame)
+                metas.append((ratio, dw, dh, orig_w, orig_h))
+            n = len(frames)
+            if self.dynamic_batch:
+                output = self.ort_sess.run(None, {self.input_name: self._batch_input[:n]})[0]
+                outputs = [output[i:i + 1] for i in range(n)]
+            else:
+                outputs = [self.ort_sess.run(None, {self.input_name: self._batch_input[i:i + 1]})[0] for i in range(n)]
+            inferred = time.perf_counter()
+            for output, (ratio, dw, dh, orig_w, orig_h) in zip(outputs, metas):
+                results.append(self._postprocess_onnx([output], 640, 640, ratio, dw, dh, orig_w, orig_h))
+        else:
+            conf_thres = CONFIG.get('CONF_THRES', 0.6)
+            images = [np.ascontiguousarray(frame) for frame in frames]
+            res_list = self.model.predict(images, conf=conf_thres, verbose=False)
+            inferred = time.perf_counter()
+            for res, image in zip(res_list, images):
+                img_h, img_w = image.shape[:2]
+                results.append(self._postprocess_pt(res, img_h, img_w))
+
+        cleaned = []
+        for detections, blocked_offsets, feet_list in results:
+            blocked_offsets = set([b for b in blocked_offsets if b is not None])
+            feet_list = self._convert_numpy_to_float(feet_list)
+            cleaned.append((detections, blocked_offsets, feet_list))
+        finished = time.perf_counter()
+        self.last_timings = (inferred - started, finished - inferred)
+        self.last_marks = (started, inferred, finished)
+        return cleaned
+
+    def run(self):
+        try:
+            self._load_model()
+        except Exception as e:
+            print(f"Error loading model for batch engine: {e}")
+            self._mark_error(self._active_agents())
+            return
+
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                yolo_batch = [(agent, frame, scale) for agent, frame, scale in batch if agent.use_yolo]
+                if yolo_batch:
+                    queue_waits = [_queue_wait(agent.q) for agent, _, _ in yolo_batch]
+                    results = self._infer_batch([frame for _, frame, _ in yolo_batch])
+                    inference, postprocess = self.last_timings
+                    for (agent, _, scale), (detections, blocked_offsets, feet_list), queue_wait in zip(yolo_batch, results, queue_waits):
+                        if not self._connected(agent):
+                            continue
+                        # every frame of the batch waited for the whole forward pass
+                        agent._observe((queue_wait, inference, postprocess), self.last_marks, agent.q.last_trace)
+                        if scale != 1.0:
+                            detections, feet_list = agent._rescale(detections, feet_list, scale)
+                        agent._publish_result(detections, blocked_offsets, feet_list)
+                for agent, _, _ in batch:
+                    if not agent.use_yolo and self._connected(agent):
+                        agent._observe(None, trace=agent.q.last_trace)
+                        agent._publish_result([], set(), [])
+            except Exception as e:
+                print(f"Error in AUGVBatchEngine for agents {[agent.agent_id for agent, _, _ in batch]}: {e}")
+                self._mark_error([agent for agent, _, _ in batch])
+
+    @staticmethod
+    def _connected(agent):
+        """ False once the controller cleaned the agent up, its results would bring a ghost AGENT_STATE back """
+        return GLOBAL_AGENT.get(agent.agent_id) is agent
+
+    def _mark_error(self, agents):
+        for agent in agents:
+            if self._connected(agent):
+                AGENT_STATE.setdefault(agent.agent_id, {})['status'] = 'error'
+
+class AUGVBatch(AUGVMixin):
+    """ Lightweight agent handle, the inference is done by the shared AUGVBatchEngine """
+    def __init__(self, agent_id):
+        self.engine = get_batch_engine()
+        self._populate_data(agent_id, onnx=self.engine.onnx, mp=False)
+        self.q = FrameMailbox(on_put=self.engine.notify)
+        AGENT_QUEUES[agent_id] = self.q
+
+    def start(self):
+        self.engine.register(self)
+
+    def stop(self):
+        self._running = False
+        self.engine.unregister(self.agent_id)
+
+    def is_alive(self):
+        return self._running and self.engine.is_alive()
+
+def _queue_wait(q):
+    """ Seconds between the frame reaching the mailbox and now, same clock in the agent processes """
+    received_at = getattr(q, 'last_received_at', None)
+    return time.monotonic() - received_at if received_at is not None else None
+
+def get_batch_engine():
+    """ Lazily create and start the shared batch engine """
+    global BATCH_ENGINE
+    with _BATCH_ENGINE_LOCK:
+        if BATCH_ENGINE is None or not BATCH_ENGINE.is_alive():
+            BATCH_ENGINE = AUGVBatchEngine()
+            BATCH_ENGINE.start()
+        return BATCH_ENGINE
+
+def stop_batch_engine():
+    global BATCH_ENGINE
+    with _BATCH_ENGINE_LOCK:
+        if BATCH_ENGINE is not None:
+            BATCH_ENGINE.stop()
+            BATCH_ENGINE.join(timeout=5)
+            BATCH_ENGINE = None
+
+def create_out_channel(agent_id):
+    """ Outbound channel to Unity for the agent, see OutboundChannel """
+    channel = AGENT_OUT_QUEUES.get(agent_id)
+    if channel is None:
+        channel = AGENT_OUT_QUEUES[agent_id] = OutboundChannel(CONFIG.get('OUTBOUND_MAXSIZE', 32))
+    return channel
 
 def create_agent(agent_id):
     backend = CONFIG.get('BACKEND', 'pt')
@@ -438,14 +877,43 @@ def create_agent(agent_id):
             return AUGVYolo(agent_id)
         elif method == 'multiprocessing':
             return AUGVYoloMP(agent_id)
+        elif method == 'batching':
+            return AUGVBatch(agent_id)
     elif backend == 'onnx':
         if method == 'threading':
             return AUGVOnnx(agent_id)
         elif method == 'multiprocessing':
             return AUGVOnnxMP(agent_id)
+        elif method == 'batching':
+            return AUGVBatch(agent_id)
     else:
         raise ValueError(f"Invalid backend: {backend}")
 
+def _nms_xywh(boxes, scores, iou_thres):
+    """
+    Greedy non-maximum suppression.
+    boxes are (cx, cy, w, h) rows, returns the kept indices sorted by score.
+    Only the few rows above the confidence threshold get here,
+    so the loop runs once per kept box, the IoU itself is vectorized.
+    """
+    x1 = boxes[:, 0] - boxes[:, 2] / 2
+    y1 = boxes[:, 1] - boxes[:, 3] / 2
+    x2 = boxes[:, 0] + boxes[:, 2] / 2
+    y2 = boxes[:, 1] + boxes[:, 3] / 2
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thres]
+    return np.array(keep, dtype=np.int64)
+
 #@debounce(1)
 def _send_to_unity(agent_id, blocked):
     # valid = [offset for offset in blocked if offset is not None and offset[0] == 0 and offset[1] != 0]
@@ -453,9 +921,12 @@ def _send_to_unity(agent_id, blocked):
     if not valid:
         return
     
+    channel = AGENT_OUT_QUEUES.get(agent_id)
+    if channel is None:
+        return
     try:
         print(f"Sending to Unity for agent {agent_id}: {valid}")
-        AGENT_OUT_QUEUES[agent_id].put_nowait({
+        channel.put_nowait({
             "action": "obstacle",
             "data": {
                 "agent_id": agent_id,
@@ -484,8 +955,18 @@ _node_center = CAMERA_CONFIG['grid_center']
 END CONFIG
 ==============================================
 """
-@njit
+_offset_jit = None
+
 def _get_offset(feet_x, feet_y, img_w, img_h, h):
+    """ _offset() with the camera config, compiled by numba on the first call """
+    global _offset_jit
+    if _offset_jit is None:
+        from numba import njit
+        _offset_jit = njit(cache=True)(_offset)
+    return _offset_jit(feet_x, feet_y, img_w, img_h, h,
+                       _cam_height, _cam_forward, _cam_rot_x, _cam_fov, _grid_size, _node_center)
+
+def _offset(feet_x, feet_y, img_w, img_h, h, cam_height, cam_forward, cam_rot_x, cam_fov, grid_size, node_center):
     """ 
     Project image pixel (x_img, y_img) to (dx, dy) grid offset
     Relative to agent/camera position.
@@ -496,7 +977,7 @@ def _get_offset(feet_x, feet_y, img_w, img_h, h):
     y_ndc = (feet_y / img_h - 0.5) * 2
 
     # Convert to camera coordinates
-    fov_rad = math.radians(_cam_fov)
+    fov_rad = math.radians(cam_fov)
     aspect_ratio = img_w / img_h
     tan_fov = math.tan(fov_rad / 2)
 
@@ -506,14 +987,14 @@ def _get_offset(feet_x, feet_y, img_w, img_h, h):
     z_cam = 1
 
     # Rotate around x-axis (downward)
-    rot_x = math.radians(_cam_rot_x)
+    rot_x = math.radians(cam_rot_x)
     y_rot = y_cam * math.cos(rot_x) - z_cam * math.sin(rot_x)
     z_rot = y_cam * math.sin(rot_x) + z_cam * math.cos(rot_x)
 
     # Calculate distance to world plane
-    t = -_cam_height / y_rot if y_rot != 0 else 0
+    t = -cam_height / y_rot if y_rot != 0 else 0
     world_x = x_cam * t
-    world_z = (_node_center + _cam_forward) + z_rot * t
+    world_z = (node_center + cam_forward) + z_rot * t
 
     # Calculate distance to world plane
     distance = math.sqrt(world_x**2 + world_z**2)
@@ -530,7 +1011,7 @@ def _get_offset(feet_x, feet_y, img_w, img_h, h):
     else:
         bias = 1.2 # Very Far Object
     
-    dy = int(round(world_z + bias) / _grid_size) # Forward/Backward
-    dx = int(round(world_x + bias) / _grid_size) # Left/Right
+    dy = int(round(world_z + bias) / grid_size) # Forward/Backward
+    dx = int(round(world_x + bias) / grid_size) # Left/Right
     return dx, dy
 
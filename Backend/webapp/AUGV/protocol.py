@@ -0,0 +1,100 @@
+###
+### webapp/AUGV/protocol.py
+###
+
+"""
+This is the wire protocol between Unity (CameraCapture.cs) and /ws/augv/{agent_id}
+
+...
+
+Dragons:
+>>> v1 (legacy)
+    - frame: JSON header + b"\n" + JPEG bytes, result: send_json({"action": "obstacle", ...})
+>>> v2
+    - Asked for at connect time with /ws/augv/{agent_id}?proto=2,
+        the server answers {"action": "hello", "proto": 2} before anything else.
+        A client that does not get the hello keeps talking v1.
+    - frame: FRAME_HEADER + JPEG bytes, all little endian
+        magic b"AV", version, flags (FLAG_USE_YOLO), seq uint32, capturedAt float64 (unix seconds),
+        payload length uint32.
+    - result: RESULT_HEADER + count * (feet_x, feet_y) float32
+        magic b"AV", version, msg type (MSG_OBSTACLE), count uint32.
+        Optionally followed by RESULT_TRAILER, the capturedAt of the frame the feet come from
+        (when Unity sent one), readers that only go by count ignore it.
+    - parse_frame() auto-detects the version on every message, the JPEG is a memoryview
+        of the websocket bytes, nothing is copied and there is no json.loads for v2.
+    - Only "obstacle" has a binary form, every other action is still sent as JSON text.
+"""
+
+import json, struct
+import numpy as np
+from collections import namedtuple
+
+PROTO_V1 = 1
+PROTO_V2 = 2
+SUPPORTED_PROTOS = (PROTO_V1, PROTO_V2)
+
+MAGIC = b"AV"
+FLAG_USE_YOLO = 0x01
+MSG_OBSTACLE = 1
+
+FRAME_HEADER = struct.Struct("<2sBBIdI")
+RESULT_HEADER = struct.Struct("<2sBBI")
+RESULT_TRAILER = struct.Struct("<d")
+
+FrameHeader = namedtuple("FrameHeader", ["version", "seq", "captured_at", "use_yolo"])
+
+class ProtocolError(ValueError):
+    pass
+
+def negotiate(query_params):
+    """ Protocol version asked by the client, falls back to v1 """
+    try:
+        proto = int(query_params.get("proto", PROTO_V1))
+    except (TypeError, ValueError):
+        return PROTO_V1
+    return proto if proto in SUPPORTED_PROTOS else PROTO_V1
+
+def parse_frame(raw):
+    """ Returns (FrameHeader, memoryview of the JPEG) for a v1 or v2 message """
+    view = memoryview(raw)
+    if view[:2] == MAGIC:
+        if len(view) < FRAME_HEADER.size:
+            raise ProtocolError(f"Frame shorter than the v2 header ({len(view)} bytes)")
+        _, version, flags, seq, captured_at, length = FRAME_HEADER.unpack_from(view)
+        if version != PROTO_V2:
+            raise ProtocolError(f"Unsupported frame version {version}")
+        end = FRAME_HEADER.size + length
+        if end > len(view):
+            raise ProtocolError(f"Frame payload truncated ({len(view) - FRAME_HEADER.size}/{length} bytes)")
+        return FrameHeader(version, seq, captured_at or None, bool(flags & FLAG_USE_YOLO)), view[FRAME_HEADER.size:end]
+
+    split = raw.find(b"\n")
+    if split < 0:
+        raise ProtocolError("Frame without header delimiter")
+    params = json.loads(view[:split].tobytes())
+    return FrameHeader(PROTO_V1, params.get("seq"), params.get("capturedAt"), bool(params.get("useYolo", False))), view[split + 1:]
+
+def encode_frame(data, seq=0, captured_at=0.0, use_yolo=False):
+    """ v2 frame, the Python side of CameraCapture.cs (tests and the simulator) """
+    flags = FLAG_USE_YOLO if use_yolo else 0
+    return FRAME_HEADER.pack(MAGIC, PROTO_V2, flags, seq & 0xFFFFFFFF, captured_at or 0.0, len(data)) + bytes(data)
+
+def encode_obstacle(feet_list, captured_at=None):
+    feet = np.asarray(feet_list, dtype="<f4").reshape(-1, 2)
+    raw = RESULT_HEADER.pack(MAGIC, PROTO_V2, MSG_OBSTACLE, len(feet)) + feet.tobytes()
+    return raw + RESULT_TRAILER.pack(captured_at) if captured_at is not None else raw
+
+def decode_obstacle(raw):
+    _, version, msg_type, count = RESULT_HEADER.unpack_from(raw)
+    if version != PROTO_V2 or msg_type != MSG_OBSTACLE:
+        raise ProtocolError(f"Unsupported result version {version} type {msg_type}")
+    return np.frombuffer(raw, dtype="<f4", count=count * 2, offset=RESULT_HEADER.size).reshape(-1, 2)
+
+def obstacle_captured_at(raw):
+    """ The capturedAt echoed after the feet of a v2 result, None without the trailer """
+    _, _, _, count = RESULT_HEADER.unpack_from(raw)
+    offset = RESULT_HEADER.size + count * 8
+    if len(raw) < offset + RESULT_TRAILER.size:
+        return None
+    return RESULT_TRAILER.unpack_from(raw, offset)[0]
@@ -0,0 +1,212 @@
+###
+### webapp/AUGV/recorder.py
+###
+
+"""
+This is the frame recorder for our webapp AUGV
+It writes the raw /ws/augv traffic to segment files, webapp/AUGV/replay.py plays them back without Unity.
+
+...
+
+Dragons:
+>>> Segment files
+    - <RECORD_DIR>/<session>-<index>.augvrec, append-only, a new segment every RECORD_SEGMENT_MB.
+    - SEGMENT_HEADER: magic + wall clock start of the session (epoch seconds).
+    - Then records: RECORD_HEADER (t, agent id length, payload length) + agent id + payload,
+        t is the receive time in seconds since the session started (time.monotonic), the payload is the
+        websocket message as it came from Unity (v1 JSON header or v2 binary header + JPEG).
+    - A record cut short by a crash is ignored by the reader, everything before it is still good.
+>>> Recorder
+    - record() is called by augv_ws for every message and never blocks, the bytes go through a
+        bounded queue (RECORD_QUEUE_SIZE) to a writer thread, a full queue drops the message (dropped).
+    - start()/stop() from POST /record/start and /record/stop, RECORDER is the one the controller uses.
+>>> Segment
+    - Reads a segment through mmap, the payloads are memoryviews of the mapping, no copy.
+    - read_records() goes through every segment of a session (or a list of files) in order.
+"""
+
+import mmap, os, queue, re, struct, threading, time
+from collections import namedtuple
+from webapp.tools.config import CONFIG
+
+MAGIC = b"AUGVREC1"
+SEGMENT_HEADER = struct.Struct("<8sd")
+RECORD_HEADER = struct.Struct("<dHI")
+EXTENSION = ".augvrec"
+RECORD_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "recordings")
+
+_SEGMENT_NAME = re.compile(r"^(?P<session>.+)-(?P<index>\d{5})" + re.escape(EXTENSION) + "$")
+
+Record = namedtuple("Record", ("t", "agent_id", "payload"))
+
+class Recorder:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.session = None
+        self.recorded = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.segments = []
+        self._queue = None
+        self._thread = None
+        self._origin = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self._thread is not None
+
+    def start(self, session=None):
+        with self._lock:
+            if self.active:
+                raise RuntimeError(f"Already recording session {self.session}")
+            directory = os.path.abspath(self.directory or CONFIG.get('RECORD_DIR') or RECORD_DIR)
+            os.makedirs(directory, exist_ok=True)
+            self.session = session or time.strftime("%Y%m%d-%H%M%S")
+            if "/" in self.session or os.sep in self.session or self.session.startswith("."):
+                raise ValueError(f"Invalid session name {self.session!r}")
+            if segment_paths(os.path.join(directory, self.session)):
+                raise ValueError(f"Session {self.session!r} already exists in {directory}")
+            self.recorded = self.dropped = self.bytes = 0
+            self.segments = []
+            self._origin = time.monotonic()
+            self._queue = queue.Queue(maxsize=CONFIG.get('RECORD_QUEUE_SIZE', 256))
+            self._thread = threading.Thread(target=self._write, args=(directory, self._queue, time.time()),
+                                            daemon=True, name="recorder")
+            self._thread.start()
+        print(f"[Recorder] Recording session {self.session} to {directory}")
+        return self.session
+
+    def record(self, agent_id, payload):
+        q = self._queue
+        if q is None:
+            return
+        try:
+            q.put_nowait((time.monotonic() - self._origin, agent_id, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        with self._lock:
+            thread, q = self._thread, self._queue
+            if thread is None:
+                return None
+            self._queue = None
+            q.put(None)
+            thread.join(timeout=10)
+            self._thread = None
+        print(f"[Recorder] Stopped session {self.session}: {self.recorded} frames, {self.dropped} dropped, {len(self.segments)} segments")
+        return self.stats()
+
+    def _write(self, directory, q, started_at):
+        max_bytes = int(CONFIG.get('RECORD_SEGMENT_MB', 64) * 1024 * 1024)
+        f = None
+        try:
+            while True:
+                item = q.get()
+                if item is None:
+                    break
+                t, agent_id, payload = item
+                agent = agent_id.encode("utf-8")
+                if f is None or f.tell() >= max_bytes:
+                    if f is not None:
+                        f.close()
+                    path = os.path.join(directory, f"{self.session}-{len(self.segments):05d}{EXTENSION}")
+                    f = open(path, "ab")
+                    f.write(SEGMENT_HEADER.pack(MAGIC, started_at))
+                    self.segments.append(path)
+                f.write(RECORD_HEADER.pack(t, len(agent), len(payload)) + agent)
+                f.write(payload)
+                self.recorded += 1
+                self.bytes += len(payload)
+                if q.empty():
+                    f.flush()
+        except Exception as e:
+            print(f"[Recorder] Error writing session {self.session}: {e}")
+        finally:
+            if f is not None:
+                f.close()
+
+    def stats(self):
+        q = self._queue
+        return {
+            "active": self.active,
+            "session": self.session,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "bytes": self.bytes,
+            "pending": q.qsize() if q is not None else 0,
+            "segments": [os.path.basename(path) for path in self.segments],
+        }
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if size < SEGMENT_HEADER.size:
+            self.started_at = None
+            return
+        magic, self.started_at = SEGMENT_HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an AUGV recording")
+
+    def __iter__(self):
+        if self.started_at is None:
+            return
+        view = memoryview(self._map)
+        offset, end = SEGMENT_HEADER.size, len(view)
+        while offset + RECORD_HEADER.size <= end:
+            t, agent_len, payload_len = RECORD_HEADER.unpack_from(view, offset)
+            start = offset + RECORD_HEADER.size
+            stop = start + agent_len + payload_len
+            if stop > end:
+                # cut short by a crash
+                break
+            agent_id = bytes(view[start:start + agent_len]).decode("utf-8")
+            yield Record(t, agent_id, view[start + agent_len:stop])
+            offset = stop
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # a payload view is still alive, the mapping goes with it
+                pass
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def segment_paths(source):
+    """ The segment files of a session (<directory>/<session>), of every session in a directory, or the file itself """
+    if os.path.isfile(source):
+        return [source]
+    if os.path.isdir(source):
+        directory, session = source, None
+    else:
+        directory, session = os.path.dirname(source) or ".", os.path.basename(source)
+    if not os.path.isdir(directory):
+        return []
+    paths = []
+    for name in os.listdir(directory):
+        match = _SEGMENT_NAME.match(name)
+        if match and (session is None or match["session"] == session):
+            paths.append((match["session"], match["index"], os.path.join(directory, name)))
+    return [path for _, _, path in sorted(paths)]
+
+def read_records(source):
+    """ Every record of the segments of source, in order, see segment_paths() """
+    paths = source if isinstance(source, (list, tuple)) else segment_paths(source)
+    for path in paths:
+        with Segment(path) as segment:
+            yield from segment
+
+RECORDER = Recorder()
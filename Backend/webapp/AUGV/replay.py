@@ -0,0 +1,132 @@
+###
+### webapp/AUGV/replay.py
+###
+
+"""
+This is the replay tool for our webapp AUGV
+It plays a recording of webapp/AUGV/recorder.py back into /ws/augv/<agent_id>, one websocket per agent,
+so the server can be load tested without Unity.
+
+    python -m webapp.AUGV.replay recordings/<session> --url ws://localhost:8080 --speed 1
+
+...
+
+Dragons:
+>>> Timing
+    - --speed 1 sends every frame at its recorded time (relative to the first frame of the session),
+        --speed 4 four times faster, --speed 0 as fast as the websockets take them.
+    - All the agents share one start time, so their frames interleave like they did when recorded.
+    - --loops: every track repeats with the same period, the session duration plus its smallest frame interval,
+        so the agents stay aligned loop after loop whatever their frame counts.
+    - late is how far the sends fell behind the schedule, a late replay does not skip frames.
+>>> Protocol
+    - A v2 recording (binary header, b"AV") connects with ?proto=2, the hello is read like any reply.
+    - The replies (obstacle / route messages) are only counted, nothing is checked.
+>>> Payloads
+    - Sent straight from the mmap of the segments (memoryviews), the recording is never copied in memory.
+"""
+
+import argparse, asyncio, time
+import websockets
+from webapp.AUGV.protocol import MAGIC, PROTO_V2
+from webapp.AUGV.recorder import read_records
+
+class Replayer:
+    def __init__(self, records, url, speed=1.0, loops=1, connect=None):
+        self.url = url.rstrip("/")
+        self.speed = speed
+        self.loops = max(1, int(loops))
+        self.connect = connect or websockets.connect
+        self.tracks = {}
+        for record in records:
+            self.tracks.setdefault(record.agent_id, []).append((record.t, record.payload))
+        times = [track[0][0] for track in self.tracks.values()]
+        self.origin = min(times) if times else 0.0
+        self.duration = max((track[-1][0] for track in self.tracks.values()), default=0.0) - self.origin
+        # a loop starts one frame interval after the end of the previous one
+        intervals = [b[0] - a[0] for track in self.tracks.values() for a, b in zip(track, track[1:]) if b[0] > a[0]]
+        self.period = self.duration + min(intervals, default=0.0)
+        self.sent = {agent_id: 0 for agent_id in self.tracks}
+        self.received = {agent_id: 0 for agent_id in self.tracks}
+        self.late = 0.0
+
+    def agent_url(self, agent_id):
+        payload = self.tracks[agent_id][0][1]
+        query = f"?proto={PROTO_V2}" if bytes(payload[:len(MAGIC)]) == MAGIC else ""
+        return f"{self.url}/ws/augv/{agent_id}{query}"
+
+    async def run(self):
+        connections = {}
+        readers = []
+        try:
+            for agent_id in self.tracks:
+                connections[agent_id] = await self.connect(self.agent_url(agent_id))
+                readers.append(asyncio.create_task(self._read(agent_id, connections[agent_id])))
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await asyncio.gather(*(self._send(agent_id, ws, start) for agent_id, ws in connections.items()))
+            elapsed = loop.time() - start
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            for ws in connections.values():
+                await ws.close()
+        return self.stats(elapsed)
+
+    async def _send(self, agent_id, ws, start):
+        loop = asyncio.get_running_loop()
+        for index in range(self.loops):
+            for t, payload in self.tracks[agent_id]:
+                if self.speed:
+                    due = start + (index * self.period + t - self.origin) / self.speed
+                    delay = due - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        self.late = max(self.late, -delay)
+                await ws.send(payload)
+                self.sent[agent_id] += 1
+
+    async def _read(self, agent_id, ws):
+        try:
+            async for _ in ws:
+                self.received[agent_id] += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    def stats(self, elapsed):
+        sent = sum(self.sent.values())
+        return {
+            "agents": len(self.tracks),
+            "sent": sent,
+            "received": sum(self.received.values()),
+            "elapsed": round(elapsed, 3),
+            "fps": round(sent / elapsed, 1) if elapsed > 0 else 0.0,
+            "late": round(self.late, 4),
+            "per_agent": {agent_id: {"sent": self.sent[agent_id], "received": self.received[agent_id]} for agent_id in self.tracks},
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay an AUGV recording into the server websockets")
+    parser.add_argument("source", help="<directory>/<session>, a directory or one .augvrec segment")
+    parser.add_argument("--url", default="ws://localhost:8080", help="server base url")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 is real time, N is N times faster, 0 is as fast as possible")
+    parser.add_argument("--loops", type=int, default=1, help="plays the recording this many times")
+    args = parser.parse_args(argv)
+
+    records = list(read_records(args.source))
+    if not records:
+        parser.error(f"No recording found at {args.source}")
+    replayer = Replayer(records, args.url, args.speed, args.loops)
+    print(f"[Replay] {len(records)} frames from {len(replayer.tracks)} agents, {replayer.duration:.1f}s recorded, speed {args.speed or 'max'}")
+    started = time.monotonic()
+    stats = asyncio.run(replayer.run())
+    print(f"[Replay] Sent {stats['sent']} frames in {time.monotonic() - started:.1f}s ({stats['fps']} fps), "
+          f"{stats['received']} replies, {stats['late'] * 1000:.1f}ms behind at worst")
+    for agent_id, counts in stats["per_agent"].items():
+        print(f"[Replay]     {agent_id}: {counts['sent']} sent, {counts['received']} received")
+    return stats
+
+if __name__ == "__main__":
+    main()
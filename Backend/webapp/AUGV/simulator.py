@@ -0,0 +1,329 @@
+###
+### webapp/AUGV/simulator.py
+###
+
+"""
+This is the fleet simulator for our webapp AUGV
+It stands in for Unity and the dashboards: N agents on /ws/augv/<agent_id> and M clients on /ws/monitor,
+to measure the latency of the whole websocket path and find how many agents a host can take.
+
+    python -m webapp.AUGV.simulator --agents 1,2,4,8 --monitors 2 --fps 15 --duration 20 --out fleet.json
+
+...
+
+Dragons:
+>>> Frames
+    - --corpus is a directory of images or a recording (webapp/AUGV/recorder.py), without it
+        a few synthetic JPEGs are generated. The agents go through the corpus in turn, each from its own offset.
+    - Every frame is sent with useYolo and capturedAt = time.time() (v2 header or v1 JSON, --proto).
+    - STAMP (marker, agent index, seq) is appended after the JPEG, a JPEG decoder stops at the end
+        of image marker so the server does not see it, the monitors get it back with the "full" JPEG.
+>>> Latency
+    - rtt: the obstacle messages echo the capturedAt of their frame (JSON, or the v2 RESULT_TRAILER),
+        rtt is the time from the send of that frame to the obstacle coming back.
+        Only frames with detections whose feet changed get an obstacle (_send_to_unity_feet),
+        a corpus without people gives no rtt at all, answered is how many did.
+    - monitor: time from the send of a frame to a monitor getting it, found by its STAMP.
+    - Everything sent during --warmup (the agents load their model on connect) is left out.
+>>> Drops
+    - send_lag: the agents keep a fixed schedule at --fps, a send that is late does not make
+        the next ones early, the frames that could not be sent in time are skipped.
+    - server: superseded / dropped frames per agent from /agents/stats at the end of a run.
+    - monitor drop_rate: frames of the run a monitor never got.
+>>> Report
+    - One JSON report per agent count, p50/p95/p99/max in ms, fps, and the drop rates.
+"""
+
+import argparse, asyncio, json, os, struct, time, urllib.request
+import cv2, numpy as np
+import websockets
+from webapp.AUGV.protocol import MAGIC, PROTO_V2, encode_frame, obstacle_captured_at, parse_frame
+from webapp.AUGV.recorder import read_records, segment_paths
+
+STAMP = struct.Struct("<4sII")
+STAMP_MARKER = b"SIM1"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def stamp(jpeg, agent_index, seq):
+    return bytes(jpeg) + STAMP.pack(STAMP_MARKER, agent_index, seq & 0xFFFFFFFF)
+
+def read_stamp(data):
+    """ (agent index, seq) of a simulated frame, None for any other JPEG """
+    if len(data) < STAMP.size:
+        return None
+    marker, agent_index, seq = STAMP.unpack_from(data, len(data) - STAMP.size)
+    return (agent_index, seq) if marker == STAMP_MARKER else None
+
+def percentiles(samples):
+    """ p50/p95/p99/max in ms of samples in seconds """
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {"count": len(values), "p50": round(float(p50), 2), "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2), "max": round(float(values.max()), 2)}
+
+def synthetic_corpus(count=8, width=640, height=480):
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        image = np.full((height, width, 3), 40 + i * 20, np.uint8)
+        for _ in range(6):
+            x, y = rng.integers(0, width - 80), rng.integers(0, height - 160)
+            cv2.rectangle(image, (int(x), int(y)), (int(x) + 60, int(y) + 150), rng.integers(0, 255, 3).tolist(), -1)
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        frames.append(jpeg.tobytes())
+    return frames
+
+def load_corpus(source=None):
+    """ JPEG bytes from a directory of images, a recording, or synthetic ones """
+    if not source:
+        return synthetic_corpus()
+    if os.path.isdir(source) and not segment_paths(source):
+        frames = []
+        for name in sorted(os.listdir(source)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(source, name)
+            if name.lower().endswith((".jpg", ".jpeg")):
+                with open(path, "rb") as f:
+                    frames.append(f.read())
+            else:
+                image = cv2.imread(path)
+                if image is not None:
+                    frames.append(cv2.imencode(".jpg", image)[1].tobytes())
+        return frames
+    return [bytes(parse_frame(record.payload)[1]) for record in read_records(source)]
+
+def _frame(proto, jpeg, seq, captured_at):
+    if proto == PROTO_V2:
+        return encode_frame(jpeg, seq, captured_at, use_yolo=True)
+    return json.dumps({"useYolo": True, "seq": seq, "capturedAt": captured_at}).encode() + b"\n" + jpeg
+
+class SimAgent:
+    def __init__(self, index, agent_id, corpus, fps, proto, sent):
+        self.index = index
+        self.agent_id = agent_id
+        self.corpus = corpus
+        self.interval = 1.0 / fps
+        self.proto = proto
+        # (agent index, seq) -> perf_counter at send, shared with the monitors
+        self.sent = sent
+        self.seq = 0
+        self.measured = 0
+        self.skipped = 0
+        self.send_lag = []
+        self.rtt = []
+        self.obstacles = 0
+        self.measure_from = None
+
+    async def send_loop(self, ws, until):
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while due < until:
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            now = loop.time()
+            if now - due >= self.interval:
+                missed = int((now - due) / self.interval)
+                self.skipped += missed
+                due += missed * self.interval
+            self.seq += 1
+            jpeg = stamp(self.corpus[(self.index + self.seq) % len(self.corpus)], self.index, self.seq)
+            sent_at = time.perf_counter()
+            await ws.send(_frame(self.proto, jpeg, self.seq, time.time()))
+            if self.measure_from is not None and sent_at >= self.measure_from:
+                self.sent[(self.index, self.seq)] = sent_at
+                self.measured += 1
+                self.send_lag.append(loop.time() - due)
+            due += self.interval
+
+    async def read_loop(self, ws):
+        async for message in ws:
+            captured_at = None
+            if isinstance(message, bytes):
+                if message[:len(MAGIC)] == MAGIC:
+                    captured_at = obstacle_captured_at(message)
+                    self.obstacles += 1
+            else:
+                body = json.loads(message)
+                if body.get("action") == "obstacle":
+                    captured_at = body.get("data", {}).get("capturedAt")
+                    self.obstacles += 1
+            if captured_at is not None:
+                rtt = time.time() - captured_at
+                # the frames of the warmup are not timed
+                if self.measure_from is not None and time.perf_counter() - rtt >= self.measure_from:
+                    self.rtt.append(rtt)
+
+    def report(self, duration):
+        return {
+            "sent": self.measured,
+            "fps": round(self.measured / duration, 2) if duration else 0.0,
+            "skipped": self.skipped,
+            "obstacles": self.obstacles,
+            "answered": len(self.rtt),
+            "rtt_ms": percentiles(self.rtt),
+            "send_lag_ms": percentiles(self.send_lag),
+        }
+
+class SimMonitor:
+    def __init__(self, sent):
+        self.sent = sent
+        self.frames = 0
+        self.latency = []
+        self.seen = set()
+
+    async def read_loop(self, ws):
+        await ws.send(json.dumps({"action": "subscribe", "agents": None, "tier": "full", "framing": "joined"}))
+        async for message in ws:
+            if not isinstance(message, bytes):
+                continue
+            received_at = time.perf_counter()
+            self.frames += 1
+            key = read_stamp(message)
+            sent_at = self.sent.get(key) if key is not None else None
+            if sent_at is not None:
+                self.seen.add(key)
+                self.latency.append(received_at - sent_at)
+
+    def report(self, expected):
+        return {
+            "frames": self.frames,
+            "matched": len(self.seen),
+            "drop_rate": round(1 - len(self.seen) / expected, 4) if expected else 0.0,
+            "latency_ms": percentiles(self.latency),
+        }
+
+class FleetSimulator:
+    def __init__(self, url, agents=4, monitors=1, fps=15, duration=10.0, warmup=2.0, proto=PROTO_V2,
+                 corpus=None, prefix="SIM", connect=None, agent_stats=None):
+        self.url = url.rstrip("/")
+        self.agents = agents
+        self.monitors = monitors
+        self.fps = fps
+        self.duration = duration
+        self.warmup = warmup
+        self.proto = proto
+        self.corpus = corpus or synthetic_corpus()
+        self.prefix = prefix
+        self.connect = connect or websockets.connect
+        self.agent_stats = agent_stats or self._fetch_agent_stats
+
+    def _fetch_agent_stats(self):
+        url = self.url.replace("ws://", "http://", 1).replace("wss://", "https://", 1) + "/agents/stats"
+        with urllib.request.urlopen(url, timeout=5) as res:
+            return json.load(res)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        sent = {}
+        agents = [SimAgent(i, f"{self.prefix}_{i + 1}", self.corpus, self.fps, self.proto, sent) for i in range(self.agents)]
+        monitors = [SimMonitor(sent) for _ in range(self.monitors)]
+        query = f"?proto={self.proto}" if self.proto == PROTO_V2 else ""
+        connections, readers = [], []
+        try:
+            for monitor in monitors:
+                ws = await self.connect(f"{self.url}/ws/monitor")
+                connections.append(ws)
+                readers.append(asyncio.create_task(monitor.read_loop(ws)))
+            agent_sockets = []
+            for agent in agents:
+                ws = await self.connect(f"{self.url}/ws/augv/{agent.agent_id}{query}")
+                connections.append(ws)
+                agent_sockets.append(ws)
+                readers.append(asyncio.create_task(agent.read_loop(ws)))
+            started = loop.time()
+            measure_from = time.perf_counter() + self.warmup
+            for agent in agents:
+                agent.measure_from = measure_from
+            until = started + self.warmup + self.duration
+            await asyncio.gather(*(agent.send_loop(ws, until) for agent, ws in zip(agents, agent_sockets)))
+            # the last frames are still on their way
+            await asyncio.sleep(min(1.0, self.duration / 4))
+            try:
+                server = await loop.run_in_executor(None, self.agent_stats)
+            except Exception as e:
+                print(f"[Simulator] Could not read /agents/stats: {e}")
+                server = {}
+        finally:
+            for ws in connections:
+                await ws.close()
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+        return self.report(agents, monitors, sent, server)
+
+    def report(self, agents, monitors, sent, server):
+        per_agent = {agent.agent_id: agent.report(self.duration) for agent in agents}
+        for agent_id, stats in per_agent.items():
+            frames = server.get(agent_id, {})
+            if frames.get("seq"):
+                stats["server"] = {key: frames.get(key) for key in ("seq", "superseded", "dropped", "taken")}
+                stats["server"]["drop_rate"] = round((frames.get("superseded", 0) + frames.get("dropped", 0)) / frames["seq"], 4)
+        rtt = [sample for agent in agents for sample in agent.rtt]
+        lag = [sample for agent in agents for sample in agent.send_lag]
+        server_rates = [stats["server"]["drop_rate"] for stats in per_agent.values() if "server" in stats]
+        monitor_reports = [monitor.report(len(sent)) for monitor in monitors]
+        monitor_latency = [sample for monitor in monitors for sample in monitor.latency]
+        return {
+            "agents": self.agents,
+            "monitors": self.monitors,
+            "target_fps": self.fps,
+            "proto": self.proto,
+            "duration": self.duration,
+            "sent": len(sent),
+            "throughput_fps": round(len(sent) / self.duration, 2) if self.duration else 0.0,
+            "answered": len(rtt),
+            "rtt_ms": percentiles(rtt),
+            "send_lag_ms": percentiles(lag),
+            "skipped": sum(agent.skipped for agent in agents),
+            "server_drop_rate": round(sum(server_rates) / len(server_rates), 4) if server_rates else None,
+            "monitor_latency_ms": percentiles(monitor_latency),
+            "monitor_drop_rate": max((report["drop_rate"] for report in monitor_reports), default=None),
+            "per_agent": per_agent,
+            "per_monitor": monitor_reports,
+        }
+
+def _summary(report):
+    rtt, monitor = report["rtt_ms"], report["monitor_latency_ms"]
+    return (f"[Simulator] {report['agents']} agents: {report['throughput_fps']} fps sent, "
+            f"rtt p50/p95/p99 {rtt['p50']}/{rtt['p95']}/{rtt['p99']}ms ({report['answered']} answered), "
+            f"server drops {report['server_drop_rate']}, "
+            f"monitor p95 {monitor['p95']}ms drops {report['monitor_drop_rate']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic AUGV fleet against a running server")
+    parser.add_argument("--url", default="ws://localhost:8080", help="server base url")
+    parser.add_argument("--agents", default="4", help="agents, or a comma list to step through (1,2,4,8)")
+    parser.add_argument("--monitors", type=int, default=1, help="monitor clients")
+    parser.add_argument("--fps", type=float, default=15, help="frames per second per agent")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds sent before measuring")
+    parser.add_argument("--proto", type=int, choices=(1, 2), default=PROTO_V2, help="wire protocol of the agents")
+    parser.add_argument("--corpus", help="directory of images or a recording, synthetic frames without it")
+    parser.add_argument("--out", help="writes the JSON report there")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        parser.error(f"No frames found in {args.corpus}")
+    reports = []
+    for count in [int(n) for n in args.agents.split(",")]:
+        simulator = FleetSimulator(args.url, count, args.monitors, args.fps, args.duration, args.warmup,
+                                   args.proto, corpus, prefix=f"SIM{count}")
+        report = asyncio.run(simulator.run())
+        print(_summary(report))
+        reports.append(report)
+    out = json.dumps(reports, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+        print(f"[Simulator] Report written to {args.out}")
+    else:
+        print(out)
+    return reports
+
+if __name__ == "__main__":
+    main()
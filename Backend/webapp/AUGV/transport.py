@@ -0,0 +1,398 @@
+###
+### webapp/AUGV/transport.py
+###
+
+"""
+This is the transport module for our webapp AUGV
+It moves the frames from the controller to the agents (AGENT_QUEUES),
+and the messages from the agents back to Unity (AGENT_OUT_QUEUES).
+For the multiprocessing agents a multiprocessing.Queue pickles the whole frame on every hop,
+so their frames are handed over through shared memory instead.
+
+...
+
+Dragons:
+>>> FrameMailbox
+    - Single slot for the threaded agents and the batch engine (AGENT_QUEUES).
+    - Latest frame wins, a pending frame is overwritten and counted as superseded.
+    - Every frame gets a sequence number, a receive timestamp, the optional capture timestamp from Unity
+        and its decode scale (see webapp/AUGV/decode.py).
+>>> SharedFrameRing
+    - Triple buffer in shared memory, one per agent, created by the controller process.
+    - The controller copies the decoded frame into a free slot and publishes its sequence number.
+    - The agent process gets a view of the newest slot, no copy and no pickling.
+    - Latest frame wins, a published frame that was never read is counted as superseded.
+    - The slot being read is never written, so the view stays valid until the next get().
+    - It keeps the queue.Queue subset used by the controller and the agents (put_nowait, full, get, put(None)).
+>>> stats()
+    - Both mailboxes count superseded and dropped frames (drop() is called by the controller,
+        e.g. when the JPEG can not be decoded) and the frame age when the agent takes it for inference.
+    - The age is measured on time.monotonic(), it is the same clock in the agent processes.
+>>> OutboundChannel
+    - The messages from one agent to Unity (AGENT_OUT_QUEUES), consumed by the controller _dispatch().
+    - put_nowait() is safe from the inference threads, the waiting get() is woken with call_soon_threadsafe.
+    - Messages with a coalesced action (obstacle) replace the pending one, only the newest is sent.
+    - Bounded, the oldest pending message is dropped, so a stalled Unity client keeps memory flat.
+    - last_enqueued_at is the put_nowait() time of the message get() returned last,
+        the controller measures the dispatch latency from it.
+>>> Traces
+    - The mailboxes and the channel carry the optional FrameTrace (webapp/tools/trace.py) of an item,
+        the item that replaces or pushes out another finishes its trace ("superseded", "coalesced", "dropped").
+    - FrameMailbox / OutboundChannel: last_trace is the trace of the item get() returned last.
+    - SharedFrameRing: the traces stay in the controller process, keyed by seq,
+        take_trace(seq) gets it back when the result of that frame comes back.
+"""
+
+import multiprocessing, queue, time, threading, asyncio, itertools, math
+from collections import OrderedDict
+import numpy as np
+from multiprocessing import shared_memory
+
+def _frame_stats(seq, superseded, dropped, taken, age_last, age_sum, age_max):
+    return {
+        "seq": int(seq),
+        "superseded": int(superseded),
+        "dropped": int(dropped),
+        "taken": int(taken),
+        "age_last_ms": round(age_last * 1000, 3),
+        "age_avg_ms": round(age_sum / taken * 1000, 3) if taken else 0.0,
+        "age_max_ms": round(age_max * 1000, 3),
+    }
+
+class FrameMailbox:
+    def __init__(self, on_put=None):
+        self._cond = threading.Condition()
+        self._pending = None
+        self._closed = False
+        self._on_put = on_put
+        self.seq = self.superseded = self.dropped = self.taken = 0
+        self.age_last = self.age_sum = self.age_max = 0.0
+        # meta of the frame last taken by the agent
+        self.last_seq = 0
+        self.last_captured_at = None
+        self.last_received_at = None
+        self.last_scale = 1.0
+        self.last_trace = None
+
+    def put_nowait(self, frame, captured_at=None, scale=1.0, trace=None):
+        if frame is None:
+            self.close()
+            return
+        with self._cond:
+            if self._closed:
+                return
+            if self._pending is not None:
+                self.superseded += 1
+                if self._pending[5] is not None:
+                    self._pending[5].finish("superseded")
+            self.seq += 1
+            self._pending = (self.seq, frame, captured_at, time.monotonic(), scale, trace)
+            self._cond.notify()
+        if self._on_put is not None:
+            self._on_put()
+
+    def put(self, item, block=True, timeout=None):
+        self.put_nowait(item)
+
+    def full(self):
+        """ Latest frame wins, a new frame always replaces the pending one """
+        return False
+
+    def drop(self):
+        with self._cond:
+            self.dropped += 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get(self, block=True, timeout=None):
+        """ Returns the newest frame, or None once the mailbox is closed """
+        with self._cond:
+            if block:
+                self._cond.wait_for(lambda: self._pending is not None or self._closed, timeout)
+            if self._closed:
+                return None
+            if self._pending is None:
+                raise queue.Empty
+            seq, frame, captured_at, received_at, scale, trace = self._pending
+            self._pending = None
+            age = time.monotonic() - received_at
+            self.taken += 1
+            self.age_last = age
+            self.age_sum += age
+            self.age_max = max(self.age_max, age)
+            self.last_seq, self.last_captured_at, self.last_received_at, self.last_scale = seq, captured_at, received_at, scale
+            self.last_trace = trace
+        return frame
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def empty(self):
+        return self._closed or self._pending is None
+
+    def stats(self):
+        with self._cond:
+            return _frame_stats(self.seq, self.superseded, self.dropped, self.taken, self.age_last, self.age_sum, self.age_max)
+
+# header: seq, latest slot, reading slot, taken seq, closed, superseded, dropped, taken count
+_SEQ, _LATEST, _READING, _TAKEN, _CLOSED, _SUPERSEDED, _DROPPED, _TAKEN_COUNT = range(8)
+_HEADER_FIELDS = 8
+# per slot: seq, height, width, channels
+_SLOT_FIELDS = 4
+# per slot: received_at, captured_at, decode scale
+_SLOT_TIMES = 3
+# frame age: last, sum, max
+_AGE_LAST, _AGE_SUM, _AGE_MAX = range(3)
+_AGE_FIELDS = 4
+
+class SharedFrameRing:
+    def __init__(self, max_shape, slots=3):
+        self.max_shape = tuple(max_shape)
+        self.slots = max(3, int(slots))
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self._meta_bytes = (_HEADER_FIELDS + self.slots * (_SLOT_FIELDS + _SLOT_TIMES) + _AGE_FIELDS) * 8
+        self._shm = shared_memory.SharedMemory(create=True, size=self._meta_bytes + self.slots * self.slot_bytes)
+        self.name = self._shm.name
+        self._lock = multiprocessing.Lock()
+        self._ready = multiprocessing.Event()
+        self._owner = True
+        self._attach()
+        self._header[:] = 0
+        self._header[_LATEST] = -1
+        self._header[_READING] = -1
+        self._age[:] = 0
+        # seq -> FrameTrace, controller side only
+        self._traces = {}
+        self.last_seq = 0
+        self.last_captured_at = None
+        self.last_received_at = None
+        self.last_scale = 1.0
+
+    def _attach(self):
+        buf = self._shm.buf
+        offset = 0
+        self._header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += _HEADER_FIELDS * 8
+        self._slot_meta = np.ndarray((self.slots, _SLOT_FIELDS), dtype=np.int64, buffer=buf, offset=offset)
+        offset += self.slots * _SLOT_FIELDS * 8
+        self._slot_times = np.ndarray((self.slots, _SLOT_TIMES), dtype=np.float64, buffer=buf, offset=offset)
+        offset += self.slots * _SLOT_TIMES * 8
+        self._age = np.ndarray((_AGE_FIELDS,), dtype=np.float64, buffer=buf, offset=offset)
+        self._slot_data = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=buf, offset=self._meta_bytes)
+
+    def _detach(self):
+        # views must go before the mapping is closed
+        self._header = self._slot_meta = self._slot_times = self._age = self._slot_data = None
+
+    def __getstate__(self):
+        """ Only the name goes to the agent process, it attaches to the same pages """
+        state = self.__dict__.copy()
+        for key in ('_shm', '_header', '_slot_meta', '_slot_times', '_age', '_slot_data'):
+            state.pop(key, None)
+        state['_owner'] = False
+        state['_traces'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = shared_memory.SharedMemory(name=self.name)
+        self._attach()
+
+    # ========
+    # Writer (controller)
+    # ========
+    def put_nowait(self, frame, captured_at=None, scale=1.0, trace=None):
+        if frame is None:
+            self.close()
+            return
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame {frame.shape} is bigger than the shared slot {self.max_shape}")
+
+        with self._lock:
+            if self._header[_CLOSED]:
+                return
+            latest, reading = self._header[_LATEST], self._header[_READING]
+            slot = next(i for i in range(self.slots) if i != latest and i != reading)
+
+        # the reader can only move to the latest slot, so this copy is done without the lock
+        self._slot_data[slot, :frame.nbytes] = frame.reshape(-1)
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 0
+
+        with self._lock:
+            seq = self._header[_SEQ] + 1
+            superseded = self._header[_SEQ] != self._header[_TAKEN]
+            if superseded:
+                self._header[_SUPERSEDED] += 1
+            self._slot_meta[slot] = (seq, height, width, channels)
+            self._slot_times[slot] = (time.monotonic(), math.nan if captured_at is None else captured_at, scale)
+            self._header[_LATEST] = slot
+            self._header[_SEQ] = seq
+        if superseded and seq - 1 in self._traces:
+            self._traces.pop(seq - 1).finish("superseded")
+        if trace is not None:
+            self._traces[int(seq)] = trace
+        self._ready.set()
+
+    def take_trace(self, seq):
+        """ The trace of frame seq, older ones are forgotten (their result never came back) """
+        for old in [old for old in list(self._traces) if old < seq]:
+            del self._traces[old]
+        return self._traces.pop(seq, None)
+
+    def put(self, item, block=True, timeout=None):
+        self.put_nowait(item)
+
+    def full(self):
+        """ Latest frame wins, a new frame always replaces the pending one """
+        return False
+
+    def drop(self):
+        with self._lock:
+            self._header[_DROPPED] += 1
+
+    def close(self):
+        """
+        Wakes the reader once, a second set() of the Event would wait for a reader
+        that was terminated while it was sleeping on it.
+        """
+        with self._lock:
+            if self._header[_CLOSED]:
+                return
+            self._header[_CLOSED] = 1
+        self._ready.set()
+
+    def release(self):
+        """ Close the mapping, the owner (controller) also unlinks the shared memory """
+        if self._header is None:
+            return
+        if self._owner:
+            self.close()
+        self._detach()
+        try:
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    # ========
+    # Reader (agent process)
+    # ========
+    def get(self, block=True, timeout=None):
+        """
+        Returns a view of the newest frame, valid until the next get().
+        Returns None once the ring is closed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if self._header[_CLOSED]:
+                    self._header[_READING] = -1
+                    return None
+                seq = self._header[_SEQ]
+                if seq != self._header[_TAKEN]:
+                    slot = self._header[_LATEST]
+                    self._header[_READING] = slot
+                    self._header[_TAKEN] = seq
+                    self._header[_TAKEN_COUNT] += 1
+                    _, height, width, channels = self._slot_meta[slot].tolist()
+                    received_at, captured_at, scale = self._slot_times[slot].tolist()
+                    age = time.monotonic() - received_at
+                    self._age[_AGE_LAST] = age
+                    self._age[_AGE_SUM] += age
+                    self._age[_AGE_MAX] = max(self._age[_AGE_MAX], age)
+                    break
+            if not block:
+                raise queue.Empty
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise queue.Empty
+            self._ready.wait(remaining)
+            self._ready.clear()
+
+        self.last_seq = int(seq)
+        self.last_received_at = received_at
+        self.last_captured_at = None if math.isnan(captured_at) else captured_at
+        self.last_scale = scale
+        shape = (height, width, channels) if channels else (height, width)
+        return self._slot_data[slot, :int(np.prod(shape))].reshape(shape)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def empty(self):
+        return bool(self._header[_CLOSED]) or self._header[_SEQ] == self._header[_TAKEN]
+
+    def stats(self):
+        with self._lock:
+            header, age = self._header.tolist(), self._age.tolist()
+        return _frame_stats(header[_SEQ], header[_SUPERSEDED], header[_DROPPED], header[_TAKEN_COUNT],
+                            age[_AGE_LAST], age[_AGE_SUM], age[_AGE_MAX])
+
+class OutboundChannel:
+    def __init__(self, maxsize=32, coalesce=("obstacle",)):
+        self.maxsize = max(1, int(maxsize))
+        self.coalesce = frozenset(coalesce)
+        self.dropped = 0
+        self.coalesced = 0
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._loop = None
+        self._waiter = None
+        self.last_enqueued_at = None
+        self.last_trace = None
+
+    def put_nowait(self, msg, trace=None):
+        """ Never blocks, can be called from any thread """
+        action = msg.get("action") if isinstance(msg, dict) else None
+        key = action if action in self.coalesce else next(self._counter)
+        replaced = None
+        with self._lock:
+            if key in self._pending:
+                # newest wins, it goes to the back like a new message
+                replaced = (self._pending.pop(key)[2], "coalesced")
+                self.coalesced += 1
+            elif len(self._pending) >= self.maxsize:
+                replaced = (self._pending.popitem(last=False)[1][2], "dropped")
+                self.dropped += 1
+            self._pending[key] = (msg, time.monotonic(), trace)
+            waiter, loop = self._waiter, self._loop
+            self._waiter = None
+        if replaced is not None and replaced[0] is not None:
+            replaced[0].finish(replaced[1])
+        if waiter is not None:
+            try:
+                loop.call_soon_threadsafe(_wake_waiter, waiter)
+            except RuntimeError:
+                # event loop already closed
+                pass
+
+    async def get(self):
+        while True:
+            with self._lock:
+                if self._pending:
+                    msg, self.last_enqueued_at, self.last_trace = self._pending.popitem(last=False)[1]
+                    return msg
+                self._loop = asyncio.get_running_loop()
+                self._waiter = waiter = self._loop.create_future()
+            await waiter
+
+    def qsize(self):
+        return len(self._pending)
+
+    def empty(self):
+        return not self._pending
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+def _wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,174 @@
+###
+### webapp/AUGV/unity.py
+###
+
+"""
+This is the connection to the Unity SocketServer (Assets/Scripts/SocketServer.cs)
+It keeps one asyncio TCP connection open for /send-routes instead of a blocking socket per request.
+
+...
+
+Dragons:
+>>> Framing
+    - Every message is a 4 byte big endian length + UTF-8 JSON, both ways.
+    - The backend adds "id" to the message, Unity answers {"ack": id, "status": "ok" | "error", "error": ...}
+        once the message is applied on the Unity main thread (SocketServer.Update).
+    - SocketServer.cs still accepts the old raw JSON (connect, send, close) when the first byte is "{".
+>>> UnityLink
+    - send() writes the frame and waits for its ack, several sends can be in flight on the
+        same connection (pipelining), the acks are matched by id.
+    - A send that fails to connect raises ConnectionError, the next connect attempts back off
+        from UNITY_BACKOFF_MIN_S to UNITY_BACKOFF_MAX_S, in between send() fails right away.
+    - When the connection drops every pending send fails with ConnectionError,
+        the next send reconnects. A message is never sent twice by this module.
+    - It lives on the event loop of the server, get_unity_link() creates it lazily.
+"""
+
+import asyncio, itertools, json, struct, time
+from webapp.tools.config import CONFIG
+
+LENGTH = struct.Struct(">I")
+MAX_FRAME = 16 * 1024 * 1024
+
+def encode_frame(msg):
+    payload = json.dumps(msg).encode("utf-8")
+    return LENGTH.pack(len(payload)) + payload
+
+async def read_frame(reader):
+    size, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    if size > MAX_FRAME:
+        raise ConnectionError(f"Frame of {size} bytes from Unity is too big")
+    return json.loads(await reader.readexactly(size))
+
+class UnityLink:
+    def __init__(self, host="localhost", port=None):
+        self.host = host
+        self.port = port
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.connects = 0
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._backoff = 0.0
+        self._next_attempt = 0.0
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self.connected:
+                return
+            now = time.monotonic()
+            if now < self._next_attempt:
+                raise ConnectionError(f"Unity not reachable, retrying in {self._next_attempt - now:.1f}s")
+            port = self.port or CONFIG['UNITY_PORT']
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, port), CONFIG.get('UNITY_CONNECT_TIMEOUT_S', 2.0))
+            except (OSError, asyncio.TimeoutError) as e:
+                self._backoff = min(max(self._backoff * 2, CONFIG.get('UNITY_BACKOFF_MIN_S', 0.5)), CONFIG.get('UNITY_BACKOFF_MAX_S', 10.0))
+                self._next_attempt = time.monotonic() + self._backoff
+                raise ConnectionError(f"Cannot connect to Unity on {self.host}:{port}: {e}") from e
+            self._backoff = 0.0
+            self._next_attempt = 0.0
+            self.connects += 1
+            self._pending = {}
+            self._read_task = asyncio.create_task(self._read_acks(self._reader, self._writer, self._pending))
+            print(f"[Unity] Connected to {self.host}:{port}")
+
+    async def _read_acks(self, reader, writer, pending):
+        error = ConnectionError("Unity closed the connection")
+        try:
+            while True:
+                msg = await read_frame(reader)
+                future = pending.pop(msg.get("ack"), None)
+                if future is not None and not future.done():
+                    future.set_result(msg)
+        except asyncio.CancelledError:
+            error = ConnectionError("Unity connection closed")
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, ValueError) as e:
+            error = ConnectionError(f"Unity connection lost: {e}")
+        finally:
+            self._drop_connection(writer, pending, error)
+
+    def _drop_connection(self, writer, pending, error):
+        """ Only touches the connection it belongs to, a newer one is left alone """
+        if writer is not None:
+            writer.close()
+        if self._writer is writer:
+            self._reader = self._writer = None
+        for future in list(pending.values()):
+            if not future.done():
+                future.set_exception(error)
+        pending.clear()
+
+    async def send(self, msg, timeout=None):
+        """ Sends one message and returns the ack of Unity """
+        await self._connect()
+        msg_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        pending = None
+        try:
+            async with self._write_lock:
+                if not self.connected:
+                    raise ConnectionError("Unity connection lost")
+                pending = self._pending
+                pending[msg_id] = future
+                self._writer.write(encode_frame({**msg, "id": msg_id}))
+                await self._writer.drain()
+            self.sent += 1
+            ack = await asyncio.wait_for(future, timeout or CONFIG.get('UNITY_ACK_TIMEOUT_S', 5.0))
+        except asyncio.TimeoutError:
+            self.failed += 1
+            raise TimeoutError(f"No ack from Unity for message {msg_id}")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            if pending is not None:
+                pending.pop(msg_id, None)
+        self.acked += 1
+        return ack
+
+    async def send_many(self, msgs, timeout=None):
+        """ Pipelines the messages on the connection, returns an ack or an exception per message """
+        return await asyncio.gather(*[self.send(msg, timeout) for msg in msgs], return_exceptions=True)
+
+    async def close(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            await asyncio.gather(self._read_task, return_exceptions=True)
+            self._read_task = None
+        self._drop_connection(self._writer, self._pending, ConnectionError("Unity link closed"))
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "in_flight": len(self._pending),
+            "sent": self.sent,
+            "acked": self.acked,
+            "failed": self.failed,
+            "connects": self.connects,
+        }
+
+UNITY_LINK = None
+
+def get_unity_link():
+    global UNITY_LINK
+    if UNITY_LINK is None:
+        UNITY_LINK = UnityLink()
+    return UNITY_LINK
+
+async def close_unity_link():
+    global UNITY_LINK
+    if UNITY_LINK is not None:
+        await UNITY_LINK.close()
+        UNITY_LINK = None
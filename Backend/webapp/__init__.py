@@ -2,6 +2,8 @@
 ### webapp/__init__.py
 ###
 
-from .ASGI import app
+from .tools import startup
+with startup.phase("imports"):
+    from .ASGI import app
 
 __version__ = "0.1.0"
\ No newline at end of file
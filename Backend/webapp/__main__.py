@@ -4,15 +4,19 @@
 
 import uvicorn
 from .ASGI import application
-from webapp.tools.config import recommend_settings, configure_ports
+from webapp.tools.config import configure_ports
+from webapp.tools import startup
+from webapp.bench import tuner
 
-server_port, unity_port = configure_ports()
+with startup.phase("config"):
+    server_port, unity_port = configure_ports()
 
 def main():
     uvicorn.run(application, host="0.0.0.0", port=server_port)
 
 if __name__ == "__main__":
-    recommend_settings()
+    with startup.phase("config"):
+        tuner.start()
     print(f"[IMPORTANT]     Server running on port {server_port}")
     print(f"[IMPORTANT]     Unity running on port {unity_port}")
     print("===============================================")
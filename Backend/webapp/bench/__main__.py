@@ -0,0 +1,104 @@
+###
+### webapp/bench/__main__.py
+###
+
+"""
+This is the benchmark CLI for our webapp AUGV
+
+    python -m webapp.bench --backend pt,onnx --method threading,multiprocessing --agents 1,2,4 --csv run.csv
+    python -m webapp.bench ... --save-baseline          # this run becomes the baseline of the host
+    python -m webapp.bench ... --compare                # exit code 1 on a regression against it
+
+...
+
+Dragons:
+>>> Matrix
+    - Every option takes a comma list, the run is their product (webapp/bench/runner.py matrix()).
+>>> Output
+    - A table on stdout, --json / --csv for the results, --compare adds the comparison to the JSON.
+>>> Gate
+    - --compare [path] compares with the host baseline (or path), --threshold overrides BENCHMARK_THRESHOLD,
+        the exit code is 1 when a scenario regressed (or fails where the baseline ran), 2 when there is no baseline to compare with.
+"""
+
+import argparse, json, sys
+from webapp.tools.config import CONFIG
+from webapp.bench.baseline import baseline_path, compare, host_info, load_baseline, save_baseline, write_csv
+from webapp.bench.runner import matrix, run_scenario
+
+def _list(cast=str):
+    return lambda value: [cast(item) for item in value.split(",") if item]
+
+def _percent(value):
+    return f"{value * 100:+.1f}%" if value is not None else "-"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m webapp.bench", description="AUGV inference benchmarks with per host baselines")
+    parser.add_argument("--backend", type=_list(), default=["pt"], help="pt, onnx")
+    parser.add_argument("--device", type=_list(), default=["cpu"], help="cpu, cuda")
+    parser.add_argument("--method", type=_list(), default=["threading"], help="threading, multiprocessing, batching")
+    parser.add_argument("--agents", type=_list(int), default=[1])
+    parser.add_argument("--fps", type=_list(float), default=[0.0], help="cap per agent, 0 is none")
+    parser.add_argument("--size", type=_list(), default=["x".join(map(str, CONFIG['IMAGE_SIZE']))], help="camera frame WxH")
+    parser.add_argument("--batch", type=_list(int), default=[1], help="frames per pass for batching")
+    parser.add_argument("--passes", type=int, default=CONFIG.get('BENCHMARK_IMAGES', 60), help="timed passes per agent")
+    parser.add_argument("--onnx-model", help="ONNX model path (default Backend/yolov8n.onnx)")
+    parser.add_argument("--json", help="writes the results (and comparison) as JSON")
+    parser.add_argument("--csv", help="writes the results as CSV")
+    parser.add_argument("--save-baseline", nargs="?", const="", metavar="PATH", help="stores the run as the baseline of this host")
+    parser.add_argument("--compare", nargs="?", const="", metavar="PATH", help="compares with the baseline of this host")
+    parser.add_argument("--threshold", type=float, default=CONFIG.get('BENCHMARK_THRESHOLD', 0.1), help="allowed regression, 0.1 is 10%%")
+    args = parser.parse_args(argv)
+
+    try:
+        scenarios = matrix(args.backend, args.device, args.method, args.agents, args.fps, args.size, args.batch)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"[Bench] {len(scenarios)} scenarios, {args.passes} passes per agent")
+    print(f"{'Scenario':<52} {'FPS/agent':>10} {'FPS':>8} {'p50 ms':>8} {'p95 ms':>8} {'CPU %':>7}")
+    results = []
+    for scenario in scenarios:
+        result = run_scenario(scenario, args.passes, args.onnx_model)
+        results.append(result)
+        if result["error"]:
+            print(f"{result['scenario']:<52} error: {result['error']}")
+        else:
+            latency = result["latency_ms"]
+            print(f"{result['scenario']:<52} {result['fps_per_agent']:>10.2f} {result['fps_total']:>8.2f} "
+                  f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} {result['cpu_avg']:>7.1f}")
+
+    report = {"host": host_info(), "results": results}
+    status = 0
+    if args.compare is not None:
+        baseline = load_baseline(args.compare or None)
+        if baseline is None:
+            print(f"[Bench] No baseline at {args.compare or baseline_path()}, run with --save-baseline first")
+            status = 2
+        else:
+            rows = compare(results, baseline, args.threshold)
+            report["comparison"] = {"threshold": args.threshold, "rows": rows}
+            for row in rows:
+                if row.get("error"):
+                    print(f"[Bench] {row['status']:<10} {row['scenario']:<52} error: {row['error']}")
+                elif row["status"] in ("ok", "regression"):
+                    print(f"[Bench] {row['status']:<10} {row['scenario']:<52} fps {_percent(row['fps_change'])} p95 {_percent(row['p95_change'])}")
+                elif row["status"] != "missing":
+                    print(f"[Bench] {row['status']:<10} {row['scenario']}")
+            missing = sum(1 for row in rows if row["status"] == "missing")
+            if missing:
+                print(f"[Bench] {missing} scenarios of the baseline were not run")
+            regressions = [row for row in rows if row["status"] == "regression"]
+            if regressions:
+                print(f"[Bench] {len(regressions)} regressions (above {args.threshold * 100:.0f}% or failing)")
+                status = 1
+    if args.save_baseline is not None:
+        print(f"[Bench] Baseline saved to {save_baseline(results, args.save_baseline or None)}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.csv:
+        write_csv(results, args.csv)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
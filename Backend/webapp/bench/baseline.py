@@ -0,0 +1,130 @@
+###
+### webapp/bench/baseline.py
+###
+
+"""
+This is the baseline store for our webapp benchmarks
+It keeps the results of a run per host and compares a new run against them.
+
+...
+
+Dragons:
+>>> Baselines
+    - One JSON file per host in BASELINE_DIR (Backend/benchmarks/<host>.json),
+        the results keyed by scenario plus host_info() (CPU, GPU, library versions) of the run.
+    - A baseline is only comparable on the same host, the file name is host_id().
+>>> compare()
+    - Per scenario in both runs: fps_total lower or latency p95 higher than the baseline by more
+        than threshold (BENCHMARK_THRESHOLD, 0.1 is 10%) is a regression.
+    - A scenario that ran in the baseline but errors now (a library upgrade breaking CUDA or the model load)
+        is a regression ("error"), one that errored in the baseline too is listed as "error".
+    - Scenarios missing on either side are listed but never a regression.
+>>> CSV
+    - One row per scenario, latency_ms flattened to latency_p50 ... latency_max.
+"""
+
+import csv, json, os, platform, re, time
+from importlib import metadata
+import psutil
+from webapp.tools.config import CONFIG
+
+BASELINE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "benchmarks"))
+LIBRARIES = ("ultralytics", "torch", "onnxruntime", "onnxruntime-gpu", "numpy", "opencv-python")
+CSV_FIELDS = ("scenario", "backend", "device", "method", "agents", "fps", "size", "batch", "frames", "elapsed",
+              "fps_per_agent", "fps_total", "latency_p50", "latency_p95", "latency_p99", "latency_max",
+              "cpu_avg", "rss_max", "error")
+
+def host_id():
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{platform.node() or 'host'}-{platform.machine()}")
+
+def _gpus():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return [torch.cuda.get_device_name(i) for i in range(torch.cuda.device_count())]
+    except Exception:
+        pass
+    return []
+
+def host_info():
+    versions = {}
+    for name in LIBRARIES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            pass
+    return {
+        "host": host_id(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu": platform.processor() or platform.machine(),
+        "cores": psutil.cpu_count(logical=False),
+        "threads": psutil.cpu_count(),
+        "memory": psutil.virtual_memory().total,
+        "gpus": _gpus(),
+        "versions": versions,
+    }
+
+def baseline_path(host=None):
+    return os.path.join(BASELINE_DIR, f"{host or host_id()}.json")
+
+def save_baseline(results, path=None):
+    path = path or baseline_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": host_info(), "results": results}, f, indent=2)
+    return path
+
+def load_baseline(path=None):
+    """ {scenario: result} of a baseline file (or a plain result list), None when there is none """
+    path = path or baseline_path()
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    results = data["results"] if isinstance(data, dict) else data
+    return {result["scenario"]: result for result in results}
+
+def _change(current, baseline):
+    if current is None or not baseline:
+        return None
+    return (current - baseline) / baseline
+
+def compare(results, baseline, threshold=None):
+    """ One row per scenario, see compare() in the Dragons """
+    threshold = CONFIG.get('BENCHMARK_THRESHOLD', 0.1) if threshold is None else threshold
+    rows = []
+    for result in results:
+        base = baseline.get(result["scenario"])
+        row = {"scenario": result["scenario"], "status": "ok", "regressions": []}
+        if base is None:
+            row["status"] = "new"
+        elif result.get("error") and not base.get("error"):
+            row.update(status="regression", regressions=["error"], error=result["error"])
+        elif result.get("error") or base.get("error"):
+            row["status"] = "error"
+        else:
+            fps = _change(result["fps_total"], base["fps_total"])
+            p95 = _change(result["latency_ms"]["p95"], base["latency_ms"]["p95"])
+            row.update({"fps_total": result["fps_total"], "fps_total_baseline": base["fps_total"], "fps_change": fps,
+                        "p95": result["latency_ms"]["p95"], "p95_baseline": base["latency_ms"]["p95"], "p95_change": p95})
+            if fps is not None and fps < -threshold:
+                row["regressions"].append("fps_total")
+            if p95 is not None and p95 > threshold:
+                row["regressions"].append("latency_p95")
+            if row["regressions"]:
+                row["status"] = "regression"
+        rows.append(row)
+    seen = {result["scenario"] for result in results}
+    rows.extend({"scenario": key, "status": "missing", "regressions": []} for key in baseline if key not in seen)
+    return rows
+
+def write_csv(results, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            row = dict(result)
+            for name, value in (result.get("latency_ms") or {}).items():
+                row[f"latency_{name}"] = value
+            writer.writerow(row)
@@ -0,0 +1,212 @@
+###
+### webapp/bench/runner.py
+###
+
+"""
+This is the benchmark runner for our webapp AUGV
+It runs one scenario of the matrix (backend, device, method, agents, fps, size, batch)
+and returns its numbers, the CLI is webapp/bench/__main__.py.
+
+...
+
+Dragons:
+>>> BenchEngine
+    - The forward pass and postprocess are the ones of the server (AUGVBatchEngine._infer_batch),
+        a slower letterbox or NMS shows up here like a slower ultralytics / onnxruntime does.
+    - No queue, no websocket, no decode, that is webapp/AUGV/simulator.py.
+>>> Scenario
+    - method "threading": one engine (model) per agent in a thread, like AUGVYolo / AUGVOnnx.
+    - method "multiprocessing": one engine per agent process, the results come back on a Queue.
+    - method "batching": one engine for all the agents, every pass takes up to batch frames.
+    - batch only means something for "batching", matrix() leaves out the other combinations.
+    - fps caps the passes of an agent (0 is as fast as it goes), size is the camera frame (WxH).
+    - BENCHMARK_WARMUP passes per agent are not timed (model load, first allocations).
+    - The frames are random noise (no detections, no postprocess cost) unless run_scenario gets frames,
+        webapp/bench/tuner.py passes a corpus of real ones.
+>>> Results
+    - fps_per_agent is frames / elapsed of each agent, averaged, fps_total their sum.
+    - latency_ms: percentiles of one pass, for "batching" a pass serves several agents.
+    - cpu_avg / rss_max: the benchmark process and its children, sampled every 100ms by ResourceMonitor
+        (the ResourceSampler of the server, the same numbers as /resources).
+    - A scenario that can not run (no CUDA, no model file) gets "error" and the run goes on.
+"""
+
+import itertools, multiprocessing, os, queue, threading, time
+from collections import namedtuple
+import numpy as np
+from webapp.tools.config import CONFIG, get_onnx_session, load_yolo
+from webapp.tools.resources import ResourceSampler
+from webapp.AUGV.obstacle import AUGVBatchEngine, _LetterboxBuffer
+from webapp.AUGV.simulator import percentiles
+
+METHODS = ("threading", "multiprocessing", "batching")
+ONNX_MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "yolov8n.onnx"))
+
+Scenario = namedtuple("Scenario", ("backend", "device", "method", "agents", "fps", "size", "batch"))
+
+def scenario_key(scenario):
+    return (f"{scenario.backend}-{scenario.device}-{scenario.method}-a{scenario.agents}"
+            f"-fps{scenario.fps:g}-{scenario.size}-b{scenario.batch}")
+
+def parse_size(size):
+    """ "640x480" -> (640, 480) """
+    width, height = str(size).lower().split("x")
+    return int(width), int(height)
+
+def matrix(backends=("pt",), devices=("cpu",), methods=("threading",), agents=(1,), fps=(0,), sizes=("640x480",), batches=(1,)):
+    """ Every combination, batch > 1 only with "batching" """
+    scenarios = []
+    for backend, device, method, count, cap, size, batch in itertools.product(backends, devices, methods, agents, fps, sizes, batches):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method}, expected one of {METHODS}")
+        if method != "batching" and batch != 1:
+            continue
+        parse_size(size)
+        scenarios.append(Scenario(backend, device, method, int(count), float(cap), size, int(batch)))
+    return scenarios
+
+class BenchEngine(AUGVBatchEngine):
+    """ The inference of the server agents without the thread and the queues, one model """
+    def __init__(self, scenario, model_path):
+        super().__init__()
+        self.onnx = scenario.backend == "onnx"
+        self.max_batch = scenario.batch if scenario.method == "batching" else 1
+        if self.onnx:
+            self.ort_sess = get_onnx_session(model_path, scenario.device)
+            model_input = self.ort_sess.get_inputs()[0]
+            self.input_name = model_input.name
+            self.dynamic_batch = not isinstance(model_input.shape[0], int) or model_input.shape[0] != 1
+            self._batch_input = np.empty((self.max_batch, 3, 640, 640), dtype=np.float32)
+            self._batch_slots = [_LetterboxBuffer(self._batch_input[i]) for i in range(self.max_batch)]
+        else:
+            self.model = load_yolo(model_path, scenario.device)
+
+def model_path(backend, onnx_model=None):
+    return (onnx_model or ONNX_MODEL_PATH) if backend == "onnx" else CONFIG['MODEL_NAME']
+
+def make_frames(size, count=4, seed=0):
+    width, height = parse_size(size)
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+def run_agent(engine, scenario, passes, agents=1, warmup=None, frames=None):
+    """ passes timed forward passes of agents frames (more than one only for "batching") """
+    frames = make_frames(scenario.size) if frames is None else frames
+    warmup = CONFIG.get('BENCHMARK_WARMUP', 3) if warmup is None else warmup
+    for i in range(warmup):
+        engine._infer_batch([frames[i % len(frames)]] * min(agents, engine.max_batch))
+    interval = 1.0 / scenario.fps if scenario.fps else 0.0
+    latencies = []
+    started = time.perf_counter()
+    due = started
+    for i in range(passes):
+        if interval:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            due += interval
+        for offset in range(0, agents, engine.max_batch):
+            batch = [frames[(i + offset + j) % len(frames)] for j in range(min(engine.max_batch, agents - offset))]
+            t0 = time.perf_counter()
+            engine._infer_batch(batch)
+            latencies.append(time.perf_counter() - t0)
+    return {"passes": passes, "elapsed": time.perf_counter() - started, "latencies": latencies}
+
+def _agent_thread(scenario, model, passes, results, frames=None):
+    try:
+        results.append(run_agent(BenchEngine(scenario, model), scenario, passes, frames=frames))
+    except Exception as e:
+        results.append({"error": str(e)})
+
+def _agent_proc(scenario, model, passes, results, frames=None):
+    try:
+        results.put(run_agent(BenchEngine(scenario, model), scenario, passes, frames=frames))
+    except Exception as e:
+        results.put({"error": str(e)})
+
+def _collect(results, procs):
+    collected = []
+    while len(collected) < len(procs):
+        try:
+            collected.append(results.get(timeout=1.0))
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs):
+                try:
+                    collected.append(results.get(timeout=1.0))
+                except queue.Empty:
+                    codes = [p.exitcode for p in procs]
+                    collected.append({"error": f"agent process exited without a result (exit codes {codes})"})
+                    break
+    return collected
+
+class ResourceMonitor:
+    """ ResourceSampler of webapp/tools/resources.py in a thread, CPU % and RSS of this process and its children """
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.sampler = ResourceSampler(interval=interval, size=1, log=False)
+        self.cpu, self.rss = [], []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="bench-monitor")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            latest = self.sampler.sample()
+            workers = latest["workers"].values()
+            self.cpu.append(latest["process"]["cpu"] + sum(worker["cpu"] for worker in workers))
+            self.rss.append(latest["process"]["rss"] + sum(worker["rss"] for worker in workers))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        return {
+            "cpu_avg": round(sum(self.cpu) / len(self.cpu), 1) if self.cpu else 0.0,
+            "rss_max": max(self.rss) if self.rss else 0,
+        }
+
+def run_scenario(scenario, passes=None, onnx_model=None, frames=None):
+    """ Runs one scenario, returns its result dict (see Results), frames are the size of the scenario """
+    passes = passes or CONFIG.get('BENCHMARK_IMAGES', 60)
+    model = model_path(scenario.backend, onnx_model)
+    result = {"scenario": scenario_key(scenario), **scenario._asdict(), "error": None}
+    agents = []
+    with ResourceMonitor() as monitor:
+        if scenario.method == "batching":
+            try:
+                agents.append(run_agent(BenchEngine(scenario, model), scenario, passes, agents=scenario.agents, frames=frames))
+            except Exception as e:
+                agents.append({"error": str(e)})
+        elif scenario.method == "threading":
+            threads = [threading.Thread(target=_agent_thread, args=(scenario, model, passes, agents, frames)) for _ in range(scenario.agents)]
+            for t in threads: t.start()
+            for t in threads: t.join()
+        else:
+            results = multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=_agent_proc, args=(scenario, model, passes, results, frames)) for _ in range(scenario.agents)]
+            for p in procs: p.start()
+            # read before join, a child does not exit while its result is still in the pipe
+            agents.extend(_collect(results, procs))
+            for p in procs: p.join()
+    errors = [agent["error"] for agent in agents if "error" in agent]
+    if errors:
+        result["error"] = errors[0]
+        return result
+    if scenario.method == "batching":
+        # every pass served all the agents
+        fps_per_agent = [agents[0]["passes"] / agents[0]["elapsed"]] * scenario.agents
+    else:
+        fps_per_agent = [agent["passes"] / agent["elapsed"] for agent in agents]
+    result.update({
+        "frames": passes * scenario.agents,
+        "elapsed": round(max(agent["elapsed"] for agent in agents), 3),
+        "fps_per_agent": round(sum(fps_per_agent) / len(fps_per_agent), 2),
+        "fps_total": round(sum(fps_per_agent), 2),
+        "latency_ms": percentiles([latency for agent in agents for latency in agent["latencies"]]),
+        **monitor.summary(),
+    })
+    return result
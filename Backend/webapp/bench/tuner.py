@@ -0,0 +1,361 @@
+###
+### webapp/bench/tuner.py
+###
+
+"""
+This is the auto-tuner for our webapp AUGV
+It finds the backend / method that serves TUNER_TARGET_AGENTS agents fastest within the latency SLO,
+and keeps the result as a profile of the host and the model, the server starts with it.
+
+    python -m webapp.bench.tuner                        # tunes and saves the profile of this host + model
+    python -m webapp.bench.tuner --agents 4 --slo-ms 80
+
+...
+
+Dragons:
+>>> Profiles
+    - One JSON file, PROFILE_PATH (Backend/.tuner_profiles.json), {profile_key(): profile}.
+    - profile_key() is the hardware fingerprint (CPU, cores, memory, GPUs) plus the hash of the models
+        (MODEL_NAME and the ONNX model), a new GPU or a retrained model gets a new profile.
+    - A profile is only saved when a candidate ran, the last known good one stays otherwise.
+    - profile_key() runs on every start, so its parts are cached in FINGERPRINT_PATH (Backend/.tuner_fingerprint.json):
+        the hardware fingerprint per boot (psutil.boot_time, nvidia-smi is not run again),
+        the hash of a model file per (size, mtime), a boot with unchanged models hashes nothing.
+>>> start()
+    - webapp/__main__.py: applies the profile of this host + model to CONFIG (no benchmark, no torch import),
+        its profile_key() is the startup phase "profile", then with TUNER_MODE 'auto' (no profile yet) or 'always' launches the tuner in a background process.
+    - The server does not wait for it and keeps its settings, the new profile is used from the next start.
+    - The tuner runs at a lower priority but still takes CPU / GPU from the agents, 'off' for production hosts.
+>>> Search
+    - Candidates: every backend / device this host can run (pt, onnx cpu, onnx cuda) x method.
+    - Per candidate the agents go 1, 2, 4 ... up to the target, it stops early when fps_total gains less than
+        TUNER_PLATEAU (more agents only share the same throughput) or p95 is over the SLO.
+    - When it stopped before the target, the target is estimated from the best step:
+        fps_per_agent = fps_total / target, p95 grows with target / agents.
+    - The pick: highest fps_per_agent within the SLO, else the lowest p95.
+>>> Corpus
+    - TUNER_CORPUS (images directory or recording), else the newest recording of RECORD_DIR,
+        else the ultralytics sample images, else webapp/AUGV/simulator.py synthetic_corpus().
+    - Random noise gives no detections, real frames also time the postprocess (NMS, boxes, offsets).
+"""
+
+import argparse, atexit, hashlib, json, os, platform, subprocess, sys, time
+import cv2, numpy as np
+import psutil
+from webapp.tools.config import CONFIG, detect_device
+from webapp.tools import startup
+from webapp.AUGV.recorder import RECORD_DIR, segment_paths
+from webapp.AUGV.simulator import load_corpus, synthetic_corpus
+from webapp.bench.baseline import host_id
+from webapp.bench.runner import ONNX_MODEL_PATH, Scenario, parse_size, run_scenario
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+PROFILE_PATH = os.path.join(BACKEND_DIR, ".tuner_profiles.json")
+FINGERPRINT_PATH = os.path.join(BACKEND_DIR, ".tuner_fingerprint.json")
+METHODS = ("threading", "multiprocessing", "batching")
+CORPUS_FRAMES = 8
+
+_process = None
+
+def _gpus():
+    """ GPU names from nvidia-smi, no torch import at startup """
+    try:
+        out = subprocess.run(["nvidia-smi", "--query-gpu=name", "--format=csv,noheader"],
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return []
+    return [line.strip() for line in out.stdout.splitlines() if line.strip()] if out.returncode == 0 else []
+
+def _write_json(path, data):
+    # the server may read it while the tuner writes, replace the file at once
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+def _load_fingerprints(path=None):
+    path = path or FINGERPRINT_PATH
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def hardware_fingerprint(cache=None):
+    """ Hash of the hardware, from cache when the host has not rebooted since """
+    boot = psutil.boot_time()
+    cached = (cache or {}).get("hardware")
+    if cached and cached["boot"] == boot:
+        return cached["fingerprint"]
+    hardware = {
+        "machine": platform.machine(),
+        "cpu": platform.processor() or platform.machine(),
+        "cores": psutil.cpu_count(logical=False),
+        "threads": psutil.cpu_count(),
+        "memory_gb": round(psutil.virtual_memory().total / 2**30),
+        "gpus": _gpus(),
+    }
+    fingerprint = hashlib.sha1(json.dumps(hardware, sort_keys=True).encode()).hexdigest()[:12]
+    if cache is not None:
+        cache["hardware"] = {"boot": boot, "fingerprint": fingerprint}
+    return fingerprint
+
+def _model_file(name):
+    for path in (name, os.path.join(BACKEND_DIR, name)):
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    return None
+
+def _file_hash(path, cache=None):
+    """ sha256 of a file, from cache while its size and mtime are the same """
+    stat = os.stat(path)
+    models = (cache if cache is not None else {}).setdefault("models", {})
+    cached = models.get(path)
+    if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+        return cached["sha256"]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    models[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+    return models[path]["sha256"]
+
+def model_hash(*names, cache=None):
+    """ Hash of the model files (of the name when there is no file yet, ultralytics downloads it) """
+    digest = hashlib.sha256()
+    for name in names:
+        path = _model_file(name)
+        digest.update((_file_hash(path, cache) if path else name).encode())
+    return digest.hexdigest()[:12]
+
+def profile_key(model_name=None, onnx_model=None, path=None):
+    """ <host>-<hardware fingerprint>-<model hash>, the parts come from FINGERPRINT_PATH when still valid """
+    cache = _load_fingerprints(path)
+    before = json.dumps(cache, sort_keys=True)
+    models = model_hash(model_name or CONFIG['MODEL_NAME'], onnx_model or ONNX_MODEL_PATH, cache=cache)
+    key = f"{host_id()}-{hardware_fingerprint(cache)}-{models}"
+    if json.dumps(cache, sort_keys=True) != before:
+        try:
+            _write_json(path or FINGERPRINT_PATH, cache)
+        except OSError as e:
+            print(f"[Tuner] Can not write {path or FINGERPRINT_PATH}: {e}")
+    return key
+
+def load_profiles(path=None):
+    path = path or PROFILE_PATH
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[Tuner] Can not read {path}: {e}")
+        return {}
+
+def load_profile(key=None, path=None):
+    return load_profiles(path).get(key or profile_key())
+
+def save_profile(key, profile, path=None):
+    path = path or PROFILE_PATH
+    profiles = load_profiles(path)
+    profiles[key] = profile
+    _write_json(path, profiles)
+    return path
+
+def apply_profile(profile):
+    CONFIG.update(profile["settings"])
+
+def _newest_recording(directory):
+    paths = segment_paths(directory) if os.path.isdir(directory) else []
+    if not paths:
+        return None
+    newest = max(paths, key=os.path.getmtime)
+    return os.path.join(directory, os.path.basename(newest).rsplit("-", 1)[0])
+
+def _sample_images():
+    try:
+        from ultralytics.utils import ASSETS
+    except ImportError:
+        return None
+    return str(ASSETS) if os.path.isdir(ASSETS) else None
+
+def load_frames(size, source=None, count=CORPUS_FRAMES):
+    """ count decoded frames of the corpus (see Corpus), resized to size (WxH) """
+    width, height = parse_size(size)
+    source = source or CONFIG.get('TUNER_CORPUS') or _newest_recording(CONFIG.get('RECORD_DIR') or RECORD_DIR) or _sample_images()
+    jpegs = load_corpus(source) if source else []
+    if not jpegs:
+        jpegs = synthetic_corpus(count)
+    # spread over the corpus, a recording starts with frames of the same spot
+    step = max(1, len(jpegs) // count)
+    frames = []
+    for jpeg in jpegs[::step][:count]:
+        image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            frames.append(image if image.shape[:2] == (height, width) else cv2.resize(image, (width, height)))
+    return frames
+
+def candidates(onnx_model=None):
+    """ (backend, device) pairs this host can run """
+    pairs = []
+    try:
+        pairs.append(("pt", detect_device()))
+    except ImportError:
+        pass
+    if os.path.exists(onnx_model or ONNX_MODEL_PATH):
+        try:
+            import onnxruntime as ort
+            pairs.append(("onnx", "cpu"))
+            if 'CUDAExecutionProvider' in ort.get_available_providers():
+                pairs.append(("onnx", "cuda"))
+        except ImportError:
+            pass
+    return pairs
+
+def ramp(target):
+    """ 1, 2, 4 ... target """
+    steps, agents = [], 1
+    while agents < target:
+        steps.append(agents)
+        agents *= 2
+    return steps + [target]
+
+def _p95(result):
+    return result["latency_ms"]["p95"]
+
+def tune_candidate(backend, device, method, target, slo_ms, size, passes, plateau, frames=None, onnx_model=None, run=run_scenario):
+    """ The ramp of one candidate (see Search), returns its row for target agents """
+    steps, best = [], None
+    for agents in ramp(target):
+        batch = min(agents, CONFIG.get('BATCH_MAX_SIZE', 8)) if method == "batching" else 1
+        result = run(Scenario(backend, device, method, agents, 0.0, size, batch), passes, onnx_model, frames)
+        steps.append(result)
+        if result["error"]:
+            break
+        plateaued = best is not None and result["fps_total"] < best["fps_total"] * (1 + plateau)
+        if best is None or result["fps_total"] > best["fps_total"]:
+            best = result
+        if plateaued or _p95(result) > slo_ms:
+            break
+    row = {"backend": backend, "device": device, "method": method, "agents": target, "steps": len(steps),
+           "batch": best["batch"] if best else 1, "error": steps[-1]["error"] if best is None else None}
+    if best is None:
+        return row
+    last = steps[-1]
+    if last["agents"] == target and not last["error"] and last["fps_total"] >= best["fps_total"]:
+        row.update(fps_per_agent=last["fps_per_agent"], p95=_p95(last), estimated=False, batch=last["batch"])
+    else:
+        row.update(fps_per_agent=round(best["fps_total"] / target, 2),
+                   p95=round(_p95(best) * target / best["agents"], 2), estimated=True)
+    return row
+
+def choose(rows, slo_ms):
+    """ Highest fps_per_agent within the SLO, else the lowest p95, None when nothing ran """
+    ran = [row for row in rows if not row["error"]]
+    within = [row for row in ran if row["p95"] <= slo_ms]
+    if within:
+        return max(within, key=lambda row: row["fps_per_agent"])
+    return min(ran, key=lambda row: row["p95"]) if ran else None
+
+def settings(row, onnx_model=None):
+    """ The CONFIG of a row """
+    values = {
+        'BACKEND': row["backend"],
+        'INFERENCE_METHOD': row["method"],
+        'TARGET_FPS': max(1, int(row["fps_per_agent"] * 0.8)),
+    }
+    if row["backend"] == "onnx":
+        values.update(BACKEND_DEVICE=row["device"], MODEL_NAME=onnx_model or ONNX_MODEL_PATH)
+    else:
+        values.update(DEVICE=row["device"])
+    if row["method"] == "batching":
+        values['BATCH_MAX_SIZE'] = row["batch"]
+    return values
+
+def tune(target=None, slo_ms=None, corpus=None, passes=None, onnx_model=None, run=run_scenario, pairs=None):
+    """ Runs the search, returns the profile (None when no candidate ran) """
+    target = target or CONFIG.get('TUNER_TARGET_AGENTS') or CONFIG['NUM_AGENTS']
+    slo_ms = slo_ms or CONFIG.get('TUNER_LATENCY_SLO_MS', 100)
+    passes = passes or CONFIG.get('TUNER_PASSES', 20)
+    plateau = CONFIG.get('TUNER_PLATEAU', 0.05)
+    size = "x".join(map(str, CONFIG['IMAGE_SIZE']))
+    frames = load_frames(size, corpus)
+    pairs = candidates(onnx_model) if pairs is None else pairs
+    started = time.perf_counter()
+    print(f"[Tuner] {target} agents, p95 SLO {slo_ms}ms, {len(frames)} corpus frames, candidates {pairs}")
+    print(f"[Tuner] {'Backend':<8} {'Device':<6} {'Method':<16} {'Steps':>5} {'FPS/agent':>10} {'p95 ms':>8}")
+    rows = []
+    for backend, device in pairs:
+        for method in METHODS:
+            row = tune_candidate(backend, device, method, target, slo_ms, size, passes, plateau, frames, onnx_model, run)
+            rows.append(row)
+            if row["error"]:
+                print(f"[Tuner] {backend:<8} {device:<6} {method:<16} error: {row['error']}")
+            else:
+                mark = " (estimated)" if row["estimated"] else ""
+                print(f"[Tuner] {backend:<8} {device:<6} {method:<16} {row['steps']:>5} {row['fps_per_agent']:>10.2f} {row['p95']:>8.2f}{mark}")
+    best = choose(rows, slo_ms)
+    if best is None:
+        print("[Tuner] No candidate ran, the profile is unchanged")
+        return None
+    if best["p95"] > slo_ms:
+        print(f"[Tuner] No candidate meets the {slo_ms}ms SLO for {target} agents, picked the lowest p95")
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target_agents": target,
+        "slo_ms": slo_ms,
+        "seconds": round(time.perf_counter() - started, 1),
+        "settings": settings(best, onnx_model),
+        "rows": rows,
+    }
+
+def _stop():
+    if _process is not None and _process.poll() is None:
+        _process.terminate()
+
+def launch():
+    """ The tuner in a background process, terminated with the server """
+    global _process
+    _process = subprocess.Popen([sys.executable, "-m", "webapp.bench.tuner", "--background"], cwd=BACKEND_DIR)
+    atexit.register(_stop)
+    print(f"[Tuner] Tuning in the background (pid {_process.pid}), the profile is used from the next start")
+    return _process
+
+def start(mode=None):
+    """ Applies the profile of this host + model, launches the tuner per TUNER_MODE (see start()) """
+    mode = mode or CONFIG.get('TUNER_MODE', 'auto')
+    with startup.phase("profile"):
+        key = profile_key()
+    profile = load_profile(key)
+    if profile:
+        apply_profile(profile)
+        print(f"[Tuner] Profile {key} from {profile['created']}: {profile['settings']}")
+    else:
+        print(f"[Tuner] No profile for {key}, serving with the defaults")
+    if mode == 'always' or (mode == 'auto' and profile is None):
+        return launch()
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m webapp.bench.tuner", description="AUGV backend auto-tuner")
+    parser.add_argument("--agents", type=int, help="target agents (default TUNER_TARGET_AGENTS or NUM_AGENTS)")
+    parser.add_argument("--slo-ms", type=float, help="latency SLO, p95 per frame (default TUNER_LATENCY_SLO_MS)")
+    parser.add_argument("--corpus", help="images directory or recording (default TUNER_CORPUS, see Corpus)")
+    parser.add_argument("--passes", type=int, help="timed passes per step (default TUNER_PASSES)")
+    parser.add_argument("--onnx-model", help="ONNX model path (default Backend/yolov8n.onnx)")
+    parser.add_argument("--background", action="store_true", help="lower priority, started by the server")
+    args = parser.parse_args(argv)
+    if args.background:
+        try:
+            psutil.Process().nice(10 if os.name == "posix" else psutil.BELOW_NORMAL_PRIORITY_CLASS)
+        except psutil.Error:
+            pass
+    key = profile_key(onnx_model=args.onnx_model)
+    profile = tune(args.agents, args.slo_ms, args.corpus, args.passes, args.onnx_model)
+    if profile is None:
+        return 1
+    print(f"[Tuner] Profile {key} saved to {save_profile(key, profile)}: {profile['settings']} ({profile['seconds']}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
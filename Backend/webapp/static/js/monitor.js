@@ -5,9 +5,25 @@ class AUGVMonitor {
         this.agents = new Map();
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
+        this.pendingHeader = null;
+        this.subscription = this.readSubscription();
         this.init();
     }
 
+    // ?agents=AUGV_1,AUGV_2&fps=10&tier=thumb, a wall of dashboards only asks for what it shows
+    readSubscription() {
+        const params = new URLSearchParams(window.location.search);
+        const agents = params.get('agents');
+        return {
+            action: 'subscribe',
+            agents: agents ? agents.split(',').map(a => a.trim()).filter(Boolean) : null,
+            max_fps: params.has('fps') ? parseFloat(params.get('fps')) : null,
+            tier: params.get('tier') || 'full',
+            // header as a text message, then the JPEG as a binary message
+            framing: 'split',
+        };
+    }
+
     init() {
         this.connectWebSocket();
         this.setupEventListeners();
@@ -24,6 +40,8 @@ class AUGVMonitor {
             console.log('Monitor WebSocket connected');
             this.updateConnectionStatus('Connected', 'connected');
             this.reconnectAttempts = 0;
+            this.pendingHeader = null;
+            this.ws.send(JSON.stringify(this.subscription));
         };
         
         this.ws.onmessage = (event) => {
@@ -60,20 +78,35 @@ class AUGVMonitor {
 
     handleMessage(event) {
         try {
+            // split framing, keep the header until its frame arrives
+            if (typeof event.data === 'string') {
+                this.pendingHeader = JSON.parse(event.data);
+                return;
+            }
             const data = new Uint8Array(event.data);
-            const lineEnd = data.indexOf(10);
-            if (lineEnd === -1) return;
-
-            const header = JSON.parse(new TextDecoder().decode(data.slice(0, lineEnd)));
+            let header, frameData;
+            if (this.pendingHeader) {
+                header = this.pendingHeader;
+                frameData = data;
+                this.pendingHeader = null;
+            } else {
+                const lineEnd = data.indexOf(10);
+                if (lineEnd === -1) return;
+                header = JSON.parse(new TextDecoder().decode(data.subarray(0, lineEnd)));
+                frameData = data.subarray(lineEnd + 1);
+            }
             const agentId = header.agent_id;
-            const detections = header.detections || [];
+            const scale = header.scale || 1;
+            // thumb tier, bbox is in camera pixels and the image is smaller
+            const detections = (header.detections || []).map(det => scale === 1 || !det.bbox ? det : {
+                ...det, bbox: det.bbox.map(v => v * scale)
+            });
             const status = header.status || 'active';
             
             // Update agent status
             this.updateAgentStatus(agentId, detections, status);
             
             // Handle binary data (frame) if present
-            const frameData = data.slice(lineEnd + 1);
             if (frameData.length > 0) {
                 this.displayFrame(agentId, frameData, detections);
             }
@@ -292,9 +325,84 @@ class AUGVMonitor {
     }
 }
 
+// Server and worker CPU/memory from the resource sampler, only the new rows are fetched
+class ResourcePanel {
+    constructor() {
+        this.since = null;
+        this.history = { t: [], proc_cpu: [], workers_cpu: [] };
+        this.maxPoints = 300;
+        this.interval = 2000;
+        this.poll();
+    }
+
+    async poll() {
+        try {
+            const url = this.since === null ? '/resources' : `/resources?since=${this.since}`;
+            const res = await fetch(url, { cache: 'no-store' });
+            if (res.ok) {
+                const body = await res.json();
+                this.interval = (body.interval || 2) * 1000;
+                this.append(body.history);
+                this.render(body.latest);
+            }
+        } catch (error) {
+            console.error('Error fetching resources:', error);
+        }
+        setTimeout(() => this.poll(), this.interval);
+    }
+
+    append(history) {
+        if (!history || !history.t.length) return;
+        for (const key of Object.keys(this.history)) {
+            this.history[key].push(...history[key]);
+            this.history[key].splice(0, Math.max(0, this.history[key].length - this.maxPoints));
+        }
+        this.since = history.t[history.t.length - 1];
+    }
+
+    render(latest) {
+        const text = document.getElementById('resources-text');
+        if (!text || !latest || !latest.process) return;
+        const mb = bytes => `${Math.round(bytes / (1024 * 1024))} MB`;
+        const parts = [
+            `CPU ${latest.cpu}% · Mem ${latest.mem}%`,
+            `Server ${latest.process.cpu}% · ${mb(latest.process.rss)} · ${latest.process.threads} threads`,
+        ];
+        Object.keys(latest.workers || {}).sort().forEach(name => {
+            const worker = latest.workers[name];
+            parts.push(`${name} ${worker.cpu}% · ${mb(worker.rss)}`);
+        });
+        (latest.gpus || []).forEach(gpu => parts.push(`GPU ${gpu.id} ${gpu.load}%`));
+        text.textContent = parts.join(' | ');
+        this.drawChart();
+    }
+
+    drawChart() {
+        const canvas = document.getElementById('resources-chart');
+        if (!canvas) return;
+        const ctx = canvas.getContext('2d');
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        const series = [[this.history.proc_cpu, '#27ae60'], [this.history.workers_cpu, '#3498db']];
+        const max = Math.max(100, ...series.flatMap(([values]) => values));
+        series.forEach(([values, color]) => {
+            if (values.length < 2) return;
+            ctx.beginPath();
+            values.forEach((value, i) => {
+                const x = i * canvas.width / (values.length - 1);
+                const y = canvas.height - (value / max) * canvas.height;
+                i ? ctx.lineTo(x, y) : ctx.moveTo(x, y);
+            });
+            ctx.strokeStyle = color;
+            ctx.lineWidth = 1.5;
+            ctx.stroke();
+        });
+    }
+}
+
 const AGENT_ORDER = ["AUGV_1", "AUGV_2", "AUGV_3", "AUGV_4", "AUGV_5"];
 // Initialize monitor when page loads
 document.addEventListener('DOMContentLoaded', () => {
     document.head.innerHTML += `<link rel="stylesheet" href="/static/css/monitor.css">`;
     new AUGVMonitor();
+    new ResourcePanel();
 }); 
\ No newline at end of file
@@ -0,0 +1,196 @@
+###
+### webapp/tools/assets.py
+###
+
+"""
+This is the static asset pipeline for our webapp
+It precompresses the css/js in webapp/static once at startup and serves them with cache headers.
+
+...
+
+Dragons:
+>>> Asset
+    - Raw, gzip and brotli (only when the brotli package is installed) bodies are kept in memory,
+        a variant is only kept when it is smaller than the raw file.
+    - Brotli (quality 11) is built by a background thread after load_assets(),
+        so the startup only pays for gzip.
+    - The fingerprint is the first 10 hex of the sha256 of the raw file.
+>>> fingerprint_urls()
+    - Used by webapp/tools/templates.py, it rewrites src="/static/js/monitor.js" into
+        src="/static/js/monitor.<hash>.js" in the XML templates.
+    - URLs built in the js (client.css, monitor.css, map_editor.css) are not rewritten,
+        they are served without the immutable header and revalidated with the ETag.
+>>> AssetStaticFiles
+    - Mounted on /static instead of StaticFiles, anything that is not a precompressed asset
+        (html, images, ...) falls back to StaticFiles.
+    - A fingerprinted URL with the current hash gets Cache-Control immutable for a year,
+        a stale hash still gets the current file but with no-cache.
+    - The variant is picked from Accept-Encoding (br > gzip > identity), with Vary: Accept-Encoding
+        and an ETag per variant.
+>>> DEV_MODE
+    - The file mtime is checked on every request and the asset is rebuilt when it changed.
+"""
+
+import gzip, hashlib, mimetypes, os, re, threading
+from email.utils import formatdate
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from webapp.tools.config import CONFIG
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+STATIC_URL = "/static/"
+ASSET_EXTENSIONS = (".css", ".js")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_FINGERPRINTED = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{10})(?P<ext>\.[A-Za-z0-9]+)$")
+_STATIC_URL = re.compile(r'((?:src|href)=")' + re.escape(STATIC_URL) + r'([^"?#]+)(")')
+
+ASSETS = {}
+
+class Asset:
+    def __init__(self, path, rel, with_brotli=True):
+        self.path = path
+        self.rel = rel
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.media_type.startswith("text/") or self.media_type.endswith("javascript"):
+            self.media_type += "; charset=utf-8"
+        self.load(with_brotli)
+
+    def load(self, with_brotli=True):
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        self.mtime = os.stat(self.path).st_mtime
+        self.hash = hashlib.sha256(raw).hexdigest()[:10]
+        self.etag = '"' + self.hash + '"'
+        self.bodies = {"identity": raw}
+        gz = gzip.compress(raw, compresslevel=9, mtime=0)
+        if len(gz) < len(raw):
+            self.bodies["gzip"] = gz
+        if with_brotli:
+            self.compress_brotli()
+
+    def compress_brotli(self):
+        if brotli is None:
+            return
+        raw = self.bodies["identity"]
+        br = brotli.compress(raw, quality=11)
+        if len(br) < len(raw) and self.bodies["identity"] is raw:
+            self.bodies["br"] = br
+
+    def changed(self):
+        try:
+            return os.stat(self.path).st_mtime != self.mtime
+        except OSError:
+            return False
+
+    def etag_for(self, encoding):
+        """ Each encoded variant is a different body, so a different strong ETag """
+        return self.etag if encoding == "identity" else f'"{self.hash}-{encoding}"'
+
+    @property
+    def url(self):
+        stem, ext = os.path.splitext(self.rel)
+        return f"{STATIC_URL}{stem}.{self.hash}{ext}"
+
+    def pick(self, accept_encoding):
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and accepted.get(encoding, 0) > 0:
+                return encoding, self.bodies[encoding]
+        return "identity", self.bodies["identity"]
+
+def _accepted_encodings(header):
+    accepted = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    if "*" in accepted:
+        for name in ("br", "gzip"):
+            accepted.setdefault(name, accepted["*"])
+    return accepted
+
+def load_assets(directory=STATIC_DIR):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, directory).replace(os.sep, "/")
+                ASSETS[rel] = Asset(path, rel, with_brotli=False)
+    if brotli is not None:
+        # quality 11 takes ~0.5s for bootstrap, gzip is served until it is ready
+        threading.Thread(target=_compress_brotli, args=(list(ASSETS.values()),), daemon=True).start()
+
+def _compress_brotli(assets):
+    for asset in assets:
+        asset.compress_brotli()
+
+def get_asset(rel):
+    asset = ASSETS.get(rel)
+    if asset is not None and CONFIG.get('DEV_MODE', False) and asset.changed():
+        print(f"[Assets] Rebuilding {rel}")
+        asset.load()
+    return asset
+
+def resolve(path):
+    """ Returns (asset, fingerprinted) for a path under /static, or (None, False) """
+    asset = get_asset(path)
+    if asset is not None:
+        return asset, False
+    match = _FINGERPRINTED.match(path)
+    if match:
+        asset = get_asset(match["stem"] + match["ext"])
+        if asset is not None:
+            return asset, match["hash"] == asset.hash
+    return None, False
+
+def asset_url(rel):
+    asset = get_asset(rel)
+    return asset.url if asset is not None else STATIC_URL + rel
+
+def fingerprint_urls(source):
+    return _STATIC_URL.sub(lambda m: m[1] + asset_url(m[2]) + m[3], source)
+
+def static_paths(source):
+    """ The paths under /static of the src/href in source """
+    return [m[2] for m in _STATIC_URL.finditer(source)]
+
+class AssetStaticFiles(StaticFiles):
+    async def get_response(self, path, scope):
+        asset, fingerprinted = resolve(path.replace(os.sep, "/"))
+        if asset is None or scope.get("method") not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        encoding, body = asset.pick(request_headers.get("accept-encoding"))
+        etag = asset.etag_for(encoding)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(asset.mtime, usegmt=True),
+            "Cache-Control": IMMUTABLE if fingerprinted else "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if etag in [tag.strip() for tag in request_headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if scope.get("method") == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=asset.media_type)
+        return Response(body, headers=headers, media_type=asset.media_type)
+
+load_assets()
@@ -3,7 +3,10 @@
 ###
 
 from starlette.routing import Route, WebSocketRoute
-from starlette.responses import HTMLResponse
+from starlette.responses import HTMLResponse, Response
+from email.utils import formatdate, parsedate_to_datetime
+from webapp.tools.templates import get_template
+import hashlib
 
 ROUTES = []
 
@@ -18,10 +21,40 @@ def endroute(path, **routing):
         return func
     return decorator
 
-def render_layout(title, template):
-    with open("webapp/static/xml/web_layout.xml", "r", encoding="utf-8") as f:
-        web_layout = f.read()
-    return HTMLResponse(
-        web_layout.replace("<t t-title/>", title)
-            .replace("<t t-out/>", template)
-    )
+def render_layout(title, template, req=None, last_modified=None, status_code=200):
+    """
+    Fills web_layout.xml, with req it answers 304 when the
+    If-None-Match / If-Modified-Since of the browser still matches.
+    last_modified None is a body that is not only the templates (live data in the slots),
+    it gets no Last-Modified and only the ETag of the body validates it.
+    """
+    layout = get_template("web_layout.xml")
+    body = layout.render(title=title, out=template).encode("utf-8")
+    headers = {
+        "ETag": '"' + hashlib.md5(body).hexdigest() + '"',
+        "Cache-Control": "no-cache",
+    }
+    if last_modified is not None:
+        last_modified = max(layout.last_modified(), last_modified)
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if req is not None and status_code == 200 and _not_modified(req, headers["ETag"], last_modified):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(body, status_code=status_code, headers=headers)
+
+def render_page(req, title, page, status_code=200, **slots):
+    """ Renders static/xml/<page> inside the layout """
+    template = get_template(page)
+    last_modified = None if slots else template.last_modified()
+    return render_layout(title, template.render(**slots), req=req, last_modified=last_modified, status_code=status_code)
+
+def _not_modified(req, etag, last_modified):
+    if_none_match = req.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = req.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
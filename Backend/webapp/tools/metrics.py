@@ -0,0 +1,198 @@
+###
+### webapp/tools/metrics.py
+###
+
+"""
+This is the metrics registry for our webapp
+It keeps the counters, gauges and latency histograms served by /metrics (Prometheus text format 0.0.4).
+
+...
+
+Dragons:
+>>> Counter, Gauge, Histogram
+    - Module level, created once with register(), the labels are positional values
+        in the order of the label names, e.g. FRAMES_RECEIVED.inc(agent_id).
+    - inc() and observe() only take a lock, a dict lookup and (for the histogram) a bisect,
+        the text is built when /metrics is scraped, never on the hot path.
+    - collect=fn makes the metric read its values at scrape time ({labels: value}),
+        used for what is already counted elsewhere (mailbox superseded/dropped, process stats).
+>>> Histogram
+    - The bucket counts are not cumulative in memory, render() adds them up.
+>>> Processes
+    - The values are per process, the multiprocessing agents send their stage timings
+        back with the result and the parent observes them (see drain_mp_results).
+>>> Agents
+    - The per agent series stay until forget(agent_id), the controller calls it on disconnect.
+"""
+
+import bisect, os, threading, time
+import psutil
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# seconds, from a fast JPEG decode to a slow CPU inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+METRICS = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=(), collect=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def forget(self, label, value):
+        """ Drops the series where the label has this value """
+        index = self.labels.index(label)
+        with self._lock:
+            for key in [key for key in self._values if key[index] == value]:
+                del self._values[key]
+
+    def samples(self):
+        if self.collect is not None:
+            return sorted(self.collect().items())
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self, out):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for key, value in self.samples():
+            out.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # [count per bucket + the +Inf bucket, sum]
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self, *labels):
+        """ (cumulative bucket counts, count, sum) of one series """
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                return [0] * (len(self.buckets) + 1), 0, 0.0
+            counts, total = list(series[0]), series[1]
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, total
+
+    def render(self, out):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        with self._lock:
+            keys = sorted(self._values)
+        for key in keys:
+            cumulative, count, total = self.snapshot(*key)
+            for bound, running in zip(self.buckets + (float("inf"),), cumulative):
+                le = 'le="' + _number(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {running}")
+            out.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            out.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+
+def register(metric):
+    METRICS.append(metric)
+    return metric
+
+def render():
+    out = []
+    for metric in METRICS:
+        metric.render(out)
+    return "\n".join(out) + "\n"
+
+def forget(agent_id):
+    for metric in METRICS:
+        if "agent" in metric.labels and metric.collect is None:
+            metric.forget("agent", agent_id)
+
+# ========
+# Pipeline
+# ========
+FRAMES_RECEIVED = register(Counter("augv_frames_received_total", "Frames received on the agent websocket.", ("agent",)))
+FRAMES_DECODED = register(Counter("augv_frames_decoded_total", "JPEG frames decoded for inference.", ("agent",)))
+FRAMES_INFERRED = register(Counter("augv_frames_inferred_total", "Frames that went through the detector.", ("agent",)))
+OUTBOUND_MESSAGES = register(Counter("augv_outbound_messages_total", "Messages sent back to the agent (Unity).", ("agent",)))
+MONITOR_BYTES = register(Counter("augv_monitor_bytes_total", "Bytes sent to the monitor clients.", ("agent",)))
+STAGE_SECONDS = register(Histogram("augv_stage_seconds", "Latency of one frame per pipeline stage.", ("stage",)))
+
+# ========
+# Process
+# ========
+_PROCESS = psutil.Process(os.getpid())
+
+def _process_stats():
+    with _PROCESS.oneshot():
+        cpu = _PROCESS.cpu_times()
+        stats = {
+            "process_cpu_seconds_total": cpu.user + cpu.system,
+            "process_resident_memory_bytes": _PROCESS.memory_info().rss,
+            "process_threads": _PROCESS.num_threads(),
+        }
+        try:
+            stats["process_open_fds"] = _PROCESS.num_fds()
+        except AttributeError:
+            # windows
+            stats["process_open_fds"] = _PROCESS.num_handles()
+    return stats
+
+def _process_metric(cls, name, help):
+    return register(cls(name, help, collect=lambda: {(): _process_stats()[name]}))
+
+_process_metric(Counter, "process_cpu_seconds_total", "User and system CPU time of the server process.")
+_process_metric(Gauge, "process_resident_memory_bytes", "Resident memory of the server process.")
+_process_metric(Gauge, "process_threads", "Threads of the server process.")
+_process_metric(Gauge, "process_open_fds", "Open file descriptors (handles on windows) of the server process.")
+register(Gauge("process_start_time_seconds", "Start time of the server process since the epoch.",
+               collect=lambda: {(): _PROCESS.create_time()}))
+register(Gauge("process_uptime_seconds", "Seconds since the server process started.",
+               collect=lambda: {(): round(time.time() - _PROCESS.create_time(), 3)}))
@@ -0,0 +1,258 @@
+###
+### webapp/tools/resources.py
+###
+
+"""
+This is the resource sampler for our webapp
+It samples the CPU/memory of the server, its threads and its worker processes on the event loop,
+and keeps the history for /resources and the monitor page.
+
+...
+
+Dragons:
+>>> ResourceSampler
+    - An asyncio task, one sample every RESOURCE_SAMPLE_INTERVAL_S, the psutil calls run in
+        the default executor so the loop never waits on /proc.
+    - cpu_percent(None) is the usage since the previous sample, nothing blocks for a second,
+        the first sample of a process is 0.
+    - Threads: CPU % from the user+system time delta of every thread of the server,
+        named from threading.enumerate() (native_id), only the latest sample is kept.
+    - Workers: the child processes of the server, named by workers() ({name: pid}, the
+        multiprocessing agents), any other child is "pid:<pid>".
+    - sample() also works without the task, webapp/bench/runner.py calls it from a thread
+        (log=False, no [Resource] line in the benchmark output).
+>>> History
+    - Ring: fixed size numpy structured array (RESOURCE_HISTORY_SIZE rows), append overwrites
+        the oldest row, rows() returns them oldest first.
+    - One ring for the server (SAMPLE_DTYPE) and one per worker (WORKER_DTYPE),
+        the ring of a worker is dropped when it has been gone for a whole history.
+>>> Metrics
+    - augv_worker_cpu_percent / augv_worker_rss_bytes in /metrics are the latest sample.
+>>> GPU
+    - Only when GPUtil is installed, the first GPU goes into the history, all of them in latest.
+"""
+
+import asyncio, os, threading, time
+import numpy as np
+import psutil
+from webapp.tools.config import CONFIG
+from webapp.tools import metrics
+
+try:
+    import GPUtil
+except ImportError:
+    GPUtil = None
+
+SAMPLE_DTYPE = np.dtype([
+    ("t", "f8"),
+    ("cpu", "f4"), ("mem", "f4"),
+    ("proc_cpu", "f4"), ("proc_rss", "i8"), ("proc_threads", "i4"),
+    ("workers_cpu", "f4"), ("workers_rss", "i8"),
+    ("gpu_load", "f4"), ("gpu_mem", "f4"),
+])
+WORKER_DTYPE = np.dtype([("t", "f8"), ("cpu", "f4"), ("rss", "i8")])
+
+class Ring:
+    def __init__(self, dtype, size):
+        self.data = np.zeros(max(1, int(size)), dtype=dtype)
+        self.count = 0
+
+    def append(self, row):
+        self.data[self.count % len(self.data)] = row
+        self.count += 1
+
+    def rows(self, since=None):
+        size = len(self.data)
+        if self.count <= size:
+            rows = self.data[:self.count]
+        else:
+            start = self.count % size
+            rows = np.concatenate((self.data[start:], self.data[:start]))
+        if since is not None:
+            rows = rows[rows["t"] > since]
+        return rows
+
+def columns(rows):
+    """ Column oriented lists for JSON, {"t": [...], "cpu": [...]}, NaN (no GPU) is null """
+    out = {}
+    for name in rows.dtype.names:
+        values = rows[name].tolist()
+        if rows.dtype[name].kind == "f" and name != "t":
+            # t stays exact, the dashboard sends it back as ?since=
+            values = [None if v != v else round(v, 3) for v in values]
+        out[name] = values
+    return out
+
+class ResourceSampler:
+    def __init__(self, workers=None, interval=None, size=None, log=True):
+        self.workers = workers or (lambda: {})
+        self.log = log
+        self.interval = interval or CONFIG.get('RESOURCE_SAMPLE_INTERVAL_S', 2.0)
+        self.size = size or CONFIG.get('RESOURCE_HISTORY_SIZE', 300)
+        self.history = Ring(SAMPLE_DTYPE, self.size)
+        self.worker_history = {}
+        self.latest = {}
+        self.task = None
+        self._process = psutil.Process(os.getpid())
+        self._children = {}
+        self._thread_times = {}
+        self._last_wall = None
+        self._last_seen = {}
+        self._last_log = 0.0
+        # the first cpu_percent() of a process is the baseline
+        psutil.cpu_percent(None)
+        self._process.cpu_percent(None)
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sample)
+            except Exception as e:
+                print(f"[Resource] Error sampling resources: {e}")
+            await asyncio.sleep(self.interval)
+
+    def sample(self):
+        now = time.time()
+        wall = time.monotonic()
+        elapsed = wall - self._last_wall if self._last_wall is not None else None
+        self._last_wall = wall
+
+        mem = psutil.virtual_memory()
+        with self._process.oneshot():
+            proc_cpu = self._process.cpu_percent(None)
+            proc_rss = self._process.memory_info().rss
+            threads = self._threads(elapsed)
+        workers = self._workers(now)
+        gpus = self._gpus()
+
+        row = (
+            now, psutil.cpu_percent(None), mem.percent,
+            proc_cpu, proc_rss, len(threads),
+            sum(w["cpu"] for w in workers.values()), sum(w["rss"] for w in workers.values()),
+            gpus[0]["load"] if gpus else np.nan, gpus[0]["memory_used"] if gpus else np.nan,
+        )
+        self.history.append(row)
+        self.latest = {
+            "t": now,
+            "cpu": row[1],
+            "mem": row[2],
+            "mem_used": mem.used,
+            "mem_total": mem.total,
+            "process": {"cpu": proc_cpu, "rss": proc_rss, "threads": len(threads)},
+            "threads": threads,
+            "workers": workers,
+            "gpus": gpus,
+        }
+        self._log(now)
+        return self.latest
+
+    def _threads(self, elapsed):
+        names = {t.native_id: t.name for t in threading.enumerate() if t.native_id is not None}
+        times, threads = {}, {}
+        for thread in self._process.threads():
+            total = thread.user_time + thread.system_time
+            times[thread.id] = total
+            previous = self._thread_times.get(thread.id)
+            cpu = (total - previous) / elapsed * 100 if elapsed and previous is not None else 0.0
+            name = names.get(thread.id, f"tid:{thread.id}")
+            threads[name if name not in threads else f"{name}:{thread.id}"] = round(cpu, 1)
+        self._thread_times = times
+        return threads
+
+    def _workers(self, now):
+        named = {pid: name for name, pid in self.workers().items() if pid}
+        workers = {}
+        try:
+            children = self._process.children(recursive=True)
+        except psutil.Error:
+            children = []
+        alive = set()
+        for child in children:
+            process = self._children.setdefault(child.pid, child)
+            try:
+                with process.oneshot():
+                    cpu = process.cpu_percent(None)
+                    rss = process.memory_info().rss
+            except psutil.Error:
+                continue
+            alive.add(child.pid)
+            name = named.get(child.pid, f"pid:{child.pid}")
+            workers[name] = {"pid": child.pid, "cpu": cpu, "rss": rss}
+            ring = self.worker_history.get(name)
+            if ring is None:
+                ring = self.worker_history[name] = Ring(WORKER_DTYPE, self.size)
+            ring.append((now, cpu, rss))
+            self._last_seen[name] = now
+        for pid in [pid for pid in self._children if pid not in alive]:
+            del self._children[pid]
+        # a worker that is gone for a whole history has nothing left to show
+        expired = now - self.interval * self.size
+        for name in [name for name, seen in self._last_seen.items() if seen < expired]:
+            self._last_seen.pop(name, None)
+            self.worker_history.pop(name, None)
+        return workers
+
+    def _gpus(self):
+        if GPUtil is None:
+            return []
+        try:
+            return [{"id": gpu.id, "load": round(gpu.load * 100, 1), "memory_used": gpu.memoryUsed, "memory_total": gpu.memoryTotal}
+                    for gpu in GPUtil.getGPUs()]
+        except Exception:
+            return []
+
+    def _log(self, now):
+        every = CONFIG.get('RESOURCE_LOG_INTERVAL_S', 60)
+        if not self.log or not every or now - self._last_log < every:
+            return
+        self._last_log = now
+        latest = self.latest
+        log = (f"[Resource] CPU: {latest['cpu']}% | Mem: {latest['mem']}% ({latest['mem_used']//(1024**2)}MB/{latest['mem_total']//(1024**2)}MB)"
+               f" | Server: {latest['process']['cpu']}% {latest['process']['rss']//(1024**2)}MB {latest['process']['threads']} threads")
+        for name, worker in sorted(latest["workers"].items()):
+            log += f" | {name}: {worker['cpu']}% {worker['rss']//(1024**2)}MB"
+        for gpu in latest["gpus"]:
+            log += f" | GPU {gpu['id']}: {gpu['load']:.1f}% {gpu['memory_used']}MB/{gpu['memory_total']}MB"
+        print(log)
+
+    def snapshot(self, since=None):
+        return {
+            "interval": self.interval,
+            "latest": self.latest,
+            "history": columns(self.history.rows(since)),
+            "workers": {name: columns(ring.rows(since)) for name, ring in sorted(list(self.worker_history.items()))},
+        }
+
+RESOURCE_SAMPLER = None
+
+async def start_resource_sampler(workers=None):
+    global RESOURCE_SAMPLER
+    if RESOURCE_SAMPLER is None:
+        RESOURCE_SAMPLER = ResourceSampler(workers).start()
+    return RESOURCE_SAMPLER
+
+async def stop_resource_sampler():
+    global RESOURCE_SAMPLER
+    if RESOURCE_SAMPLER is not None:
+        await RESOURCE_SAMPLER.stop()
+        RESOURCE_SAMPLER = None
+
+def _latest_workers(key):
+    latest = RESOURCE_SAMPLER.latest if RESOURCE_SAMPLER is not None else {}
+    return {(name,): worker[key] for name, worker in latest.get("workers", {}).items()}
+
+metrics.register(metrics.Gauge("augv_worker_cpu_percent", "CPU of the worker processes (multiprocessing agents) at the last sample.",
+                               ("worker",), collect=lambda: _latest_workers("cpu")))
+metrics.register(metrics.Gauge("augv_worker_rss_bytes", "Resident memory of the worker processes at the last sample.",
+                               ("worker",), collect=lambda: _latest_workers("rss")))
@@ -0,0 +1,67 @@
+###
+### webapp/tools/startup.py
+###
+
+"""
+This is the startup timing for our webapp
+It times the phases of a boot and logs the breakdown once the server serves.
+
+...
+
+Dragons:
+>>> Phases
+    - STARTED_AT is the first import of this module, webapp/__init__.py imports it before anything else.
+    - phase(name) times a block, PHASES keeps them in order: imports (webapp.ASGI and everything below it),
+        config (tuner profile, ports, from webapp/__main__.py), profile (the profile_key() of the tuner, within config),
+        startup (the Starlette startup handlers).
+    - ready() adds "ready", the time from STARTED_AT to serving, and logs the breakdown.
+>>> Backend preload
+    - preload_backend() imports torch + ultralytics in a thread when BACKEND is 'pt', after ready(),
+        so the server serves at once and the first agent does not pay the import, "backend" is logged when done.
+    - An ONNX server never imports them (webapp/tools/config.py load_yolo / get_onnx_session).
+>>> Metrics
+    - augv_startup_seconds{phase} in /metrics.
+"""
+
+import threading, time
+from contextlib import contextmanager
+from webapp.tools.config import CONFIG
+from webapp.tools import metrics
+
+STARTED_AT = time.perf_counter()
+PHASES = {}
+
+@contextmanager
+def phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES[name] = PHASES.get(name, 0.0) + time.perf_counter() - started
+
+def report():
+    return "[Startup] " + " | ".join(f"{name} {seconds:.3f}s" for name, seconds in PHASES.items())
+
+def ready():
+    PHASES["ready"] = time.perf_counter() - STARTED_AT
+    print(report())
+
+def _import_backend():
+    try:
+        with phase("backend"):
+            import torch, ultralytics
+    except ImportError as e:
+        print(f"[Startup] Backend preload failed: {e}")
+        return
+    print(f"[Startup] backend {PHASES['backend']:.3f}s (torch + ultralytics preloaded)")
+
+def preload_backend():
+    """ Imports the PT backend in the background, returns the thread (None for ONNX) """
+    if CONFIG.get('BACKEND', 'pt') != 'pt':
+        return None
+    thread = threading.Thread(target=_import_backend, daemon=True, name="backend-preload")
+    thread.start()
+    return thread
+
+metrics.register(metrics.Gauge("augv_startup_seconds", "Seconds spent per startup phase, ready is the time to serving.",
+                               ("phase",), collect=lambda: {(name,): round(seconds, 6) for name, seconds in list(PHASES.items())}))
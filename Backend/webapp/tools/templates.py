@@ -0,0 +1,95 @@
+###
+### webapp/tools/templates.py
+###
+
+"""
+This is the template registry for our webapp pages
+It loads the XML templates in webapp/static/xml once and keeps them pre-split at their placeholders.
+
+...
+
+Dragons:
+>>> Placeholders
+    - <t t-NAME/> is a slot, render(NAME=...) fills it,
+        a slot without a value is kept as it is (same as the old str.replace).
+    - web_layout.xml has the t-title and t-out slots, render_layout() fills them.
+>>> Reload
+    - Every template is read at import, the request handlers never touch the disk.
+    - With CONFIG['DEV_MODE'] the file mtime is checked on get_template() and the template
+        is read again when it changed, so editing an XML shows up on the next refresh.
+>>> Paths
+    - Resolved from this file, not from the working directory.
+>>> Static URLs
+    - src/href="/static/..." are rewritten to the fingerprinted asset URL on load (webapp/tools/assets.py).
+    - last_modified() is the newest of the template file and those assets, the URLs change with them.
+"""
+
+import os, re
+from webapp.tools.config import CONFIG
+from webapp.tools.assets import fingerprint_urls, get_asset, static_paths
+
+XML_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "xml")
+_PLACEHOLDER = re.compile(r"(<t t-([\w-]+)/>)")
+
+TEMPLATES = {}
+
+class Template:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = 0.0
+        self.assets = []
+        self.parts = []
+        self.load()
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            source = f.read()
+        self.assets = static_paths(source)
+        source = fingerprint_urls(source)
+        self.mtime = os.stat(self.path).st_mtime
+        # [text, tag, name, text, tag, name, ..., text]
+        pieces = _PLACEHOLDER.split(source)
+        self.parts = [pieces[0]]
+        for i in range(1, len(pieces), 3):
+            self.parts.append((pieces[i + 1], pieces[i]))
+            self.parts.append(pieces[i + 2])
+
+    def changed(self):
+        try:
+            return os.stat(self.path).st_mtime != self.mtime
+        except OSError:
+            return False
+
+    def last_modified(self):
+        mtimes = [self.mtime]
+        for rel in self.assets:
+            asset = get_asset(rel)
+            if asset is not None:
+                mtimes.append(asset.mtime)
+        return max(mtimes)
+
+    def render(self, **slots):
+        out = []
+        for part in self.parts:
+            if isinstance(part, tuple):
+                name, tag = part
+                out.append(slots.get(name, tag))
+            else:
+                out.append(part)
+        return "".join(out)
+
+def load_templates():
+    for name in sorted(os.listdir(XML_DIR)):
+        if name.endswith(".xml"):
+            TEMPLATES[name] = Template(os.path.join(XML_DIR, name))
+
+def get_template(name):
+    template = TEMPLATES.get(name)
+    if template is None:
+        template = TEMPLATES[name] = Template(os.path.join(XML_DIR, name))
+    elif CONFIG.get('DEV_MODE', False) and template.changed():
+        print(f"[Templates] Reloading {name}")
+        template.load()
+    return template
+
+load_templates()
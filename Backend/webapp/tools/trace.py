@@ -0,0 +1,92 @@
+###
+### webapp/tools/trace.py
+###
+
+"""
+This is the frame tracer for our webapp
+It follows a sampled frame through the pipeline and keeps the last traces for /debug/trace.
+
+...
+
+Dragons:
+>>> FrameTrace
+    - Created by the controller for 1 in TRACE_SAMPLE_EVERY frames per agent (0 is off),
+        the other frames carry None and every hop only does an `is not None` check.
+    - mark(name) closes the span `name` that started at the previous mark, so the marks are
+        receive, decode_wait, decode, queue_wait, inference, postprocess, outbound_wait, dispatch.
+    - The timestamps are time.perf_counter(), monotonic and the same clock in the agent processes.
+    - finish(status) puts it in TRACES once: "ok" when sent to Unity, or where the frame stopped
+        ("superseded", "coalesced", "dropped", "unchanged", "no_obstacle").
+        A frame that never finishes (agent disconnected) is not recorded.
+>>> TRACES
+    - A deque(maxlen=TRACE_BUFFER_SIZE): append and iteration copies are atomic under the GIL,
+        the hops never take a lock to record, the oldest trace falls off.
+>>> chrome_trace()
+    - Chrome trace-event JSON (chrome://tracing, ui.perfetto.dev), one row per agent,
+        one nestable async event per frame so overlapping frames of the same agent stay readable.
+"""
+
+import itertools, os, time
+from collections import deque
+from webapp.tools.config import CONFIG
+
+TRACES = deque(maxlen=CONFIG.get('TRACE_BUFFER_SIZE', 2048))
+_SAMPLE_COUNTS = {}
+_IDS = itertools.count(1)
+
+class FrameTrace:
+    __slots__ = ("id", "agent_id", "marks", "status")
+
+    def __init__(self, agent_id, t=None):
+        self.id = next(_IDS)
+        self.agent_id = agent_id
+        self.marks = [("receive", time.perf_counter() if t is None else t)]
+        self.status = None
+
+    def mark(self, name, t=None):
+        self.marks.append((name, time.perf_counter() if t is None else t))
+
+    def finish(self, status="ok"):
+        if self.status is None:
+            self.status = status
+            TRACES.append(self)
+
+    def spans(self):
+        """ (name, start, end) of every hop """
+        return [(name, self.marks[i][1], t) for i, (name, t) in enumerate(self.marks[1:])]
+
+def sample(agent_id, t=None):
+    """ A new FrameTrace for 1 in TRACE_SAMPLE_EVERY frames of the agent, else None """
+    every = CONFIG.get('TRACE_SAMPLE_EVERY', 0)
+    if not every:
+        return None
+    count = _SAMPLE_COUNTS.get(agent_id, 0)
+    _SAMPLE_COUNTS[agent_id] = count + 1
+    if count % every:
+        return None
+    return FrameTrace(agent_id, t)
+
+def forget(agent_id):
+    _SAMPLE_COUNTS.pop(agent_id, None)
+
+def clear():
+    TRACES.clear()
+
+def chrome_trace(traces=None):
+    traces = list(TRACES) if traces is None else traces
+    pid = os.getpid()
+    agents = sorted({trace.agent_id for trace in traces})
+    tids = {agent_id: i + 1 for i, agent_id in enumerate(agents)}
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "AUGV backend"}}]
+    for agent_id, tid in tids.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": agent_id}})
+    for trace in traces:
+        base = {"cat": "frame", "pid": pid, "tid": tids[trace.agent_id], "id": trace.id}
+        start, end = trace.marks[0][1], trace.marks[-1][1]
+        events.append({**base, "name": "frame", "ph": "b", "ts": start * 1e6,
+                       "args": {"agent_id": trace.agent_id, "status": trace.status}})
+        for name, span_start, span_end in trace.spans():
+            events.append({**base, "name": name, "ph": "b", "ts": span_start * 1e6})
+            events.append({**base, "name": name, "ph": "e", "ts": span_end * 1e6})
+        events.append({**base, "name": "frame", "ph": "e", "ts": end * 1e6})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}